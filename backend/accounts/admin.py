@@ -82,4 +82,17 @@ class FleetAlertAdmin(admin.ModelAdmin):
 admin.site.register(CompanySettings)
 from .models import Plan, Subscription
 admin.site.register(Plan)
-admin.site.register(Subscription)
+
+
+@admin.register(Subscription)
+class SubscriptionAdmin(admin.ModelAdmin):
+    list_display = ("company", "plan", "status", "driver_count", "vehicle_count", "current_period_end")
+    list_filter = ("status", "plan")
+    # Kept by signals; see Subscription.driver_count.
+    readonly_fields = ("driver_count", "vehicle_count")
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        obj.save(update_fields=[f.name for f in obj._meta.concrete_fields
+                                if not f.primary_key and f.name not in self.readonly_fields])
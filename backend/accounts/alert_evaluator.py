@@ -0,0 +1,113 @@
+"""
+Scheduled fleet alert evaluation (`manage.py evaluate_fleet_alerts`).
+
+Alerts used to be recomputed only when someone opened the alerts list: the
+page paid for the whole fleet, and a vehicle that went offline at night was
+noticed in the morning. The evaluator runs alerts_engine.evaluate for every
+tenant on a cadence instead:
+
+- every pass (FLEET_ALERTS_EVALUATE_SECONDS) it evaluates the companies whose
+  Live Map version moved since their last evaluation (accounts/live_versions.py
+  — bumped by ingest, vehicle edits, assignments, trips and thresholds), most
+  recently evaluated last;
+- vehicles going OFFLINE — silence bumps no version — are caught by the
+  offline watchdog's deadlines (accounts/offline_watchdog.py), ticked first
+  in every pass;
+- every company with vehicles is still evaluated at least once per
+  FLEET_ALERTS_SWEEP_SECONDS, as a safety net for what no version records.
+
+Each pass ends by writing a heartbeat to the cache. While it is fresh the
+alerts list is a pure read; without a running evaluator (serverless, or a
+per-process cache that the web workers cannot see) the list keeps refreshing
+the caller's company itself, so alerts never silently stop.
+"""
+import logging
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import live_versions
+from .alerts_engine import evaluate
+from .models import Company
+from .offline_watchdog import OfflineWatchdog
+
+logger = logging.getLogger(__name__)
+
+INTERVAL_SECONDS = getattr(settings, "FLEET_ALERTS_EVALUATE_SECONDS", 15)
+SWEEP_SECONDS = getattr(settings, "FLEET_ALERTS_SWEEP_SECONDS", 60)
+HEARTBEAT = "alerts:heartbeat"
+
+
+@dataclass
+class TenantReport:
+    company_id: int
+    opened: int
+    resolved: int
+    ms: float
+    changed: bool
+
+
+def is_running():
+    """True while an evaluator has finished a pass recently enough that the
+    alerts list need not refresh alerts itself."""
+    beat = cache.get(HEARTBEAT)
+    stale_after = max(2 * SWEEP_SECONDS, 3 * INTERVAL_SECONDS)
+    return beat is not None and (timezone.now() - beat).total_seconds() < stale_after
+
+
+class Evaluator:
+    """Remembers, per company, the version and time of its last evaluation."""
+
+    def __init__(self, sweep_seconds=SWEEP_SECONDS, clock=time.monotonic):
+        self.sweep_seconds = sweep_seconds
+        self.clock = clock
+        self.seen = {}
+        self.evaluated_at = {}
+        self.watchdog = OfflineWatchdog()
+        self.offline = (0, 0)  # (opened, resolved) by the last watchdog tick
+
+    def due(self):
+        """[(company_id, version, changed)] to evaluate now: changed companies
+        first, then those whose sweep is due, longest-waiting first."""
+        ids = list(Company.objects.filter(vehicles__isnull=False)
+                   .distinct().values_list("id", flat=True))
+        current = live_versions.versions(ids)
+        now = self.clock()
+        changed, swept = [], []
+        for company_id in ids:
+            version = current.get(company_id)
+            last = self.evaluated_at.get(company_id)
+            if last is None or (version is not None and version != self.seen.get(company_id)):
+                changed.append((company_id, version, True))
+            elif now - last >= self.sweep_seconds:
+                swept.append((company_id, version, False))
+        changed.sort(key=lambda row: self.evaluated_at.get(row[0], float("-inf")))
+        swept.sort(key=lambda row: self.evaluated_at[row[0]])
+        return changed + swept
+
+    def run_once(self):
+        """Tick the offline watchdog, then evaluate the due companies.
+        Returns a TenantReport per company."""
+        due = self.due()
+        for company_id, _, changed in due:
+            if changed:
+                self.watchdog.refresh_company(company_id)
+        self.offline = self.watchdog.tick()
+        reports = []
+        for company_id, version, changed in due:
+            t0 = time.perf_counter()
+            try:
+                opened, resolved = evaluate(company_id)
+            except Exception:
+                # One tenant's bad data must not stall every other tenant.
+                logger.exception("alert evaluation failed for company %s", company_id)
+                continue
+            self.seen[company_id] = version
+            self.evaluated_at[company_id] = self.clock()
+            reports.append(TenantReport(company_id, opened, resolved,
+                                        (time.perf_counter() - t0) * 1000, changed))
+        cache.set(HEARTBEAT, timezone.now(), timeout=None)
+        return reports
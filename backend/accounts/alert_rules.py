@@ -0,0 +1,205 @@
+"""
+Alert rules evaluated on the fixes themselves, at ingest time.
+
+The fleet scan (accounts/alerts_engine.py) only sees each vehicle's latest
+state, so conditions that live in the track — driving over the limit, a long
+stop mid-trip, a dying phone, a GPS that has gone vague — were never raised.
+After each stored chunk, apply() folds the new fixes through the company's
+rules (CompanySettings; 0 disables a rule):
+
+  SPEEDING         over speed_limit_kmh for at least SPEEDING_SECONDS
+  IDLING           on a trip, below the moving-speed threshold for
+                   idle_alert_minutes
+  LOW_BATTERY      device battery below low_battery_percent
+  GPS_UNAVAILABLE  POOR_GPS_FIXES fixes in a row less accurate than
+                   gps_accuracy_alert_m
+
+A small rolling state per vehicle (cache `rules:v:<id>`) carries runs across
+batches: when the current run started, and which of these alerts are open.
+Steady-state ingest therefore costs no queries here; a query runs only when
+an alert opens or resolves, or the state was evicted. An episode that starts
+and ends inside one batch (an offline backlog) is still recorded, as an alert
+that is already resolved. Fixes older than the last one folded are ignored:
+they describe the past, not a current condition.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from . import request_cache
+from .fleet_status import company_thresholds
+from .models import FleetAlert
+
+SPEEDING_SECONDS = getattr(settings, "ALERT_RULES_SPEEDING_SECONDS", 30)
+POOR_GPS_FIXES = getattr(settings, "ALERT_RULES_POOR_GPS_FIXES", 3)
+STATE_TTL = 24 * 3600
+
+RULE_TYPES = (
+    FleetAlert.Type.SPEEDING,
+    FleetAlert.Type.IDLING,
+    FleetAlert.Type.LOW_BATTERY,
+    FleetAlert.Type.GPS_UNAVAILABLE,
+)
+RULE_FIELDS = ("speed_limit_kmh", "idle_alert_minutes",
+                "low_battery_percent", "gps_accuracy_alert_m")
+_DEFAULTS = (110, 20, 15, 100)
+
+
+# --- Per-company rules -----------------------------------------------------
+
+def _rules_key(company_id):
+    return f"alert_rules:{company_id}"
+
+
+def rules_for(company_id):
+    """(speed_limit_kmh, idle_alert_minutes, low_battery_percent,
+    gps_accuracy_alert_m) of a company. Cached like its thresholds."""
+    from .fleet_status import THRESHOLDS_CACHE_SECONDS
+    from .models import CompanySettings
+
+    def lookup():
+        key = _rules_key(company_id)
+        value = cache.get(key)
+        if value is None:
+            value = (CompanySettings.objects.filter(company_id=company_id)
+                     .values_list(*RULE_FIELDS).first()) or _DEFAULTS
+            cache.set(key, value, timeout=THRESHOLDS_CACHE_SECONDS)
+        return tuple(value)
+    return request_cache.memoize("alert_rules", company_id, lookup)
+
+
+def invalidate_rules(company_id):
+    key = _rules_key(company_id)
+    cache.delete(key)
+    request_cache.forget("alert_rules", company_id)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+# --- Rolling state ---------------------------------------------------------
+
+def _state_key(vehicle_id):
+    return f"rules:v:{vehicle_id}"
+
+
+def _fresh_state():
+    # open is None until read from the database: the cache may have lost it.
+    return {"at": None, "speeding_since": None, "max_kmh": 0, "idle_since": None,
+            "battery": None, "poor": 0, "open": None}
+
+
+def fold(state, fixes, rules, moving_kmh, on_trip):
+    """Advance `state` over (recorded_at, speed m/s, accuracy, battery) fixes
+    in recorded_at order. Returns the rule types whose condition was met at
+    some fix of the batch."""
+    speed_limit, idle_minutes, low_battery, poor_accuracy = rules
+    fired = set()
+    for at, speed, accuracy, battery in fixes:
+        kmh = (speed or 0) * 3.6
+        if speed_limit and kmh > speed_limit:
+            if state["speeding_since"] is None:
+                state["speeding_since"], state["max_kmh"] = at, 0
+            state["max_kmh"] = max(state["max_kmh"], round(kmh))
+            if (at - state["speeding_since"]).total_seconds() >= SPEEDING_SECONDS:
+                fired.add(FleetAlert.Type.SPEEDING)
+        else:
+            # max_kmh keeps the ended run's peak for its alert message.
+            state["speeding_since"] = None
+
+        if idle_minutes and on_trip and kmh < moving_kmh:
+            state["idle_since"] = state["idle_since"] or at
+            if (at - state["idle_since"]).total_seconds() >= idle_minutes * 60:
+                fired.add(FleetAlert.Type.IDLING)
+        else:
+            state["idle_since"] = None
+
+        if battery is not None:
+            state["battery"] = battery
+        if low_battery and state["battery"] is not None and state["battery"] < low_battery:
+            fired.add(FleetAlert.Type.LOW_BATTERY)
+
+        if accuracy is not None:
+            state["poor"] = state["poor"] + 1 if poor_accuracy and accuracy > poor_accuracy else 0
+        if poor_accuracy and state["poor"] >= POOR_GPS_FIXES:
+            fired.add(FleetAlert.Type.GPS_UNAVAILABLE)
+        state["at"] = at
+    return fired
+
+
+def holding(state, rules):
+    """The rule types whose condition still holds after the last fix."""
+    speed_limit, idle_minutes, low_battery, poor_accuracy = rules
+    at, held = state["at"], set()
+    if (speed_limit and state["speeding_since"]
+            and (at - state["speeding_since"]).total_seconds() >= SPEEDING_SECONDS):
+        held.add(FleetAlert.Type.SPEEDING)
+    if (idle_minutes and state["idle_since"]
+            and (at - state["idle_since"]).total_seconds() >= idle_minutes * 60):
+        held.add(FleetAlert.Type.IDLING)
+    if low_battery and state["battery"] is not None and state["battery"] < low_battery:
+        held.add(FleetAlert.Type.LOW_BATTERY)
+    if poor_accuracy and state["poor"] >= POOR_GPS_FIXES:
+        held.add(FleetAlert.Type.GPS_UNAVAILABLE)
+    return held
+
+
+def _alert(atype, vehicle, state, rules):
+    speed_limit, idle_minutes, low_battery, poor_accuracy = rules
+    plate = vehicle.plate_number
+    return {
+        FleetAlert.Type.SPEEDING: (
+            FleetAlert.Severity.HIGH, f"{plate} speeding",
+            f"{plate} reached {state['max_kmh']} km/h (limit {speed_limit} km/h)."),
+        FleetAlert.Type.IDLING: (
+            FleetAlert.Severity.LOW, f"{plate} idling",
+            f"{plate} has been stationary on a trip for over {idle_minutes} minutes."),
+        FleetAlert.Type.LOW_BATTERY: (
+            FleetAlert.Severity.MEDIUM, f"{plate} device battery low",
+            f"The tracking phone in {plate} is at {state['battery']}% battery."),
+        FleetAlert.Type.GPS_UNAVAILABLE: (
+            FleetAlert.Severity.MEDIUM, f"{plate} GPS accuracy degraded",
+            f"Fixes from {plate} are less accurate than {poor_accuracy} m."),
+    }[atype]
+
+
+# --- Ingest hook -----------------------------------------------------------
+
+def apply(vehicle, pings, *, driver=None, trip=None):
+    """Run the rules over freshly stored pings of `vehicle`; open and resolve
+    alerts accordingly. Returns the alerts created."""
+    if vehicle is None or not vehicle.company_id or not pings:
+        return []
+    key = _state_key(vehicle.id)
+    state = cache.get(key) or _fresh_state()
+    fixes = sorted(((p.recorded_at, p.speed, p.accuracy, p.battery) for p in pings
+                    if state["at"] is None or p.recorded_at > state["at"]),
+                   key=lambda f: f[0])
+    if not fixes:
+        return []
+    rules = rules_for(vehicle.company_id)
+    moving_kmh, _ = company_thresholds(vehicle.company_id)
+    fired = {str(t) for t in fold(state, fixes, rules, moving_kmh, trip is not None)}
+    held = {str(t) for t in holding(state, rules)}
+
+    if state["open"] is None:
+        state["open"] = list(FleetAlert.objects.filter(
+            vehicle=vehicle, alert_type__in=RULE_TYPES, resolved_at__isnull=True,
+        ).values_list("alert_type", flat=True).distinct())
+    was_open = set(state["open"])
+    now = timezone.now()
+    new = []
+    for atype in sorted(fired - was_open):
+        severity, title, message = _alert(atype, vehicle, state, rules)
+        new.append(FleetAlert(
+            company_id=vehicle.company_id, vehicle=vehicle, driver=driver, trip=trip,
+            alert_type=atype, severity=severity, title=title, message=message,
+            resolved_at=None if atype in held else now))
+    created = FleetAlert.objects.bulk_create(new)
+    cleared = was_open - held
+    if cleared:
+        FleetAlert.objects.filter(
+            vehicle=vehicle, alert_type__in=cleared, resolved_at__isnull=True,
+        ).update(resolved_at=now)
+    state["open"] = sorted((was_open | fired) & held)
+    cache.set(key, state, timeout=STATE_TTL)
+    return created
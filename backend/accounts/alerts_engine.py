@@ -7,80 +7,108 @@ an alert stays "unresolved" from the moment the condition appears until it
 clears. Marking an alert as read (acknowledged_at) is display state only —
 previously it made the de-dup check miss, so acknowledging an alert for a
 still-true condition immediately recreated it (duplicate notifications).
+
+A refresh works on sets, not per vehicle: it derives the (vehicle, type)
+conditions that hold now, reads the open alerts once, then creates the
+missing ones in one bulk insert and closes the cleared ones with one UPDATE
+per type — a constant number of queries however large the fleet.
 """
 from django.conf import settings
 from django.utils import timezone
 
 from .models import FleetAlert, Vehicle
 from .fleet_status import vehicle_live_status, company_thresholds, OFFLINE
+from .latest_state import overlay_vehicles
 
 LOW_FUEL_THRESHOLD = getattr(settings, "FLEET_LOW_FUEL_THRESHOLD", 15)
 
+# The alert types this engine owns. Others (incidents, ...) are raised by
+# whoever observes them and are never resolved here.
+ENGINE_TYPES = (
+    FleetAlert.Type.MAINTENANCE_DUE,
+    FleetAlert.Type.LOW_FUEL,
+    FleetAlert.Type.VEHICLE_OFFLINE,
+)
+
+
+def _conditions(v, moving_speed, offline_timeout):
+    """Yield (type, severity, title, message) for each condition true of v."""
+    # --- maintenance -----------------------------------------------------
+    if v.status == "Maintenance":
+        yield (FleetAlert.Type.MAINTENANCE_DUE, FleetAlert.Severity.HIGH,
+               f"{v.plate_number} in maintenance",
+               f"Vehicle {v.plate_number} ({v.model}) is flagged for maintenance.")
+
+    # --- low fuel --------------------------------------------------------
+    fuel = v.fuel_level if v.fuel_level is not None else 100
+    if v.status == "Active" and fuel < LOW_FUEL_THRESHOLD:
+        yield (FleetAlert.Type.LOW_FUEL, FleetAlert.Severity.CRITICAL,
+               f"{v.plate_number} low fuel",
+               f"Fuel level for {v.plate_number} is at {fuel}%.")
+
+    # --- offline (only for vehicles that HAVE reported before) ------------
+    if (v.status == "Active" and v.last_seen_at is not None
+            and vehicle_live_status(v, moving_speed, offline_timeout) == OFFLINE):
+        yield _offline(v)
+
+
+def _offline(v):
+    return (FleetAlert.Type.VEHICLE_OFFLINE, FleetAlert.Severity.MEDIUM,
+            f"{v.plate_number} went offline",
+            f"No recent telemetry from {v.plate_number}.")
+
+
+def offline_alert(v):
+    """A new VEHICLE_OFFLINE alert for v (see accounts/offline_watchdog.py)."""
+    atype, severity, title, message = _offline(v)
+    return FleetAlert(company_id=v.company_id, vehicle=v, alert_type=atype,
+                      severity=severity, title=title, message=message)
+
+
+def _open_keys(company_id):
+    """(vehicle_id, type) of every still-open engine alert, read or not."""
+    return set(FleetAlert.objects.filter(
+        company_id=company_id, alert_type__in=ENGINE_TYPES,
+        resolved_at__isnull=True, vehicle__isnull=False,
+    ).values_list("vehicle_id", "alert_type"))
 
-def _unresolved(company, vehicle, atype):
-    """Any still-open occurrence of this condition, read or not."""
-    return FleetAlert.objects.filter(
-        company=company, vehicle=vehicle, alert_type=atype,
-        resolved_at__isnull=True,
-    )
 
+def evaluate(company):
+    """Open alerts for the company's current real conditions and resolve the
+    ones whose condition no longer holds. `company` is an instance or id.
+    Returns (opened, resolved)."""
+    company_id = getattr(company, "pk", company)
+    moving_speed, offline_timeout = company_thresholds(company_id)
+    vehicles = overlay_vehicles(list(Vehicle.objects.filter(company_id=company_id).only(
+        "id", "plate_number", "model", "status", "fuel_level",
+        "lat", "lng", "speed", "last_seen_at")))
 
-def _open_alert(company, vehicle, atype, severity, title, message) -> bool:
-    """Create the alert only if this condition is not already open."""
-    if _unresolved(company, vehicle, atype).exists():
-        return False
-    FleetAlert.objects.create(
-        company=company, vehicle=vehicle, alert_type=atype,
-        severity=severity, title=title, message=message)
-    return True
+    holding = {}
+    for v in vehicles:
+        for atype, severity, title, message in _conditions(v, moving_speed, offline_timeout):
+            holding[(v.id, atype)] = FleetAlert(
+                company_id=company_id, vehicle=v, alert_type=atype,
+                severity=severity, title=title, message=message)
 
+    open_keys = _open_keys(company_id)
+    created = FleetAlert.objects.bulk_create(
+        [alert for key, alert in holding.items() if key not in open_keys])
 
-def _resolve(company, vehicle, atype) -> int:
-    """Condition cleared: close any open occurrence so a genuine future
-    re-occurrence can raise a fresh alert."""
-    return _unresolved(company, vehicle, atype).update(resolved_at=timezone.now())
+    # Condition cleared: close the open occurrence so a genuine future
+    # re-occurrence can raise a fresh alert.
+    cleared = open_keys - holding.keys()
+    now = timezone.now()
+    resolved = 0
+    for atype in ENGINE_TYPES:
+        vehicle_ids = [vid for vid, t in cleared if t == atype]
+        if vehicle_ids:
+            resolved += FleetAlert.objects.filter(
+                company_id=company_id, alert_type=atype, vehicle_id__in=vehicle_ids,
+                resolved_at__isnull=True,
+            ).update(resolved_at=now)
+    return len(created), resolved
 
 
 def refresh_fleet_alerts(company) -> int:
-    """Scan the company's vehicles, open alerts for current real conditions and
-    resolve the ones whose condition no longer holds. Returns alerts created."""
-    created = 0
-    moving_speed, offline_timeout = company_thresholds(company)
-
-    for v in Vehicle.objects.filter(company=company):
-        # --- maintenance -------------------------------------------------
-        if v.status == "Maintenance":
-            created += _open_alert(
-                company, v, FleetAlert.Type.MAINTENANCE_DUE,
-                FleetAlert.Severity.HIGH,
-                f"{v.plate_number} in maintenance",
-                f"Vehicle {v.plate_number} ({v.model}) is flagged for maintenance.")
-        else:
-            _resolve(company, v, FleetAlert.Type.MAINTENANCE_DUE)
-
-        # --- low fuel ----------------------------------------------------
-        fuel = v.fuel_level if v.fuel_level is not None else 100
-        if v.status == "Active" and fuel < LOW_FUEL_THRESHOLD:
-            created += _open_alert(
-                company, v, FleetAlert.Type.LOW_FUEL,
-                FleetAlert.Severity.CRITICAL,
-                f"{v.plate_number} low fuel",
-                f"Fuel level for {v.plate_number} is at {fuel}%.")
-        else:
-            _resolve(company, v, FleetAlert.Type.LOW_FUEL)
-
-        # --- offline (only for vehicles that HAVE reported before) --------
-        is_offline = (
-            v.status == "Active" and v.last_seen_at is not None
-            and vehicle_live_status(v, moving_speed, offline_timeout) == OFFLINE
-        )
-        if is_offline:
-            created += _open_alert(
-                company, v, FleetAlert.Type.VEHICLE_OFFLINE,
-                FleetAlert.Severity.MEDIUM,
-                f"{v.plate_number} went offline",
-                f"No recent telemetry from {v.plate_number}.")
-        else:
-            _resolve(company, v, FleetAlert.Type.VEHICLE_OFFLINE)
-
-    return created
+    """evaluate() for callers that only need the number of alerts created."""
+    return evaluate(company)[0]
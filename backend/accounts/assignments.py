@@ -7,6 +7,7 @@ from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone
 
+from . import live_versions
 from .models import DriverVehicleAssignment
 
 
@@ -23,10 +24,12 @@ def assign(vehicle, driver, by_user):
         raise AssignmentError("Driver and vehicle must belong to the same company.")
 
     now = timezone.now()
-    (DriverVehicleAssignment.objects
-        .filter(is_active=True)
-        .filter(Q(vehicle=vehicle) | Q(driver=driver))
-        .update(is_active=False, unassigned_at=now))
+    ended = (DriverVehicleAssignment.objects
+             .filter(is_active=True)
+             .filter(Q(vehicle=vehicle) | Q(driver=driver)))
+    # The driver's previous vehicle loses them from its Live Map row.
+    live_versions.touch(vehicle.company_id, *ended.values_list("vehicle_id", flat=True))
+    ended.update(is_active=False, unassigned_at=now)
 
     assignment = DriverVehicleAssignment.objects.create(
         company=vehicle.company, driver=driver, vehicle=vehicle,
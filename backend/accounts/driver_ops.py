@@ -19,6 +19,7 @@ from rest_framework.views import APIView
 from .models import (
     Driver, Trip, Vehicle, VehicleInspection, Incident, Expense, FleetAlert,
 )
+from .trip_metrics import metrics_for
 
 # The checklist the driver signs off. Kept server-side so every company gets
 # the same auditable list and the app cannot invent items.
@@ -98,6 +99,11 @@ class DriverTripActionView(APIView):
                     # Distance measured from the vehicle, not typed by an office.
                     if trip.start_odometer is not None:
                         trip.distance = odo - trip.start_odometer
+                if trip.end_odometer is None or trip.start_odometer is None:
+                    if trip.distance == 0:
+                        # No odometer pair: fall back to the distance measured
+                        # from the trip's GPS fixes.
+                        trip.distance = round(metrics_for(trip).distance_m / 1000)
                 trip.status = "COMPLETED"
                 trip.completed_at = now
                 trip.end_time = now
@@ -0,0 +1,178 @@
+"""
+Compact binary wire format for GPS fixes (application/vnd.pathnio.fixes).
+
+A JSON fix repeats ten key names and prints every float in full, ~250 bytes
+per fix. This format sends the same fields as one fixed-width 40-byte record,
+after an 18-byte header, all little-endian:
+
+  header  magic b"PNFX" | version u8 | flags u8 (reserved, 0) |
+          count u32 | base_time i64 (Unix milliseconds, UTC)
+
+  record  dt i32          ms since the PREVIOUS fix (the first: since
+                          base_time); signed, so out-of-order fixes still fit
+          lat, lng i32    degrees x 1e7 (~1 cm)
+          speed u16       cm/s
+          heading u16     centidegrees, 0xFFFF = null
+          accuracy u16    decimetres, 0xFFFF = null
+          altitude i32    centimetres, -2**31 = null
+          battery u8      percent, 0xFF = null
+          flags u8        bit0 is_moving, bit1 event_id present
+          event_id 16s    UUID bytes (zeros when absent)
+
+decode() turns records back into the same raw dicts the JSON endpoint
+receives, so LocationPingSerializer validates both formats identically.
+Bumping VERSION is how the layout changes; decoders reject unknown versions.
+"""
+import struct
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.utils.dateparse import parse_datetime
+
+from .telemetry import MalformedFix
+
+MEDIA_TYPE = "application/vnd.pathnio.fixes"
+MAGIC = b"PNFX"
+VERSION = 1
+
+HEADER = struct.Struct("<4sBBIq")
+RECORD = struct.Struct("<iiiHHHiBB16s")
+
+COORD_SCALE = 10_000_000
+NULL_U16 = 0xFFFF
+NULL_U8 = 0xFF
+NULL_I32 = -2 ** 31
+FLAG_MOVING = 0x01
+FLAG_EVENT_ID = 0x02
+
+# Records decoded per struct.iter_unpack() call when reading from a stream.
+DECODE_CHUNK_RECORDS = 4096
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_NO_EVENT = bytes(16)
+
+
+class CodecError(ValueError):
+    pass
+
+
+def _epoch_ms(value):
+    if isinstance(value, str):
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise CodecError(f"Invalid recorded_at: {value!r}")
+        value = parsed
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=dt_timezone.utc)
+    return round((value - _EPOCH).total_seconds() * 1000)
+
+
+def _scaled(value, scale, null, low, high):
+    if value is None:
+        return null
+    n = round(float(value) * scale)
+    if not low <= n <= high:
+        raise CodecError(f"Value {value!r} is out of range for the wire format.")
+    return n
+
+
+def encode(fixes) -> bytes:
+    """Encode fix dicts (the JSON field names) into one binary payload."""
+    fixes = list(fixes)
+    times = [_epoch_ms(f["recorded_at"]) for f in fixes]
+    base = times[0] if times else 0
+    out = [HEADER.pack(MAGIC, VERSION, 0, len(fixes), base)]
+    prev = base
+    for f, t in zip(fixes, times):
+        eid = f.get("event_id")
+        flags = (FLAG_MOVING if f.get("is_moving", True) else 0) | (FLAG_EVENT_ID if eid else 0)
+        out.append(RECORD.pack(
+            t - prev,
+            _scaled(f["lat"], COORD_SCALE, None, -90 * COORD_SCALE, 90 * COORD_SCALE),
+            _scaled(f["lng"], COORD_SCALE, None, -180 * COORD_SCALE, 180 * COORD_SCALE),
+            _scaled(f.get("speed") or 0, 100, None, 0, NULL_U16),
+            _scaled(f.get("heading"), 100, NULL_U16, 0, NULL_U16 - 1),
+            _scaled(f.get("accuracy"), 10, NULL_U16, 0, NULL_U16 - 1),
+            _scaled(f.get("altitude"), 100, NULL_I32, NULL_I32 + 1, 2 ** 31 - 1),
+            _scaled(f.get("battery"), 1, NULL_U8, 0, NULL_U8 - 1),
+            flags,
+            uuid.UUID(str(eid)).bytes if eid else _NO_EVENT,
+        ))
+        prev = t
+    return b"".join(out)
+
+
+def read_header(data):
+    """Validate a header; returns (count, base_time_ms)."""
+    if len(data) < HEADER.size:
+        raise CodecError("Payload is shorter than the header.")
+    magic, version, _flags, count, base = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise CodecError("Not a Pathnio fix payload.")
+    if version != VERSION:
+        raise CodecError(f"Unsupported fix format version {version}.")
+    return count, base
+
+
+def _records(buf, clock):
+    """Decode whole records from `buf`; `clock` is a one-item list carrying
+    the running timestamp (ms) across chunks."""
+    t = clock[0]
+    for dt, lat, lng, speed, heading, accuracy, altitude, battery, flags, eid in \
+            RECORD.iter_unpack(buf):
+        t += dt
+        fix = {
+            "lat": lat / COORD_SCALE,
+            "lng": lng / COORD_SCALE,
+            "speed": speed / 100,
+            "heading": None if heading == NULL_U16 else heading / 100,
+            "accuracy": None if accuracy == NULL_U16 else accuracy / 10,
+            "altitude": None if altitude == NULL_I32 else altitude / 100,
+            "battery": None if battery == NULL_U8 else battery,
+            "is_moving": bool(flags & FLAG_MOVING),
+            "recorded_at": _EPOCH + timedelta(milliseconds=t),
+        }
+        if flags & FLAG_EVENT_ID:
+            fix["event_id"] = eid.hex()  # UUIDField accepts the 32-hex form
+        yield fix
+    clock[0] = t
+
+
+def decode(data) -> list:
+    """Decode a complete in-memory payload into raw fix dicts."""
+    count, base = read_header(data)
+    body = memoryview(data)[HEADER.size:]
+    if len(body) != count * RECORD.size:
+        raise CodecError("Payload length does not match its record count.")
+    return list(_records(body, [base]))
+
+
+def _read(stream, size):
+    """read() until `size` bytes or EOF — a socket-backed stream may return
+    short reads."""
+    parts, got = [], 0
+    while got < size:
+        part = stream.read(size - got)
+        if not part:
+            break
+        parts.append(part)
+        got += len(part)
+    return b"".join(parts)
+
+
+def iter_decode(stream):
+    """Decode a payload from a file-like object, DECODE_CHUNK_RECORDS records
+    at a time (constant memory). A truncated tail is reported once as a
+    MalformedFix rather than silently dropped."""
+    count, base = read_header(_read(stream, HEADER.size))
+    clock = [base]
+    remaining = count
+    while remaining:
+        n = min(remaining, DECODE_CHUNK_RECORDS)
+        buf = _read(stream, n * RECORD.size)
+        whole = len(buf) // RECORD.size
+        yield from _records(memoryview(buf)[:whole * RECORD.size], clock)
+        remaining -= whole
+        if whole < n:
+            yield MalformedFix(f"Payload truncated: {remaining} of {count} records missing.")
+            return
@@ -7,8 +7,12 @@ Settings page) and fall back to Django settings / built-in defaults. This is
 what makes the tracking settings *actually do something*.
 """
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from django.utils import timezone
 
+from . import request_cache
+
 # Global defaults (used when a company has no CompanySettings row yet).
 MOVING_SPEED_KMH = getattr(settings, "FLEET_MOVING_SPEED_KMH", 5)
 # Must exceed the telemetry reporting interval (~45s on the Eco profile) with
@@ -27,19 +31,51 @@ AVAILABLE, ON_TRIP, DRIVER_OFFLINE, DRIVER_INACTIVE = (
 )
 
 
-def company_thresholds(company):
-    """(moving_speed_kmh, offline_timeout_seconds) for a company — from its
-    CompanySettings when present, else the global defaults."""
+# Seconds a company's thresholds stay in the shared cache. Saving
+# CompanySettings invalidates them (accounts/signals.py); with a per-process
+# cache (LocMem) other processes see the change within this window.
+THRESHOLDS_CACHE_SECONDS = getattr(settings, "FLEET_THRESHOLDS_CACHE_SECONDS", 60)
+
+
+def _thresholds_key(company_id):
+    return f"thresholds:{company_id}"
+
+
+def _load_thresholds(company_id):
     from .models import CompanySettings
-    cs = CompanySettings.objects.filter(company=company).first() if company else None
-    if cs:
-        return (
-            cs.moving_speed_kmh or MOVING_SPEED_KMH,
-            cs.offline_timeout_seconds or OFFLINE_TIMEOUT_SECONDS,
-        )
+    row = (CompanySettings.objects.filter(company_id=company_id)
+           .values_list("moving_speed_kmh", "offline_timeout_seconds").first())
+    if row:
+        return (row[0] or MOVING_SPEED_KMH, row[1] or OFFLINE_TIMEOUT_SECONDS)
     return (MOVING_SPEED_KMH, OFFLINE_TIMEOUT_SECONDS)
 
 
+def company_thresholds(company):
+    """(moving_speed_kmh, offline_timeout_seconds) for a company (instance or
+    id) — from its CompanySettings when present, else the global defaults.
+    Memoized per request and cached across requests."""
+    company_id = getattr(company, "pk", company)
+    if not company_id:
+        return (MOVING_SPEED_KMH, OFFLINE_TIMEOUT_SECONDS)
+
+    def lookup():
+        key = _thresholds_key(company_id)
+        value = cache.get(key)
+        if value is None:
+            value = _load_thresholds(company_id)
+            cache.set(key, value, timeout=THRESHOLDS_CACHE_SECONDS)
+        return tuple(value)
+    return request_cache.memoize("thresholds", company_id, lookup)
+
+
+def invalidate_thresholds(company_id):
+    key = _thresholds_key(company_id)
+    cache.delete(key)
+    request_cache.forget("thresholds", company_id)
+    # Again once committed, in case another request re-read the old row.
+    transaction.on_commit(lambda: cache.delete(key))
+
+
 def _is_recent(dt, timeout_seconds=OFFLINE_TIMEOUT_SECONDS) -> bool:
     if not dt:
         return False
@@ -0,0 +1,311 @@
+"""
+Geometry kernels for GPS tracks.
+
+Everything here works on whole arrays of coordinates at once: with NumPy
+installed (optional — it is not in requirements.txt) the kernels are
+vectorised; without it they fall back to loops over `array('d')` buffers,
+which keep memory at 8 bytes per value instead of a Python float object each.
+Results come back as numpy arrays or `array('d')` respectively; both index,
+iterate and len() the same way. HAVE_NUMPY tells which backend is active.
+
+Distances use the haversine formula on a spherical Earth (error < 0.5%,
+plenty for fleet tracks). Douglas-Peucker and point-to-segment distances use
+a local equirectangular projection, accurate at the few-kilometre scale
+between consecutive fixes.
+
+Scalar helpers (haversine_m, ...) remain for one-off calls. Geohashes
+(geohash_encode, geohash_cover) index latest positions for radius search.
+
+Benchmarks: python manage.py bench_geo [--sizes 1000 100000 10000000]
+"""
+import math
+from array import array
+
+try:  # optional accelerator
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+HAVE_NUMPY = np is not None
+
+EARTH_RADIUS_M = 6_371_008.8
+
+
+def as_array(values):
+    """Coerce a sequence of numbers to the active backend's float array."""
+    if HAVE_NUMPY:
+        return np.asarray(values, dtype=np.float64)
+    if isinstance(values, array) and values.typecode == "d":
+        return values
+    return array("d", values)
+
+
+# --- Scalar -----------------------------------------------------------------
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in metres between two points."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bearing_deg(lat1, lng1, lat2, lng2):
+    """Initial great-circle bearing in degrees [0, 360)."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dl = math.radians(lng2 - lng1)
+    y = math.sin(dl) * math.cos(p2)
+    x = math.cos(p1) * math.sin(p2) - math.sin(p1) * math.cos(p2) * math.cos(dl)
+    return math.degrees(math.atan2(y, x)) % 360
+
+
+# --- Array kernels ----------------------------------------------------------
+
+def haversine(lat1, lng1, lat2, lng2):
+    """Element-wise distance in metres between two equally long point arrays."""
+    if HAVE_NUMPY:
+        p1, p2 = np.radians(as_array(lat1)), np.radians(as_array(lat2))
+        dl = np.radians(as_array(lng2) - as_array(lng1))
+        a = np.sin((p2 - p1) / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+        return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    return array("d", map(haversine_m, lat1, lng1, lat2, lng2))
+
+
+def step_distances(lats, lngs):
+    """Length in metres of each step of a track: n points -> n-1 values."""
+    lats, lngs = as_array(lats), as_array(lngs)
+    return haversine(lats[:-1], lngs[:-1], lats[1:], lngs[1:])
+
+
+def cumulative_distance(lats, lngs):
+    """Distance travelled up to each point: n points -> n values, from 0."""
+    steps = step_distances(lats, lngs)
+    if HAVE_NUMPY:
+        return np.concatenate(([0.0], np.cumsum(steps)))
+    out = array("d", [0.0])
+    total = 0.0
+    for d in steps:
+        total += d
+        out.append(total)
+    return out
+
+
+def path_length_m(lats, lngs):
+    """Total length in metres of a track."""
+    if len(lats) < 2:
+        return 0.0
+    return float(sum(step_distances(lats, lngs)))
+
+
+def bearing(lat1, lng1, lat2, lng2):
+    """Element-wise initial bearing in degrees [0, 360)."""
+    if HAVE_NUMPY:
+        p1, p2 = np.radians(as_array(lat1)), np.radians(as_array(lat2))
+        dl = np.radians(as_array(lng2) - as_array(lng1))
+        y = np.sin(dl) * np.cos(p2)
+        x = np.cos(p1) * np.sin(p2) - np.sin(p1) * np.cos(p2) * np.cos(dl)
+        return np.degrees(np.arctan2(y, x)) % 360
+    return array("d", map(bearing_deg, lat1, lng1, lat2, lng2))
+
+
+def points_in_polygon(lats, lngs, polygon):
+    """Which points fall inside `polygon` (a ring of (lat, lng) vertices; the
+    closing vertex may be omitted). Even-odd ray casting in lat/lng space —
+    fine for geofences that do not cross the antimeridian. Returns a numpy
+    bool array or a list of bools."""
+    ring = list(polygon)
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring.pop()
+    if len(ring) < 3:
+        raise ValueError("A polygon needs at least three vertices.")
+    edges = list(zip(ring, ring[1:] + ring[:1]))
+    if HAVE_NUMPY:
+        y, x = as_array(lats), as_array(lngs)
+        inside = np.zeros(len(y), dtype=bool)
+        for (y1, x1), (y2, x2) in edges:
+            if y1 == y2:
+                continue
+            crosses = (y1 > y) != (y2 > y)
+            x_at = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+            inside ^= crosses & (x < x_at)
+        return inside
+    result = []
+    for y, x in zip(lats, lngs):
+        inside = False
+        for (y1, x1), (y2, x2) in edges:
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+        result.append(inside)
+    return result
+
+
+def _segment_distance_m(p, a, b):
+    """Distance in metres from point p to segment a-b; points are (lat, lng)."""
+    k = math.cos(math.radians((a[0] + b[0]) / 2))
+    ax, ay = a[1] * k, a[0]
+    bx, by = b[1] * k, b[0]
+    px, py = p[1] * k, p[0]
+    dx, dy = bx - ax, by - ay
+    if dx == 0 and dy == 0:
+        t = 0.0
+    else:
+        t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / (dx * dx + dy * dy)))
+    ex, ey = px - (ax + t * dx), py - (ay + t * dy)
+    return math.radians(math.hypot(ex, ey)) * EARTH_RADIUS_M
+
+
+def _farthest_numpy(y, x, first, last):
+    """(index, distance m) of the interior point of [first, last] farthest
+    from the chord, all interior points at once."""
+    k = math.cos(math.radians((y[first] + y[last]) / 2))
+    ax, ay, bx, by = x[first] * k, y[first], x[last] * k, y[last]
+    px, py = x[first + 1:last] * k, y[first + 1:last]
+    dx, dy = bx - ax, by - ay
+    norm = dx * dx + dy * dy
+    t = np.zeros_like(px) if norm == 0 else np.clip(((px - ax) * dx + (py - ay) * dy) / norm, 0, 1)
+    d = np.hypot(px - (ax + t * dx), py - (ay + t * dy))
+    i = int(np.argmax(d))
+    return first + 1 + i, math.radians(float(d[i])) * EARTH_RADIUS_M
+
+
+def simplify(lats, lngs, tolerance_m):
+    """Douglas-Peucker over a track given as coordinate arrays: indices of
+    the points kept, in order (endpoints always). Iterative, so a long track
+    cannot hit the recursion limit."""
+    n = len(lats)
+    if n <= 2:
+        return list(range(n))
+    keep = bytearray(n)
+    keep[0] = keep[-1] = 1
+    stack = [(0, n - 1)]
+    if HAVE_NUMPY:
+        y, x = as_array(lats), as_array(lngs)
+        while stack:
+            first, last = stack.pop()
+            if last - first < 2:
+                continue
+            index, worst = _farthest_numpy(y, x, first, last)
+            if worst > tolerance_m:
+                keep[index] = 1
+                stack.append((first, index))
+                stack.append((index, last))
+    else:
+        while stack:
+            first, last = stack.pop()
+            a, b = (lats[first], lngs[first]), (lats[last], lngs[last])
+            worst, index = 0.0, None
+            for i in range(first + 1, last):
+                d = _segment_distance_m((lats[i], lngs[i]), a, b)
+                if d > worst:
+                    worst, index = d, i
+            if index is not None and worst > tolerance_m:
+                keep[index] = 1
+                stack.append((first, index))
+                stack.append((index, last))
+    return [i for i in range(n) if keep[i]]
+
+
+def douglas_peucker(points, tolerance_m):
+    """simplify() for a sequence of (lat, lng) pairs."""
+    lats = as_array([p[0] for p in points])
+    lngs = as_array([p[1] for p in points])
+    return simplify(lats, lngs, tolerance_m)
+
+
+def thin_by_distance_time(points, times, min_distance_m, min_interval_s):
+    """Indices kept when a point is dropped unless it moved at least
+    `min_distance_m` from, or is at least `min_interval_s` seconds after, the
+    previously kept point. First and last points are always kept."""
+    n = len(points)
+    if n <= 2:
+        return list(range(n))
+    kept = [0]
+    last = 0
+    for i in range(1, n - 1):
+        moved = haversine_m(points[last][0], points[last][1], points[i][0], points[i][1])
+        waited = (times[i] - times[last]).total_seconds()
+        if moved >= min_distance_m or waited >= min_interval_s:
+            kept.append(i)
+            last = i
+    kept.append(n - 1)
+    return kept
+
+
+# --- Geohash ----------------------------------------------------------------
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9  # ~4.8 m x 4.8 m cells
+
+
+def geohash_encode(lat, lng, precision=GEOHASH_PRECISION):
+    """Standard base-32 geohash of a point."""
+    lat_lo, lat_hi, lng_lo, lng_hi = -90.0, 90.0, -180.0, 180.0
+    out, bits, ch, even = [], 0, 0, True
+    while len(out) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            ch = (ch << 1) | (lng >= mid)
+            lng_lo, lng_hi = (mid, lng_hi) if lng >= mid else (lng_lo, mid)
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            ch = (ch << 1) | (lat >= mid)
+            lat_lo, lat_hi = (mid, lat_hi) if lat >= mid else (lat_lo, mid)
+        even = not even
+        bits += 1
+        if bits == 5:
+            out.append(_BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(out)
+
+
+def geohash_cell_deg(precision):
+    """(lat degrees, lng degrees) spanned by a geohash cell."""
+    bits = 5 * precision
+    return 180 / 2 ** (bits // 2), 360 / 2 ** ((bits + 1) // 2)
+
+
+def geohash_cover(lat, lng, radius_m):
+    """Geohash prefixes whose cells together contain every point within
+    `radius_m` of (lat, lng): the cell of the point and its 8 neighbours, at
+    the finest precision whose cells are at least `radius_m` on each side.
+    None when the radius is too large for any prefix to narrow the search."""
+    edge_lat = min(90.0, abs(lat) + math.degrees(radius_m / EARTH_RADIUS_M))
+    metres_per_deg = math.radians(EARTH_RADIUS_M)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        h, w = geohash_cell_deg(precision)
+        if (h * metres_per_deg >= radius_m
+                and w * metres_per_deg * math.cos(math.radians(edge_lat)) >= radius_m):
+            break
+    else:
+        return None
+    cells = set()
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            y = max(-90.0, min(90.0, lat + dy * h))
+            x = (lng + dx * w + 180) % 360 - 180
+            cells.add(geohash_encode(y, x, precision))
+    return sorted(cells)
+
+
+# --- Encoding ---------------------------------------------------------------
+
+def _encode_value(value, out):
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        out.append(chr((0x20 | (value & 0x1F)) + 63))
+        value >>= 5
+    out.append(chr(value + 63))
+
+
+def encode_polyline(points, precision=5):
+    """Encoded Polyline Algorithm Format (as used by Google Maps, Leaflet and
+    Mapbox decoders) for a sequence of (lat, lng) pairs."""
+    factor = 10 ** precision
+    out, prev_lat, prev_lng = [], 0, 0
+    for lat, lng in points:
+        lat_i, lng_i = round(lat * factor), round(lng * factor)
+        _encode_value(lat_i - prev_lat, out)
+        _encode_value(lng_i - prev_lng, out)
+        prev_lat, prev_lng = lat_i, lng_i
+    return "".join(out)
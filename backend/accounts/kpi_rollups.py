@@ -0,0 +1,170 @@
+"""
+Daily fleet KPI rollups (DailyKpi) behind the kpis/ endpoint.
+
+Dashboard figures — trips completed, distance, revenue, expenses by category,
+fuel, incidents — used to be summed from Trip and Expense on every request,
+by the browser from whatever page of rows it had fetched. The rollup keeps
+them per company per day (in the company's time zone), split by vehicle and
+driver, so a report over a date range reads O(days) small rows.
+
+A day is rebuilt rather than patched: rebuild() regroups that day's trips,
+expenses and incidents from the raw tables (indexed on company + date) and
+replaces its rows. Edits, deletes, status changes and re-dated expenses are
+therefore exact without delta bookkeeping. The signals in accounts/signals.py
+mark the days a write touched (the old day too, when it moved) and rebuild
+them once the transaction commits; `manage.py rollup_kpis` backfills.
+Rebuilds of one company are serialised on its Company row, so two commits
+touching the same day cannot both delete and then both insert; the unique
+(company, day, vehicle, driver) constraint backs that up.
+
+Day attribution:
+  trips      completed trips, on the day they completed (completed_at, else
+             end_time, else start_time)
+  expenses   not rejected, on their `date`
+  incidents  on the day they were reported; incidents_open counts those of
+             the day still unresolved
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Company, CompanySettings, DailyKpi, Expense, Incident, Trip
+
+ZERO = Decimal("0")
+CENT = Decimal("0.01")
+
+
+def company_tz(company_id):
+    name = (CompanySettings.objects.filter(company_id=company_id)
+            .values_list("timezone", flat=True).first()) or "UTC"
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo("UTC")
+
+
+def _bounds(first, last, tz):
+    start = datetime.combine(first, time.min, tzinfo=tz)
+    end = datetime.combine(last + timedelta(days=1), time.min, tzinfo=tz)
+    return start, end
+
+
+def completed_moment(trip):
+    """When a trip counts as done, or None while it is not COMPLETED."""
+    if trip is None or trip.status != "COMPLETED":
+        return None
+    return trip.completed_at or trip.end_time or trip.start_time
+
+
+def rebuild(company_id, first, last=None):
+    """Recompute the company's rows for days first..last (inclusive)."""
+    last = last or first
+    tz = company_tz(company_id)
+    with transaction.atomic():
+        # Read under the lock too: a rebuild that waited must regroup what the
+        # one before it saw committed, not what it read beforehand.
+        Company.objects.select_for_update().filter(pk=company_id).first()
+        return _rebuild(company_id, first, last, tz)
+
+
+def _rebuild(company_id, first, last, tz):
+    start, end = _bounds(first, last, tz)
+    rows = defaultdict(lambda: DailyKpi(company_id=company_id, expenses_by_category={}))
+
+    def row(day, vehicle_id, driver_id):
+        r = rows[(day, vehicle_id, driver_id)]
+        r.day, r.vehicle_id, r.driver_id = day, vehicle_id, driver_id
+        return r
+
+    trips = (Trip.objects.filter(company_id=company_id, status="COMPLETED")
+             .annotate(done=Coalesce("completed_at", "end_time", "start_time"))
+             .filter(done__gte=start, done__lt=end)
+             .annotate(d=TruncDate("done", tzinfo=tz))
+             .values("d", "vehicle_ref_id", "driver_ref_id")
+             .annotate(n=Count("id"), km=Sum("distance"), rev=Sum("revenue")))
+    for t in trips:
+        r = row(t["d"], t["vehicle_ref_id"], t["driver_ref_id"])
+        r.trips_completed, r.distance_km, r.revenue = t["n"], t["km"] or 0, t["rev"] or ZERO
+
+    expenses = (Expense.objects.filter(company_id=company_id, date__gte=first, date__lte=last)
+                .exclude(approval="REJECTED")
+                .values("date", "vehicle_ref_id", "driver_ref_id", "category")
+                .annotate(total=Sum("amount"), liters=Sum("liters")))
+    for e in expenses:
+        r = row(e["date"], e["vehicle_ref_id"], e["driver_ref_id"])
+        total = (e["total"] or ZERO).quantize(CENT)
+        r.expenses = (r.expenses or ZERO) + total
+        r.expenses_by_category[e["category"]] = str(
+            Decimal(r.expenses_by_category.get(e["category"], "0")) + total)
+        r.fuel_liters = (r.fuel_liters or ZERO) + (e["liters"] or ZERO)
+
+    incidents = (Incident.objects.filter(company_id=company_id,
+                                         created_at__gte=start, created_at__lt=end)
+                 .annotate(d=TruncDate("created_at", tzinfo=tz))
+                 .values("d", "vehicle_id", "driver_id")
+                 .annotate(n=Count("id"), open=Count("id", filter=Q(resolved_at__isnull=True))))
+    for i in incidents:
+        r = row(i["d"], i["vehicle_id"], i["driver_id"])
+        r.incidents_opened, r.incidents_open = i["n"], i["open"]
+
+    DailyKpi.objects.filter(company_id=company_id, day__gte=first, day__lte=last).delete()
+    DailyKpi.objects.bulk_create(rows.values(), batch_size=500)
+    return len(rows)
+
+
+def schedule(company_id, *moments):
+    """Rebuild the company's days holding these dates / datetimes once the
+    current transaction commits (datetimes are placed in its time zone)."""
+    moments = [m for m in moments if m is not None]
+    if not company_id or not moments:
+        return
+
+    def run():
+        tz = company_tz(company_id)
+        days = {timezone.localtime(m, tz).date() if isinstance(m, datetime) else m
+                for m in moments}
+        for day in sorted(days):
+            rebuild(company_id, day)
+    transaction.on_commit(run)
+
+
+def detach(**owner):
+    """Drop the rows of a vehicle or driver that is being deleted
+    (detach(vehicle=v)) and rebuild their days once it is gone. Left to
+    SET_NULL they would become a second unattributed row of the day, which
+    the unique constraint rejects; the rebuild folds their trips and expenses,
+    now unattributed too, into that one row."""
+    rows = DailyKpi.objects.filter(**owner)
+    days = defaultdict(set)
+    for company_id, day in rows.values_list("company_id", "day"):
+        days[company_id].add(day)
+    rows.delete()
+    for company_id, company_days in days.items():
+        schedule(company_id, *company_days)
+
+
+# --- Reads -----------------------------------------------------------------
+
+_SUMS = ("trips_completed", "distance_km", "revenue", "expenses", "fuel_liters",
+         "incidents_opened", "incidents_open")
+
+
+def report(company_id, first, last, group="day"):
+    """KPI totals between two days, one entry per day / vehicle / driver."""
+    key = {"day": "day", "vehicle": "vehicle_id", "driver": "driver_id"}[group]
+    out = {}
+    for r in DailyKpi.objects.filter(company_id=company_id, day__gte=first, day__lte=last):
+        k = getattr(r, key)
+        entry = out.setdefault(k, {group: k, **{f: 0 for f in _SUMS}, "expenses_by_category": {}})
+        for f in _SUMS:
+            entry[f] += getattr(r, f)
+        for category, amount in r.expenses_by_category.items():
+            entry["expenses_by_category"][category] = (
+                entry["expenses_by_category"].get(category, ZERO) + Decimal(amount))
+    return sorted(out.values(), key=lambda e: (e[group] is None, e[group] or 0))
@@ -0,0 +1,207 @@
+"""
+Coalesced "latest state" writes for Vehicle and Driver.
+
+Every ingest used to end with vehicle.save(lat, lng, speed, last_seen_at) and
+driver.save(last_seen_at): two single-row UPDATEs on the hottest rows in the
+schema, once per phone every ~45 s. With FLEET_LATEST_STATE_FLUSH_SECONDS > 0
+ingest instead records the newest state in the shared cache and a flush turns
+everything recorded since the last one into ONE `UPDATE ... SET x = CASE id
+WHEN .. THEN .. END` per model (per FLUSH_BATCH rows), however many fixes
+arrived in between.
+
+  cache layout   latest:v:<id> / latest:d:<id>   newest state per row
+                 latest:seq                      dirty-log head (cache.incr)
+                 latest:dirty:<n>                (kind, id) touched by write n
+                 latest:flushed                  last log entry flushed
+
+The flush runs opportunistically from the request that finds the previous
+one older than the interval (guarded by a cache.add lock, so one at a time),
+and from `manage.py flush_latest_state` where a worker is available. The live
+map overlays the cached state (overlay_vehicles), so it never waits for the
+flush. The cache must be shared by every web process (Redis/Memcached) for
+this to be on; the default 0 keeps the original write-through behaviour.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Case, CharField, DateTimeField, F, FloatField, IntegerField, Value, When
+from django.utils import timezone
+
+from .geo import geohash_encode
+
+PREFIX = "latest:"
+SEQ = PREFIX + "seq"
+FLUSHED = PREFIX + "flushed"
+FLUSHED_AT = PREFIX + "flushed_at"
+STALLED = PREFIX + "stalled"
+LOCK = PREFIX + "flush-lock"
+
+# Rows per UPDATE statement (CASE arms) — keeps the statement under bound-
+# parameter limits.
+FLUSH_BATCH = 500
+
+
+def flush_seconds() -> float:
+    return float(getattr(settings, "FLEET_LATEST_STATE_FLUSH_SECONDS", 0) or 0)
+
+
+def _cache():
+    return caches[getattr(settings, "FLEET_LATEST_STATE_CACHE", "default")]
+
+
+def _ttl():
+    # Long enough to outlive several missed flushes; the DB is the fallback.
+    return max(3600, int(flush_seconds() * 20))
+
+
+def _vkey(pk):
+    return f"{PREFIX}v:{pk}"
+
+
+def _dkey(pk):
+    return f"{PREFIX}d:{pk}"
+
+
+def _next_seq(cache):
+    try:
+        return cache.incr(SEQ)
+    except ValueError:
+        cache.add(SEQ, 0, timeout=None)
+        return cache.incr(SEQ)
+
+
+def record(latest, *, vehicle=None, driver=None, now=None):
+    """Make `latest` (a stored LocationPing) the current position of `vehicle`
+    and mark `driver` present — written through, or coalesced when enabled.
+    The in-memory instances are updated either way."""
+    if latest is None:
+        return
+    now = now or timezone.now()
+    speed = max(0, round((latest.speed or 0) * 3.6))  # m/s -> km/h (Vehicle.speed)
+    if vehicle is not None:
+        vehicle.lat, vehicle.lng, vehicle.speed = latest.lat, latest.lng, speed
+        vehicle.geohash = geohash_encode(latest.lat, latest.lng)
+        vehicle.last_seen_at = now
+    if driver is not None:
+        driver.last_seen_at = now
+
+    if flush_seconds() <= 0:
+        if vehicle is not None:
+            vehicle.save(update_fields=["lat", "lng", "speed", "geohash", "last_seen_at"])
+        if driver is not None:
+            driver.save(update_fields=["last_seen_at"])
+        return
+
+    cache = _cache()
+    entries = {}
+    if vehicle is not None:
+        entries[_vkey(vehicle.pk)] = ("v", vehicle.pk, {
+            "lat": latest.lat, "lng": latest.lng, "speed": speed,
+            "geohash": vehicle.geohash, "last_seen_at": now})
+    if driver is not None:
+        entries[_dkey(driver.pk)] = ("d", driver.pk, {"last_seen_at": now})
+    current = cache.get_many(list(entries))
+    for key, (kind, pk, state) in entries.items():
+        # Newest wins: a drained backlog must not move a vehicle backwards.
+        if key in current and current[key]["last_seen_at"] > now:
+            continue
+        cache.set(key, state, timeout=_ttl())
+        cache.set(f"{PREFIX}dirty:{_next_seq(cache)}", (kind, pk), timeout=_ttl())
+    maybe_flush()
+
+
+def maybe_flush():
+    flushed_at = _cache().get(FLUSHED_AT)
+    if flushed_at is None:
+        _cache().add(FLUSHED_AT, timezone.now(), timeout=None)
+    elif (timezone.now() - flushed_at).total_seconds() >= flush_seconds():
+        flush()
+
+
+def _dirty_ids(cache):
+    """(vehicle ids, driver ids, last log entry consumed) since the previous
+    flush. An entry that is missing was either not written yet (a writer
+    between incr and set) or evicted; wait for it once, then move past it."""
+    start = (cache.get(FLUSHED) or 0) + 1
+    head = cache.get(SEQ) or 0
+    keys = [f"{PREFIX}dirty:{n}" for n in range(start, head + 1)]
+    log = cache.get_many(keys)
+    ids = {"v": set(), "d": set()}
+    last = start - 1
+    for n, key in zip(range(start, head + 1), keys):
+        if key not in log:
+            if cache.get(STALLED) != n:
+                cache.set(STALLED, n, timeout=None)
+                break
+        else:
+            kind, pk = log[key]
+            ids[kind].add(pk)
+        last = n
+    return ids["v"], ids["d"], last
+
+
+def unflushed_vehicle_ids():
+    """Ids of vehicles with a recorded state the DB row does not have yet —
+    their stored lat/lng/geohash may be stale. Empty when not coalescing."""
+    if flush_seconds() <= 0:
+        return set()
+    cache = _cache()
+    start = (cache.get(FLUSHED) or 0) + 1
+    head = cache.get(SEQ) or 0
+    log = cache.get_many([f"{PREFIX}dirty:{n}" for n in range(start, head + 1)])
+    return {pk for kind, pk in log.values() if kind == "v"}
+
+
+def _case(field, states, attr, output_field):
+    return Case(*[When(pk=pk, then=Value(s[attr])) for pk, s in states.items()],
+                default=F(field), output_field=output_field)
+
+
+def _bulk_update(model, states, fields):
+    updated = 0
+    items = list(states.items())
+    for i in range(0, len(items), FLUSH_BATCH):
+        chunk = dict(items[i:i + FLUSH_BATCH])
+        updated += model.objects.filter(pk__in=list(chunk)).update(**{
+            field: _case(field, chunk, field, output_field)
+            for field, output_field in fields})
+    return updated
+
+
+def flush():
+    """Write every state recorded since the previous flush. Returns the
+    number of rows updated; 0 when another process holds the flush."""
+    from .models import Driver, Vehicle
+    cache = _cache()
+    if not cache.add(LOCK, 1, timeout=60):
+        return 0
+    try:
+        vehicle_ids, driver_ids, last = _dirty_ids(cache)
+        found = cache.get_many([_vkey(pk) for pk in vehicle_ids]
+                               + [_dkey(pk) for pk in driver_ids])
+        vstates = {pk: found[_vkey(pk)] for pk in vehicle_ids if _vkey(pk) in found}
+        for state in vstates.values():  # recorded before geohashes were kept
+            state.setdefault("geohash", geohash_encode(state["lat"], state["lng"]))
+        dstates = {pk: found[_dkey(pk)] for pk in driver_ids if _dkey(pk) in found}
+        updated = _bulk_update(Vehicle, vstates, [
+            ("lat", FloatField()), ("lng", FloatField()), ("speed", IntegerField()),
+            ("geohash", CharField()), ("last_seen_at", DateTimeField())])
+        updated += _bulk_update(Driver, dstates, [("last_seen_at", DateTimeField())])
+        cache.set(FLUSHED, last, timeout=None)
+        cache.set(FLUSHED_AT, timezone.now(), timeout=None)
+        return updated
+    finally:
+        cache.delete(LOCK)
+
+
+def overlay_vehicles(vehicles):
+    """Apply not-yet-flushed state to Vehicle instances read from the DB."""
+    if flush_seconds() <= 0 or not vehicles:
+        return vehicles
+    states = _cache().get_many([_vkey(v.pk) for v in vehicles])
+    for v in vehicles:
+        s = states.get(_vkey(v.pk))
+        if s and (v.last_seen_at is None or s["last_seen_at"] > v.last_seen_at):
+            v.lat, v.lng, v.speed, v.last_seen_at = (
+                s["lat"], s["lng"], s["speed"], s["last_seen_at"])
+            v.geohash = s.get("geohash") or geohash_encode(s["lat"], s["lng"])
+    return vehicles
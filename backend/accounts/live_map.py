@@ -0,0 +1,165 @@
+"""
+Rows of the Live Map feed.
+
+One place builds what the map shows for a vehicle, so the polling endpoint
+(VehicleViewSet.live) and the streaming one (accounts/live_stream.py) can
+never disagree. `vehicle_rows` is the full snapshot — position, speed,
+driver, active trip + cargo, last update and the backend-computed live
+status — in a fixed number of queries however large the fleet; `position_row`
+is the subset that a single ingest changes.
+
+`delta_since` / `unchanged` answer pollers that already hold a version of the
+feed (?since= / If-None-Match) from accounts/live_versions.py.
+
+Viewports (?bbox=, ?zoom=) are filtered in the database on the (company, lat,
+lng) index, and below CLUSTER_BELOW_ZOOM the vehicles are grouped into grid
+cells by the database too (count + centroid per cell), so what a zoomed-out
+map costs depends on the screen, not on the fleet. Both work on the stored
+position, which trails the live one by at most the latest-state flush
+interval.
+"""
+from django.conf import settings
+from django.db.models import Avg, Count, F, Min, Q
+from django.db.models.functions import Floor
+
+from . import live_versions
+from .fleet_status import company_thresholds, has_valid_position, vehicle_live_status
+from .latest_state import overlay_vehicles
+from .models import Trip
+
+# Fields of a row that ingest can change; a stream delta carries only these.
+POSITION_FIELDS = ("lat", "lng", "speed", "has_valid_position", "last_seen_at", "live_status")
+
+# Below this zoom level a viewport is answered with clusters, not markers.
+CLUSTER_BELOW_ZOOM = getattr(settings, "LIVE_MAP_CLUSTER_BELOW_ZOOM", 12)
+# Edge of a cluster cell in screen pixels (256 px tiles).
+CLUSTER_CELL_PX = 64
+MAX_ZOOM = 22
+
+
+def position_row(vehicle, moving_speed, offline_timeout):
+    # A vehicle with no real GPS fix has NO position — we send null rather
+    # than a placeholder, so the map cannot draw a phantom marker (this is
+    # what put a vehicle in the ocean at 0,0).
+    valid = has_valid_position(vehicle)
+    return {
+        'id': vehicle.id,
+        'lat': vehicle.lat if valid else None,
+        'lng': vehicle.lng if valid else None,
+        'speed': vehicle.speed,
+        'has_valid_position': valid,
+        'last_seen_at': vehicle.last_seen_at,
+        'live_status': vehicle_live_status(vehicle, moving_speed, offline_timeout),
+    }
+
+
+def vehicle_rows(company, vehicles):
+    """Live Map rows for `vehicles` (a Vehicle queryset of `company`)."""
+    # Live status uses THIS company's configured thresholds (Settings page).
+    moving_speed, offline_timeout = company_thresholds(company)
+    active_trips = (Trip.objects.filter(company=company, status='ACTIVE',
+                                        vehicle_ref__in=vehicles.values('id'))
+                    .prefetch_related('cargos'))
+    vehicles = list(vehicles.prefetch_related('assignments__driver'))
+    # Positions recorded since the last latest-state flush live in the cache.
+    overlay_vehicles(vehicles)
+    trip_by_vehicle = {t.vehicle_ref_id: t for t in active_trips if t.vehicle_ref_id}
+
+    data = []
+    for v in vehicles:
+        assign = next((a for a in v.assignments.all() if a.is_active), None)
+        drv = assign.driver if assign else None
+        trip = trip_by_vehicle.get(v.id)
+        cargo = ([{'description': c.description, 'quantity': c.quantity,
+                   'cargo_type': c.cargo_type} for c in trip.cargos.all()]
+                 if trip else [])
+        row = {
+            'id': v.id, 'plate_number': v.plate_number, 'model': v.model,
+            'vehicle_type': v.vehicle_type, 'status': v.status,
+        }
+        row.update(position_row(v, moving_speed, offline_timeout))
+        row.update({
+            'driver': ({'id': drv.id, 'full_name': drv.full_name} if drv else None),
+            'trip': ({'id': trip.id, 'origin': trip.origin,
+                      'destination': trip.destination, 'status': trip.status}
+                     if trip else None),
+            'cargo': cargo,
+        })
+        data.append(row)
+    return data
+
+
+def delta_since(company, vehicles, since, token):
+    """The rows of `vehicles` that changed after version `since`, as
+    {version, full, vehicles, removed}; the whole fleet (full=True) when the
+    change log cannot tell."""
+    _, offline_timeout = company_thresholds(company)
+    changed = live_versions.changes(company.id, since, token, offline_timeout)
+    if changed is None:
+        return {'version': token, 'full': True,
+                'vehicles': vehicle_rows(company, vehicles), 'removed': []}
+    q, ids = changed
+    rows = vehicle_rows(company, vehicles.filter(q))
+    return {'version': token, 'full': False, 'vehicles': rows,
+            'removed': sorted(ids - {r['id'] for r in rows})}
+
+
+def unchanged(company, vehicles, etag, token):
+    """True when nothing in `vehicles` changed after version `etag`."""
+    _, offline_timeout = company_thresholds(company)
+    changed = live_versions.changes(company.id, etag, token, offline_timeout)
+    return changed is not None and not changed[1] and not vehicles.filter(changed[0]).exists()
+
+
+def parse_bbox(value):
+    """(west, south, east, north) from "min_lng,min_lat,max_lng,max_lat".
+    west > east is a box across the antimeridian."""
+    try:
+        west, south, east, north = (float(x) for x in value.split(","))
+    except ValueError:
+        raise ValueError('Must be "min_lng,min_lat,max_lng,max_lat".')
+    if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= north <= 90):
+        raise ValueError("Coordinates out of range.")
+    return west, south, east, north
+
+
+def parse_zoom(value):
+    try:
+        zoom = int(value)
+    except ValueError:
+        raise ValueError("Must be an integer.")
+    if not 0 <= zoom <= MAX_ZOOM:
+        raise ValueError(f"Must be between 0 and {MAX_ZOOM}.")
+    return zoom
+
+
+def in_viewport(vehicles, bbox):
+    """Vehicles with a real position inside `bbox`."""
+    west, south, east, north = bbox
+    lng = (Q(lng__gte=west, lng__lte=east) if west <= east
+           else Q(lng__gte=west) | Q(lng__lte=east))
+    return (vehicles.filter(Q(lat__gte=south, lat__lte=north) & lng,
+                            last_seen_at__isnull=False)
+            .exclude(lat=0, lng=0))
+
+
+def cell_degrees(zoom):
+    return CLUSTER_CELL_PX * 360 / (256 * 2 ** zoom)
+
+
+def clusters(vehicles, zoom):
+    """Vehicles grouped into grid cells of CLUSTER_CELL_PX at `zoom`: one
+    GROUP BY, one entry per occupied cell. A cell holding a single vehicle
+    names it, so the map can draw it as a marker."""
+    cell = cell_degrees(zoom)
+    cells = (vehicles.filter(lat__isnull=False, lng__isnull=False,
+                             last_seen_at__isnull=False)
+             .exclude(lat=0, lng=0)
+             .order_by()
+             .annotate(cell_y=Floor(F('lat') / cell), cell_x=Floor(F('lng') / cell))
+             .values('cell_y', 'cell_x')
+             .annotate(count=Count('id'), center_lat=Avg('lat'), center_lng=Avg('lng'),
+                       first_id=Min('id')))
+    return [{'lat': c['center_lat'], 'lng': c['center_lng'], 'count': c['count'],
+             'vehicle_id': c['first_id'] if c['count'] == 1 else None}
+            for c in cells]
@@ -0,0 +1,255 @@
+"""
+Server-Sent Events stream of the Live Map (vehicles/live/stream/).
+
+Polling vehicles/live/ every 4 s rebuilds the whole fleet for every open map,
+whether or not anything moved. The stream sends that snapshot once, then one
+small `position` event per vehicle as ingest updates it:
+
+    event: snapshot        data: [<row>, ...]          (as vehicles/live/)
+    event: position        data: {id, lat, lng, speed, has_valid_position,
+                                  last_seen_at, live_status}
+    : ping                 (comment every LIVE_STREAM_HEARTBEAT_SECONDS)
+
+Assignments, trips and cargo change rarely and outside ingest; they reach the
+map with a fresh snapshot every LIVE_STREAM_RESYNC_SECONDS, which also
+recomputes OFFLINE for vehicles that went quiet. Each heartbeat and resync
+also re-reads who the viewer belongs to, so a stream ends once they leave
+the company, are deactivated or the company is suspended.
+
+Fan-out is in-process: `broadcaster` keeps one bounded queue per open stream,
+and ingest (any thread) hands it an already-encoded frame. No broker is
+needed, but a stream only hears the ingests handled by the same process —
+run the ASGI server (backend/asgi.py) with a single worker, or swap
+`broadcaster` for a Redis pub/sub-backed one with the same publish/subscribe
+methods. A stream that falls behind gets a snapshot instead of a backlog.
+
+Streaming needs ASGI: under WSGI (the Vercel function in api/index.py) a
+request would pin a worker for good, so the ticket and stream views answer 501
+there (logged at debug: it is the expected answer, not a fault) and the
+dashboard keeps polling.
+
+EventSource cannot set headers, and an access token in a URL ends up in
+proxy and access logs. The dashboard instead POSTs for a ticket
+(vehicles/live/stream/ticket/): a signed user id that opens this stream only
+and expires after LIVE_STREAM_TICKET_SECONDS. Clients that can send headers
+may still use Authorization: Bearer.
+"""
+import asyncio
+import json
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from . import request_cache
+from .fleet_status import company_thresholds
+from .live_map import position_row, vehicle_rows
+from .models import Vehicle
+from .tenancy import TenantJWTAuthentication, company_for
+
+HEARTBEAT_SECONDS = getattr(settings, "LIVE_STREAM_HEARTBEAT_SECONDS", 15)
+RESYNC_SECONDS = getattr(settings, "LIVE_STREAM_RESYNC_SECONDS", 60)
+# Frames buffered per stream before it is considered lagging.
+QUEUE_SIZE = getattr(settings, "LIVE_STREAM_QUEUE_SIZE", 256)
+TICKET_SECONDS = getattr(settings, "LIVE_STREAM_TICKET_SECONDS", 30)
+TICKET_SALT = "accounts.live_stream.ticket"
+
+logger = logging.getLogger(__name__)
+
+# Queued instead of a frame when a stream overflowed: send a snapshot.
+RESYNC = object()
+
+
+def frame(event, data):
+    payload = json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":"))
+    return f"event: {event}\ndata: {payload}\n\n".encode()
+
+
+class Subscription:
+    """One open stream: a queue owned by the event loop that serves it."""
+
+    def __init__(self, company_id):
+        self.company_id = company_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+
+    def offer(self, item):
+        # Runs on self.loop. Dropping the backlog is safe: the snapshot that
+        # replaces it carries every vehicle's newest state.
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+
+class Broadcaster:
+    """In-process fan-out of encoded frames to the streams of a company."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subs = {}
+
+    def subscribe(self, company_id):
+        sub = Subscription(company_id)
+        with self._lock:
+            self._subs.setdefault(company_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subs.get(sub.company_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[sub.company_id]
+
+    def has_subscribers(self, company_id):
+        return company_id in self._subs
+
+    def publish(self, company_id, item):
+        """Queue `item` on every stream of the company. Thread-safe."""
+        with self._lock:
+            subs = list(self._subs.get(company_id, ()))
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub.offer, item)
+            except RuntimeError:  # loop closed under a stream being torn down
+                self.unsubscribe(sub)
+
+
+broadcaster = Broadcaster()
+
+
+def publish_position(vehicle):
+    """Announce `vehicle`'s new position to open streams once the ingest
+    that moved it has committed. Costs nothing while nobody is watching."""
+    if vehicle is None or not broadcaster.has_subscribers(vehicle.company_id):
+        return
+    moving_speed, offline_timeout = company_thresholds(vehicle.company_id)
+    item = frame("position", position_row(vehicle, moving_speed, offline_timeout))
+    transaction.on_commit(lambda: broadcaster.publish(vehicle.company_id, item))
+
+
+# --- View ------------------------------------------------------------------
+
+def issue_ticket(user):
+    return signing.dumps(user.pk, salt=TICKET_SALT)
+
+
+def _ticket_user(ticket):
+    try:
+        user_id = signing.loads(ticket, salt=TICKET_SALT, max_age=TICKET_SECONDS)
+    except signing.BadSignature:  # includes SignatureExpired
+        return None
+    return User.objects.filter(pk=user_id, is_active=True).first()
+
+
+def _authenticate(request):
+    """The user of the request's JWT (Authorization header) or ?ticket=."""
+    auth = TenantJWTAuthentication()
+    header = auth.get_header(request)
+    if not header:
+        ticket = request.GET.get("ticket")
+        return _ticket_user(ticket) if ticket else None
+    raw = auth.get_raw_token(header)
+    if not raw:
+        return None
+    try:
+        return auth.get_user(auth.get_validated_token(raw))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+
+
+def _needs_asgi(response_class=JsonResponse):
+    logger.debug("Live stream requested outside ASGI; the client polls instead.")
+    response = response_class({"detail": "Streaming needs the ASGI server; poll vehicles/live/."},
+                              status=501)
+    # Expected under WSGI: keep Django from logging it as a server error.
+    response._has_been_logged = True
+    return response
+
+
+class StreamTicketView(APIView):
+    """POST: a short-lived ticket for vehicles/live/stream/?ticket=."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        if not hasattr(request, "scope"):
+            return _needs_asgi(Response)
+        if company_for(request.user) is None:
+            return Response({"detail": "You do not belong to a company."},
+                            status=status.HTTP_403_FORBIDDEN)
+        return Response({"ticket": issue_ticket(request.user), "expires_in": TICKET_SECONDS})
+
+
+def _snapshot(company):
+    return frame("snapshot", vehicle_rows(company, Vehicle.objects.filter(company=company)))
+
+
+def _still_in(user, company):
+    """Whether `user` is still an active member of `company`, read afresh:
+    a stream outlives the request whose memo resolved it."""
+    user = User.objects.filter(pk=user.pk, is_active=True).first()
+    if user is None:
+        return False
+    request_cache.forget("membership", user.pk)
+    request_cache.forget("tenant", user.pk)
+    resolved = company_for(user)
+    return resolved is not None and resolved.pk == company.pk
+
+
+async def _events(user, company):
+    loop = asyncio.get_running_loop()
+    # Subscribe before reading the snapshot so no update falls in between.
+    sub = broadcaster.subscribe(company.id)
+    try:
+        yield f"retry: {HEARTBEAT_SECONDS * 1000}\n\n".encode()
+        yield await sync_to_async(_snapshot)(company)
+        resync_at = loop.time() + RESYNC_SECONDS
+        while True:
+            wait = max(0.0, min(HEARTBEAT_SECONDS, resync_at - loop.time()))
+            try:
+                item = await asyncio.wait_for(sub.queue.get(), wait)
+            except asyncio.TimeoutError:
+                item = None
+            if item is None or item is RESYNC or loop.time() >= resync_at:
+                if not await sync_to_async(_still_in)(user, company):
+                    return
+            if item is RESYNC or loop.time() >= resync_at:
+                yield await sync_to_async(_snapshot)(company)
+                resync_at = loop.time() + RESYNC_SECONDS
+                if item is RESYNC:
+                    continue
+            yield b": ping\n\n" if item is None else item
+    finally:
+        broadcaster.unsubscribe(sub)
+
+
+async def vehicle_stream(request):
+    if not hasattr(request, "scope"):
+        return _needs_asgi()
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."},
+                            status=401)
+    company = await sync_to_async(company_for)(user)
+    if company is None:
+        return JsonResponse({"detail": "You do not belong to a company."}, status=403)
+    response = StreamingHttpResponse(_events(user, company), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx: flush each event
+    return response
@@ -0,0 +1,146 @@
+"""
+Change tracking for the Live Map feed.
+
+Each company has a fleet version: a cache counter bumped whenever something
+shown on the map changes — an ingest moving a vehicle, an assignment, a trip
+or its cargo, the vehicle itself, or the company's thresholds. The bump also
+logs which vehicle changed, so a poller that says which version it already
+has gets back only those rows (or a 304 when nothing did):
+
+  cache layout   live:<c>:epoch   random id of this counter's lifetime
+                 live:<c>:ver     fleet version (cache.incr)
+                 live:<c>:log:<n> vehicle id changed by bump n (0 = all)
+
+A version token is "<epoch>.<version>.<unix time>[.<view>]". The time is
+when the client's copy was built: live_status is time-dependent (a vehicle that
+stops reporting turns OFFLINE with no event at all), so rows whose last fix
+crossed the offline timeout since then count as changed too. The view is a
+hash of the ?bbox= the copy was filtered by: a vehicle that sat still outside
+the old viewport never shows up in the log, so a token from another viewport
+gets the full set.
+
+Anything the log cannot answer — another epoch (the counter was evicted or
+lives in another process's LocMemCache), a gap in the log, more than
+MAX_DELTA bumps behind — gets the full fleet. Correct always, cheap when the
+cache is shared (Redis/Memcached) as in production.
+
+Bumps run on commit, and readers take the version before reading rows, so a
+token never claims a change the rows it came with do not contain.
+"""
+import hashlib
+import secrets
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+ALL = 0
+# Bumps a delta may span before the full fleet is cheaper to send.
+MAX_DELTA = 1000
+LOG_TTL = 24 * 3600
+
+
+def _key(company_id, suffix):
+    return f"live:{company_id}:{suffix}"
+
+
+def _version(company_id):
+    """Current fleet version, starting a new epoch when there is no counter:
+    tokens of the old one must not match a restarted count."""
+    version = cache.get(_key(company_id, "ver"))
+    if version is None:
+        cache.set(_key(company_id, "epoch"), secrets.token_hex(4), timeout=None)
+        cache.add(_key(company_id, "ver"), 0, timeout=None)
+        version = cache.get(_key(company_id, "ver"), 0)
+    return version
+
+
+def _bump(company_id, vehicle_ids):
+    for vehicle_id in vehicle_ids:
+        try:
+            n = cache.incr(_key(company_id, "ver"))
+        except ValueError:
+            _version(company_id)
+            n = cache.incr(_key(company_id, "ver"))
+        cache.set(_key(company_id, f"log:{n}"), vehicle_id, timeout=LOG_TTL)
+
+
+def touch(company_id, *vehicle_ids):
+    """Mark vehicles of a company changed once the current transaction
+    commits."""
+    ids = [v for v in dict.fromkeys(vehicle_ids) if v]
+    if company_id and ids:
+        transaction.on_commit(lambda: _bump(company_id, ids))
+
+
+def touch_all(company_id):
+    """Mark every vehicle of a company changed (e.g. new thresholds)."""
+    if company_id:
+        transaction.on_commit(lambda: _bump(company_id, [ALL]))
+
+
+def view_key(bbox):
+    """Short stable id of a viewport (west, south, east, north); "" for the
+    whole fleet."""
+    if bbox is None:
+        return ""
+    return hashlib.sha1(repr(tuple(map(float, bbox))).encode()).hexdigest()[:8]
+
+
+def current(company_id, view=""):
+    """Token for the fleet (or the viewport `view`) as of now."""
+    version = _version(company_id)
+    epoch = cache.get(_key(company_id, "epoch"))
+    if epoch is None:
+        cache.add(_key(company_id, "epoch"), secrets.token_hex(4), timeout=None)
+        epoch = cache.get(_key(company_id, "epoch"))
+    token = f"{epoch}.{version}.{int(time.time())}"
+    return f"{token}.{view}" if view else token
+
+
+def versions(company_ids):
+    """{company_id: "<epoch>.<version>"} for the companies that have a
+    counter, in one cache round trip. A value that differs from an earlier
+    one means something on that company's map changed in between."""
+    keys = []
+    for company_id in company_ids:
+        keys += [_key(company_id, "epoch"), _key(company_id, "ver")]
+    found = cache.get_many(keys)
+    return {
+        company_id: f"{found[_key(company_id, 'epoch')]}.{found[_key(company_id, 'ver')]}"
+        for company_id in company_ids
+        if _key(company_id, "epoch") in found and _key(company_id, "ver") in found
+    }
+
+
+def parse(token):
+    """(epoch, version, built_at, view) of a token, or None if it is not one."""
+    try:
+        epoch, version, ts, *view = (token or "").strip().removeprefix("W/").strip('"').split(".")
+        if len(view) > 1:
+            return None
+        return (epoch, int(version), datetime.fromtimestamp(int(ts), dt_timezone.utc),
+                view[0] if view else "")
+    except (ValueError, OverflowError, OSError):
+        return None
+
+
+def changes(company_id, since, token, offline_timeout):
+    """Filter (a Q on Vehicle) for what changed between token `since` and the
+    current `token`, plus the vehicle ids the log named. None when the full
+    fleet must be sent."""
+    old, new = parse(since), parse(token)
+    if old is None or new is None or old[0] != new[0] or old[1] > new[1] or old[3] != new[3]:
+        return None
+    if new[1] - old[1] > MAX_DELTA:
+        return None
+    logged = cache.get_many([_key(company_id, f"log:{n}") for n in range(old[1] + 1, new[1] + 1)])
+    if len(logged) != new[1] - old[1] or ALL in logged.values():
+        return None
+    ids = set(logged.values())
+    # Vehicles whose last fix aged past the offline timeout in between.
+    timeout = timedelta(seconds=offline_timeout)
+    expired = Q(last_seen_at__gt=old[2] - timeout, last_seen_at__lte=new[2] - timeout)
+    return (Q(id__in=ids) | expired), ids
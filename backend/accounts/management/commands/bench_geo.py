@@ -0,0 +1,76 @@
+"""
+Benchmark the geometry kernels in accounts/geo.py on synthetic tracks.
+
+For each size prints the time per kernel and per point. Reports which backend
+is active (NumPy or the array fallback). Pure CPU: no database access.
+
+Usage:  python manage.py bench_geo [--sizes 1000 100000 10000000] [--repeat 3]
+                                   [--simplify-max 1000000]
+"""
+import math
+import random
+import time
+from array import array
+
+from django.core.management.base import BaseCommand
+
+from accounts import geo
+
+# A rectangle around the synthetic track's area.
+FENCE = [(52.40, 13.30), (52.40, 13.50), (52.60, 13.50), (52.60, 13.30)]
+
+
+def _track(n, seed=7):
+    """A wandering vehicle track of n fixes, ~10-40 m apart."""
+    rnd = random.Random(seed)
+    lats, lngs = array("d"), array("d")
+    lat, lng, heading = 52.5, 13.4, 0.0
+    for _ in range(n):
+        heading += rnd.uniform(-0.3, 0.3)
+        step = rnd.uniform(1e-4, 4e-4)
+        lat += step * math.cos(heading)
+        lng += step * math.sin(heading) / 0.6
+        if not 52.0 < lat < 53.0:
+            heading += math.pi
+        lats.append(lat)
+        lngs.append(lng)
+    return geo.as_array(lats), geo.as_array(lngs)
+
+
+def _best(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class Command(BaseCommand):
+    help = "Time the geo kernels at several track sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[1_000, 100_000, 10_000_000])
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--simplify-max", type=int, default=1_000_000,
+                            help="Skip Douglas-Peucker above this many points "
+                                 "(it is O(n log n) at best).")
+
+    def handle(self, *args, **options):
+        backend = "numpy" if geo.HAVE_NUMPY else "array (pure Python)"
+        self.stdout.write(f"backend: {backend}")
+        self.stdout.write(f"{'points':>10} {'kernel':>20} {'seconds':>10} {'ns/point':>10}")
+        for size in options["sizes"]:
+            lats, lngs = _track(size)
+            kernels = [
+                ("haversine", lambda: geo.haversine(lats[:-1], lngs[:-1], lats[1:], lngs[1:])),
+                ("cumulative_distance", lambda: geo.cumulative_distance(lats, lngs)),
+                ("bearing", lambda: geo.bearing(lats[:-1], lngs[:-1], lats[1:], lngs[1:])),
+                ("points_in_polygon", lambda: geo.points_in_polygon(lats, lngs, FENCE)),
+            ]
+            if size <= options["simplify_max"]:
+                kernels.append(("simplify(5m)", lambda: geo.simplify(lats, lngs, 5.0)))
+            for name, fn in kernels:
+                t = _best(fn, options["repeat"])
+                self.stdout.write(f"{size:>10} {name:>20} {t:>10.4f} {t / size * 1e9:>10.1f}")
@@ -0,0 +1,64 @@
+"""
+Benchmark the batch telemetry ingest engine.
+
+Runs accounts.telemetry.ingest_fixes() at growing batch sizes and prints the
+per-fix wall time and the number of SQL statements per batch. The per-fix
+cost should stay flat (and the query count constant) as the batch grows —
+that is the whole point of the batch path.
+
+Everything is written inside a transaction that is rolled back, so the
+command leaves no rows behind.
+
+Usage:  python manage.py bench_ingest [--sizes 1 10 100 1000] [--repeat 3]
+"""
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.telemetry import ingest_fixes
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _fixes(n, start):
+    return [{
+        "event_id": str(uuid.uuid4()),
+        "lat": 52.5 + i * 1e-5, "lng": 13.4 + i * 1e-5, "speed": 8.3,
+        "heading": 90, "accuracy": 5, "battery": 80, "is_moving": True,
+        "recorded_at": (start + timedelta(seconds=i)).isoformat(),
+    } for i in range(n)]
+
+
+class Command(BaseCommand):
+    help = "Measure per-fix cost of the batch location ingest at several batch sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[1, 10, 100, 1000, 5000])
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'batch':>7} {'queries':>8} {'ms/batch':>10} {'us/fix':>9}")
+        for size in options["sizes"]:
+            best, queries = None, 0
+            for _ in range(options["repeat"]):
+                raw = _fixes(size, timezone.now())
+                try:
+                    with transaction.atomic():
+                        with CaptureQueriesContext(connection) as ctx:
+                            t0 = time.perf_counter()
+                            ingest_fixes(raw)
+                            elapsed = time.perf_counter() - t0
+                        queries = len(ctx.captured_queries)
+                        raise _Rollback
+                except _Rollback:
+                    pass
+                best = elapsed if best is None else min(best, elapsed)
+            self.stdout.write(
+                f"{size:>7} {queries:>8} {best * 1000:>10.2f} {best / size * 1e6:>9.1f}")
@@ -0,0 +1,64 @@
+"""
+Compare the JSON and binary (accounts/fix_codec.py) wire formats for GPS fixes.
+
+For each batch size prints the payload size (raw and gzip'd) and the time to
+decode it back into raw fix dicts. Pure CPU: no database access.
+
+Usage:  python manage.py bench_wire [--sizes 1 100 10000] [--repeat 5]
+"""
+import gzip
+import json
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts import fix_codec
+
+
+def _fixes(n):
+    start = timezone.now()
+    return [{
+        "event_id": str(uuid.uuid4()),
+        "lat": 52.520008 + i * 1e-5, "lng": 13.404954 + i * 1e-5,
+        "speed": 13.9, "heading": 87.5, "accuracy": 4.8, "altitude": 34.2,
+        "battery": 81, "is_moving": True,
+        "recorded_at": (start + timedelta(seconds=45 * i)).isoformat(),
+    } for i in range(n)]
+
+
+def _best(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class Command(BaseCommand):
+    help = "Payload size and decode time of JSON vs the binary fix format."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[1, 100, 10_000])
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'batch':>6} {'fmt':>6} {'bytes':>10} {'gzip':>10} {'B/fix':>7} {'decode us/fix':>14}")
+        for size in options["sizes"]:
+            fixes = _fixes(size)
+            as_json = json.dumps({"locations": fixes}).encode()
+            as_wire = fix_codec.encode(fixes)
+            rows = (
+                ("json", as_json, lambda: json.loads(as_json)),
+                ("binary", as_wire, lambda: fix_codec.decode(as_wire)),
+            )
+            for name, payload, decode in rows:
+                t = _best(decode, options["repeat"])
+                self.stdout.write(
+                    f"{size:>6} {name:>6} {len(payload):>10} {len(gzip.compress(payload)):>10} "
+                    f"{len(payload) / size:>7.1f} {t / size * 1e6:>14.2f}")
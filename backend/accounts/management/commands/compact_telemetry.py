@@ -0,0 +1,38 @@
+"""
+Apply per-company telemetry retention (accounts/retention.py): downsample
+fixes older than raw_telemetry_days and delete history beyond
+telemetry_retention_days. Resumable; safe to run from cron.
+
+Usage:  python manage.py compact_telemetry [--company ID ...] [--max-windows N]
+                                           [--dry-run]
+"""
+from django.core.management.base import BaseCommand
+
+from accounts import retention
+
+
+class Command(BaseCommand):
+    help = "Downsample and expire LocationPing history per company settings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--company", type=int, nargs="+", default=None,
+                            help="Only these company ids.")
+        parser.add_argument("--max-windows", type=int, default=None,
+                            help="Bound the work per company this run; the next "
+                                 "run resumes where this one stopped.")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Report what would be removed without deleting.")
+
+    def handle(self, *args, **options):
+        reports = retention.run(options["company"], max_windows=options["max_windows"],
+                                dry_run=options["dry_run"])
+        total = retention.RetentionReport("all")
+        for report in reports:
+            total.add(report)
+            self.stdout.write(self._line(report))
+        self.stdout.write(self._line(total))
+
+    @staticmethod
+    def _line(r):
+        return (f"company {r.company_id}: scanned {r.scanned}, kept {r.kept}, "
+                f"removed {r.removed}, expired {r.expired} ({r.windows} windows)")
@@ -0,0 +1,48 @@
+"""
+Store the fixes queued by the write-behind telemetry spool
+(accounts/telemetry_spool.py) in large transactions.
+
+Runs as a long-lived worker by default; --once drains what is queued and
+exits (e.g. from cron). Several workers may run: only one drains at a time.
+
+Usage:  python manage.py drain_telemetry_spool [--once] [--interval 1.0]
+                                               [--batch-fixes 5000] [--stats]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import telemetry_spool
+
+
+class Command(BaseCommand):
+    help = "Drain the write-behind telemetry spool into LocationPing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true",
+                            help="Drain what is queued now, then exit.")
+        parser.add_argument("--interval", type=float, default=1.0,
+                            help="Seconds to sleep when the spool is empty.")
+        parser.add_argument("--batch-fixes", type=int, default=5000,
+                            help="Fixes committed per transaction.")
+        parser.add_argument("--stats", action="store_true",
+                            help="Print queue depth and lag, then exit.")
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            for key, value in telemetry_spool.stats().items():
+                self.stdout.write(f"{key:>20}: {value}")
+            return
+        while True:
+            t0 = time.perf_counter()
+            report = telemetry_spool.drain(batch_fixes=options["batch_fixes"])
+            if report.records:
+                self.stdout.write(
+                    f"drained {report.records} records: {report.saved} saved, "
+                    f"{report.duplicates} duplicates, {report.corrupt} corrupt, "
+                    f"{report.quarantined} quarantined "
+                    f"in {(time.perf_counter() - t0) * 1000:.0f} ms")
+            if options["once"]:
+                return
+            if not report.records:
+                time.sleep(options["interval"])
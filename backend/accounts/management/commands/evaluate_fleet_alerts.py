@@ -0,0 +1,59 @@
+"""
+Evaluate fleet alerts for every tenant on a cadence (accounts/alert_evaluator.py),
+so offline vehicles are caught without anyone opening the alerts page and the
+alerts list stays a read.
+
+Runs as a long-lived worker by default; --once runs a single pass over every
+company (e.g. from cron). Run one worker: passes are idempotent, but two
+would race on the same alerts.
+
+Usage:  python manage.py evaluate_fleet_alerts [--once] [--interval 15]
+                                               [--sweep 60] [--verbose]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import alert_evaluator
+
+
+class Command(BaseCommand):
+    help = "Open and resolve fleet alerts for all companies on a schedule."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true",
+                            help="Evaluate every company once, then exit.")
+        parser.add_argument("--interval", type=float, default=None,
+                            help="Seconds between passes "
+                                 "(default: FLEET_ALERTS_EVALUATE_SECONDS).")
+        parser.add_argument("--sweep", type=float, default=None,
+                            help="Seconds after which an unchanged company is "
+                                 "re-evaluated (default: FLEET_ALERTS_SWEEP_SECONDS).")
+        parser.add_argument("--verbose", action="store_true",
+                            help="Report every evaluated company, not only "
+                                 "those whose alerts changed.")
+
+    def handle(self, *args, **options):
+        interval = options["interval"] or alert_evaluator.INTERVAL_SECONDS
+        evaluator = alert_evaluator.Evaluator(
+            sweep_seconds=options["sweep"] or alert_evaluator.SWEEP_SECONDS)
+        while True:
+            t0 = time.perf_counter()
+            reports = evaluator.run_once()
+            opened, resolved = evaluator.offline
+            if opened or resolved:
+                self.stdout.write(f"offline watchdog: {opened} opened, {resolved} resolved")
+            for r in reports:
+                if r.opened or r.resolved or options["verbose"]:
+                    self.stdout.write(
+                        f"company {r.company_id}: {r.opened} opened, {r.resolved} resolved "
+                        f"in {r.ms:.0f} ms{' (changed)' if r.changed else ''}")
+            if reports:
+                self.stdout.write(
+                    f"evaluated {len(reports)} companies: "
+                    f"{sum(r.opened for r in reports)} opened, "
+                    f"{sum(r.resolved for r in reports)} resolved "
+                    f"in {(time.perf_counter() - t0) * 1000:.0f} ms")
+            if options["once"]:
+                return
+            time.sleep(interval)
@@ -0,0 +1,33 @@
+"""
+Flush coalesced vehicle/driver latest state (accounts/latest_state.py) to the
+database in bulk UPDATEs. Requests flush opportunistically too; this worker
+keeps the interval steady when traffic is low.
+
+Usage:  python manage.py flush_latest_state [--once] [--interval 5]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import latest_state
+
+
+class Command(BaseCommand):
+    help = "Write cached vehicle/driver latest state to the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true",
+                            help="Flush once, then exit.")
+        parser.add_argument("--interval", type=float, default=None,
+                            help="Seconds between flushes "
+                                 "(default: FLEET_LATEST_STATE_FLUSH_SECONDS).")
+
+    def handle(self, *args, **options):
+        interval = options["interval"] or latest_state.flush_seconds() or 5
+        while True:
+            updated = latest_state.flush()
+            if updated:
+                self.stdout.write(f"flushed {updated} rows")
+            if options["once"]:
+                return
+            time.sleep(interval)
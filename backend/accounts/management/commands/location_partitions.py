@@ -0,0 +1,71 @@
+"""
+Maintain time-partitioned LocationPing storage (accounts/partitions.py).
+
+Run daily (cron) to keep partitions created ahead of time and, optionally,
+retire old history:
+
+  python manage.py location_partitions                    # create ahead
+  python manage.py location_partitions --ahead 6 --granularity week
+  python manage.py location_partitions --detach-older-than 365 [--drop]
+  python manage.py location_partitions --convert          # one-off, PostgreSQL
+
+On SQLite / an unconverted table, creating is a no-op and
+--detach-older-than deletes old rows in small chunks instead.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts import partitions
+
+
+class Command(BaseCommand):
+    help = "Create future LocationPing partitions and detach old ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ahead", type=int, default=3,
+                            help="Periods to create beyond the current one.")
+        parser.add_argument("--granularity", choices=[partitions.MONTH, partitions.WEEK],
+                            default=None,
+                            help="Partition width (default: TELEMETRY_PARTITION_GRANULARITY).")
+        parser.add_argument("--detach-older-than", type=int, default=None, metavar="DAYS",
+                            help="Retire history recorded more than DAYS ago.")
+        parser.add_argument("--drop", action="store_true",
+                            help="DROP detached partitions instead of keeping them "
+                                 "as standalone tables.")
+        parser.add_argument("--convert", action="store_true",
+                            help="Rebuild the table as a partitioned table (PostgreSQL; "
+                                 "locks the table while rows are copied).")
+        parser.add_argument("--keep-legacy", action="store_true",
+                            help="With --convert: keep the old table as "
+                                 f"{partitions.LEGACY}.")
+
+    def handle(self, *args, **options):
+        unit = options["granularity"]
+        if options["convert"]:
+            if not partitions.supported():
+                raise CommandError("Partitioning requires PostgreSQL.")
+            copied = partitions.convert(unit=unit, ahead=options["ahead"],
+                                        keep_legacy=options["keep_legacy"])
+            self.stdout.write(f"converted: {copied} rows copied")
+
+        if partitions.is_partitioned():
+            created = partitions.ensure_partitions(ahead=options["ahead"], unit=unit)
+            for name in created:
+                self.stdout.write(f"created {name}")
+            if not created:
+                self.stdout.write("partitions up to date")
+        else:
+            self.stdout.write("table is not partitioned; nothing to create")
+
+        days = options["detach_older_than"]
+        if days is not None:
+            cutoff = timezone.now().date() - timedelta(days=days)
+            gone = partitions.detach_before(cutoff, drop=options["drop"])
+            if isinstance(gone, list):
+                verb = "dropped" if options["drop"] else "detached"
+                for name in gone:
+                    self.stdout.write(f"{verb} {name}")
+            else:
+                self.stdout.write(f"deleted {gone} rows recorded before {cutoff}")
@@ -0,0 +1,26 @@
+"""
+Reset the driver/vehicle counters on Subscription (accounts/subscriptions.py)
+to the real counts wherever they drifted — after bulk imports, raw SQL or a
+restore that bypassed model signals. Safe to run from cron.
+
+Usage:  python manage.py reconcile_subscriptions [--company ID ...]
+"""
+from django.core.management.base import BaseCommand
+
+from accounts import subscriptions
+
+
+class Command(BaseCommand):
+    help = "Repair Subscription driver/vehicle counters that drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--company", type=int, nargs="+", default=None,
+                            help="Only these company ids.")
+
+    def handle(self, *args, **options):
+        fixed = subscriptions.reconcile(options["company"])
+        for company_id, (drivers, vehicles), (real_drivers, real_vehicles) in fixed:
+            self.stdout.write(
+                f"company {company_id}: drivers {drivers} -> {real_drivers}, "
+                f"vehicles {vehicles} -> {real_vehicles}")
+        self.stdout.write(f"reconciled {len(fixed)} subscriptions")
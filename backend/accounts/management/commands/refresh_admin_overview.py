@@ -0,0 +1,33 @@
+"""
+Recompute the platform admin overview (accounts/platform_admin.py) ahead of
+its expiry. Without this worker the first admin request after
+ADMIN_OVERVIEW_CACHE_SECONDS recomputes it in line; with it, and a cache
+shared by the web processes (Redis/Memcached), none does.
+
+Usage:  python manage.py refresh_admin_overview [--once] [--interval 25]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import platform_admin
+
+
+class Command(BaseCommand):
+    help = "Recompute and cache the platform admin overview."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true",
+                            help="Refresh once, then exit.")
+        parser.add_argument("--interval", type=float, default=None,
+                            help="Seconds between refreshes "
+                                 "(default: just under ADMIN_OVERVIEW_CACHE_SECONDS).")
+
+    def handle(self, *args, **options):
+        interval = options["interval"] or max(1, platform_admin.OVERVIEW_CACHE_SECONDS - 5)
+        while True:
+            data = platform_admin.refresh_overview()
+            self.stdout.write(f"overview refreshed: {data['companies']} companies")
+            if options["once"]:
+                return
+            time.sleep(interval)
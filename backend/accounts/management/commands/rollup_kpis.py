@@ -0,0 +1,50 @@
+"""
+Backfill the daily KPI rollups (accounts/kpi_rollups.py). Writes keep them
+current on their own; run this once after deploying, after a bulk import that
+bypassed model saves, or to repair a range. Rebuilding is idempotent.
+
+Usage:  python manage.py rollup_kpis [--company ID ...] [--since YYYY-MM-DD]
+                                     [--days 90]
+"""
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts import kpi_rollups
+from accounts.models import Company
+
+CHUNK_DAYS = 31
+
+
+class Command(BaseCommand):
+    help = "Rebuild DailyKpi rows from trips, expenses and incidents."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--company", type=int, nargs="+", default=None,
+                            help="Only these company ids.")
+        parser.add_argument("--since", default=None,
+                            help="First day to rebuild (YYYY-MM-DD); overrides --days.")
+        parser.add_argument("--days", type=int, default=90,
+                            help="Rebuild this many days up to today (default 90).")
+
+    def handle(self, *args, **options):
+        try:
+            since = date.fromisoformat(options["since"]) if options["since"] else None
+        except ValueError:
+            raise CommandError("--since must be YYYY-MM-DD.")
+        companies = Company.objects.order_by("id").values_list("id", flat=True)
+        if options["company"]:
+            companies = companies.filter(id__in=options["company"])
+        total = 0
+        for company_id in companies:
+            today = timezone.localtime(timezone.now(), kpi_rollups.company_tz(company_id)).date()
+            first = since or today - timedelta(days=options["days"] - 1)
+            rows = 0
+            while first <= today:
+                last = min(first + timedelta(days=CHUNK_DAYS - 1), today)
+                rows += kpi_rollups.rebuild(company_id, first, last)
+                first = last + timedelta(days=1)
+            total += rows
+            self.stdout.write(f"company {company_id}: {rows} rows")
+        self.stdout.write(f"rebuilt {total} rows")
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0032_vehicle_fuel_reported_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='companysettings',
+            name='downsample_distance_m',
+            field=models.PositiveIntegerField(default=25),
+        ),
+        migrations.AddField(
+            model_name='companysettings',
+            name='downsample_interval_seconds',
+            field=models.PositiveIntegerField(default=300),
+        ),
+        migrations.AddField(
+            model_name='companysettings',
+            name='downsample_method',
+            field=models.CharField(choices=[('distance_time', 'Distance / time'), ('douglas_peucker', 'Douglas-Peucker')], default='distance_time', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='companysettings',
+            name='raw_telemetry_days',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='companysettings',
+            name='telemetry_compacted_through',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='companysettings',
+            name='telemetry_retention_days',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0033_companysettings_telemetry_retention'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance_m', models.FloatField(default=0)),
+                ('moving_seconds', models.FloatField(default=0)),
+                ('idle_seconds', models.FloatField(default=0)),
+                ('max_speed', models.FloatField(default=0)),
+                ('avg_speed', models.FloatField(default=0)),
+                ('fix_count', models.PositiveIntegerField(default=0)),
+                ('first_fix_at', models.DateTimeField(blank=True, null=True)),
+                ('first_lat', models.FloatField(blank=True, null=True)),
+                ('first_lng', models.FloatField(blank=True, null=True)),
+                ('last_fix_at', models.DateTimeField(blank=True, null=True)),
+                ('last_lat', models.FloatField(blank=True, null=True)),
+                ('last_lng', models.FloatField(blank=True, null=True)),
+                ('last_speed', models.FloatField(default=0)),
+                ('last_is_moving', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('trip', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='metrics', to='accounts.trip')),
+                ('vehicle', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='trip_metrics', to='accounts.vehicle')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['vehicle', 'first_fix_at'], name='accounts_tr_vehicle_641732_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0034_tripmetrics'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['company', 'lat', 'lng'], name='accounts_ve_company_c970fc_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:01
+
+from django.db import migrations, models
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat, lng, precision=9):
+    """Frozen copy of accounts.geo.geohash_encode as of this migration."""
+    lat_lo, lat_hi, lng_lo, lng_hi = -90.0, 90.0, -180.0, 180.0
+    out, bits, ch, even = [], 0, 0, True
+    while len(out) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            ch = (ch << 1) | (lng >= mid)
+            lng_lo, lng_hi = (mid, lng_hi) if lng >= mid else (lng_lo, mid)
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            ch = (ch << 1) | (lat >= mid)
+            lat_lo, lat_hi = (mid, lat_hi) if lat >= mid else (lat_lo, mid)
+        even = not even
+        bits += 1
+        if bits == 5:
+            out.append(_BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(out)
+
+
+def backfill_geohash(apps, schema_editor):
+    """Geohash every vehicle that already has a position."""
+    Vehicle = apps.get_model('accounts', 'Vehicle')
+    vehicles = list(Vehicle.objects.filter(lat__isnull=False, lng__isnull=False)
+                    .only('id', 'lat', 'lng'))
+    for v in vehicles:
+        v.geohash = geohash_encode(v.lat, v.lng)
+    Vehicle.objects.bulk_update(vehicles, ['geohash'], batch_size=500)
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0035_vehicle_position_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehicle',
+            name='geohash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['company', 'geohash'], name='vehicle_company_geohash_idx',
+                               opclasses=['int8_ops', 'varchar_pattern_ops']),
+        ),
+        migrations.RunPython(backfill_geohash, noop_reverse),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0036_vehicle_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='companysettings',
+            name='gps_accuracy_alert_m',
+            field=models.PositiveIntegerField(default=100),
+        ),
+        migrations.AddField(
+            model_name='companysettings',
+            name='idle_alert_minutes',
+            field=models.PositiveIntegerField(default=20),
+        ),
+        migrations.AddField(
+            model_name='companysettings',
+            name='low_battery_percent',
+            field=models.PositiveIntegerField(default=15),
+        ),
+        migrations.AddField(
+            model_name='companysettings',
+            name='speed_limit_kmh',
+            field=models.PositiveIntegerField(default=110),
+        ),
+        migrations.AlterField(
+            model_name='fleetalert',
+            name='alert_type',
+            field=models.CharField(choices=[('VEHICLE_OFFLINE', 'Vehicle offline'), ('MAINTENANCE_DUE', 'Maintenance due'), ('LOW_FUEL', 'Low fuel'), ('SPEEDING', 'Excessive speed'), ('GPS_UNAVAILABLE', 'GPS unavailable'), ('IDLING', 'Long idling'), ('LOW_BATTERY', 'Device battery low'), ('INSPECTION_DEFECT', 'Inspection defect'), ('INCIDENT', 'Incident'), ('OTHER', 'Other')], default='OTHER', max_length=32),
+        ),
+    ]
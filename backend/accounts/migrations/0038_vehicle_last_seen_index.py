@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0037_alert_rules'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['last_seen_at'], name='accounts_ve_last_se_771fdd_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0038_vehicle_last_seen_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['company', '-date'], name='accounts_ex_company_f35b86_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fleetalert',
+            index=models.Index(fields=['company', '-created_at'], name='accounts_fl_company_090f0c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['company', '-start_time'], name='accounts_tr_company_2a5294_idx'),
+        ),
+    ]
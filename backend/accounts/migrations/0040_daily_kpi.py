@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0039_keyset_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyKpi',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('trips_completed', models.PositiveIntegerField(default=0)),
+                ('distance_km', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('expenses', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('expenses_by_category', models.JSONField(blank=True, default=dict)),
+                ('fuel_liters', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('incidents_opened', models.PositiveIntegerField(default=0)),
+                ('incidents_open', models.PositiveIntegerField(default=0)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_kpis', to='accounts.company')),
+                ('driver', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_kpis', to='accounts.driver')),
+                ('vehicle', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_kpis', to='accounts.vehicle')),
+            ],
+            options={
+                'ordering': ['day'],
+                'indexes': [models.Index(fields=['company', 'day'], name='accounts_da_company_7831e0_idx')],
+            },
+        ),
+    ]
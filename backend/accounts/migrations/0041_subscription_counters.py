@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:20
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_existing(apps, schema_editor):
+    Subscription = apps.get_model("accounts", "Subscription")
+    Driver = apps.get_model("accounts", "Driver")
+    Vehicle = apps.get_model("accounts", "Vehicle")
+
+    def counted(model):
+        return Coalesce(Subquery(
+            model.objects.filter(company_id=OuterRef("company_id")).order_by()
+            .values("company_id").annotate(n=Count("id")).values("n")), 0)
+    Subscription.objects.update(driver_count=counted(Driver), vehicle_count=counted(Vehicle))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0040_daily_kpi'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscription',
+            name='driver_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='vehicle_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:36
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def drop_duplicate_rows(apps, schema_editor):
+    # Overlapping rebuilds could insert a day's rows twice; each copy is a
+    # full regroup of the day, so keeping one of them is exact.
+    DailyKpi = apps.get_model("accounts", "DailyKpi")
+    dupes = (DailyKpi.objects.values("company_id", "day", "vehicle_id", "driver_id")
+             .annotate(n=Count("id"), keep=Min("id")).filter(n__gt=1).order_by())
+    for d in dupes:
+        (DailyKpi.objects.filter(company_id=d["company_id"], day=d["day"],
+                                 vehicle_id=d["vehicle_id"], driver_id=d["driver_id"])
+         .exclude(id=d["keep"]).delete())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0041_subscription_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailykpi',
+            constraint=models.UniqueConstraint(fields=('company', 'day', 'vehicle', 'driver'), name='uniq_daily_kpi_row', nulls_distinct=False),
+        ),
+    ]
@@ -1,4 +1,6 @@
 import uuid
+from datetime import timedelta
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -240,10 +242,22 @@ class Vehicle(models.Model):
     lng = models.FloatField(null=True, blank=True, default=None)
     speed = models.PositiveIntegerField(default=0)
     last_seen_at = models.DateTimeField(null=True, blank=True)  # last telemetry received
+    # Geohash of (lat, lng), kept by ingest; "" while there is no position.
+    # Radius search narrows candidates by prefix (accounts/nearby.py).
+    geohash = models.CharField(max_length=12, blank=True, default="", editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Viewport queries of the Live Map (accounts/live_map.py).
+            models.Index(fields=["company", "lat", "lng"]),
+            # Prefix scans (LIKE 'u33d%') need pattern ops on PostgreSQL.
+            models.Index(fields=["company", "geohash"], name="vehicle_company_geohash_idx",
+                         opclasses=["int8_ops", "varchar_pattern_ops"]),
+            # "Reported since" reads of the offline watchdog.
+            models.Index(fields=["last_seen_at"]),
+        ]
 
     def __str__(self):
         return f"{self.plate_number} ({self.model})"
@@ -284,6 +298,8 @@ class Trip(models.Model):
         ordering = ["-start_time"]
         indexes = [
             models.Index(fields=["company", "status"]),
+            # Keyset pages of the trips list (accounts/pagination.py).
+            models.Index(fields=["company", "-start_time"]),
             models.Index(fields=["driver_ref", "status"]),
         ]
 
@@ -327,11 +343,36 @@ class Expense(models.Model):
 
     class Meta:
         ordering = ["-date"]
+        indexes = [models.Index(fields=["company", "-date"])]
 
     def __str__(self):
         return f"{self.title} - {self.amount}"
 
 
+class LocationPingQuerySet(models.QuerySet):
+    """Time-bounded reads. On a partitioned table (accounts/partitions.py)
+    PostgreSQL only prunes partitions when recorded_at is constrained, so
+    history queries should come through these rather than a bare filter on
+    company/vehicle/trip."""
+
+    def between(self, start=None, end=None):
+        qs = self
+        if start is not None:
+            qs = qs.filter(recorded_at__gte=start)
+        if end is not None:
+            qs = qs.filter(recorded_at__lt=end)
+        return qs
+
+    def for_trip(self, trip, slack=timedelta(days=1)):
+        """A trip's fixes. A fix is tagged with the trip that was active when
+        it ARRIVED, so an offline backlog (or a skewed device clock) can carry
+        recorded_at outside start_time..end_time; `slack` widens the window to
+        cover them while still bounding the partitions scanned."""
+        start = trip.start_time - slack if trip.start_time else None
+        end = trip.end_time + slack if trip.end_time else None
+        return self.filter(trip=trip).between(start, end)
+
+
 class LocationPing(models.Model):
     """A single GPS fix reported by the Pathnio driver mobile app.
 
@@ -361,6 +402,8 @@ class LocationPing(models.Model):
     recorded_at = models.DateTimeField()          # device clock (when the fix was taken)
     created_at = models.DateTimeField(auto_now_add=True)  # server clock (when it arrived)
 
+    objects = LocationPingQuerySet.as_manager()
+
     class Meta:
         ordering = ["-recorded_at"]
         indexes = [
@@ -379,6 +422,39 @@ class LocationPing(models.Model):
         return f"{self.lat:.5f},{self.lng:.5f} @ {self.recorded_at:%Y-%m-%d %H:%M:%S}"
 
 
+class TripMetrics(models.Model):
+    """Movement summary of one trip, derived from its GPS fixes.
+
+    Maintained incrementally by accounts/trip_metrics.py as each ingest batch
+    lands, so reading a trip's distance / moving time never rescans its
+    LocationPing history. Speeds are m/s (as in LocationPing), distance metres.
+    """
+    trip = models.OneToOneField('Trip', on_delete=models.CASCADE, related_name="metrics")
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.SET_NULL, related_name="trip_metrics",
+                                null=True, blank=True)
+    distance_m = models.FloatField(default=0)
+    moving_seconds = models.FloatField(default=0)
+    idle_seconds = models.FloatField(default=0)
+    max_speed = models.FloatField(default=0)
+    avg_speed = models.FloatField(default=0)   # distance / moving time
+    fix_count = models.PositiveIntegerField(default=0)
+    first_fix_at = models.DateTimeField(null=True, blank=True)
+    first_lat = models.FloatField(null=True, blank=True)
+    first_lng = models.FloatField(null=True, blank=True)
+    last_fix_at = models.DateTimeField(null=True, blank=True)
+    last_lat = models.FloatField(null=True, blank=True)
+    last_lng = models.FloatField(null=True, blank=True)
+    last_speed = models.FloatField(default=0)
+    last_is_moving = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["vehicle", "first_fix_at"])]
+
+    def __str__(self):
+        return f"metrics<trip {self.trip_id}: {self.distance_m / 1000:.1f} km>"
+
+
 class Membership(models.Model):
     """Authoritative link between a user, the company (tenant) they belong to,
     and their role. This is the single source of truth the backend uses to
@@ -521,6 +597,8 @@ class FleetAlert(models.Model):
         LOW_FUEL = "LOW_FUEL", "Low fuel"
         SPEEDING = "SPEEDING", "Excessive speed"
         GPS_UNAVAILABLE = "GPS_UNAVAILABLE", "GPS unavailable"
+        IDLING = "IDLING", "Long idling"
+        LOW_BATTERY = "LOW_BATTERY", "Device battery low"
         INSPECTION_DEFECT = "INSPECTION_DEFECT", "Inspection defect"
         INCIDENT = "INCIDENT", "Incident"
         OTHER = "OTHER", "Other"
@@ -545,6 +623,7 @@ class FleetAlert(models.Model):
     class Meta:
         ordering = ["-created_at"]
         indexes = [
+            models.Index(fields=["company", "-created_at"]),
             models.Index(fields=["company", "acknowledged_at"]),
             models.Index(fields=["vehicle", "alert_type", "acknowledged_at"]),
             models.Index(fields=["company", "resolved_at"]),
@@ -572,6 +651,24 @@ class CompanySettings(models.Model):
     offline_timeout_seconds = models.PositiveIntegerField(default=300)
     moving_speed_kmh = models.PositiveIntegerField(default=5)
     telemetry_interval_seconds = models.PositiveIntegerField(default=45)
+    # Ingest-time alert rules (accounts/alert_rules.py); 0 disables a rule.
+    speed_limit_kmh = models.PositiveIntegerField(default=110)
+    idle_alert_minutes = models.PositiveIntegerField(default=20)
+    low_battery_percent = models.PositiveIntegerField(default=15)
+    gps_accuracy_alert_m = models.PositiveIntegerField(default=100)
+    # Telemetry retention (accounts/retention.py); 0 disables a step. Fixes
+    # older than raw_telemetry_days are downsampled; history older than
+    # telemetry_retention_days is deleted.
+    DOWNSAMPLE_CHOICES = [("distance_time", "Distance / time"),
+                          ("douglas_peucker", "Douglas-Peucker")]
+    raw_telemetry_days = models.PositiveIntegerField(default=0)
+    telemetry_retention_days = models.PositiveIntegerField(default=0)
+    downsample_method = models.CharField(max_length=20, choices=DOWNSAMPLE_CHOICES,
+                                         default="distance_time")
+    downsample_distance_m = models.PositiveIntegerField(default=25)
+    downsample_interval_seconds = models.PositiveIntegerField(default=300)
+    # Resume point: everything recorded before this has been downsampled.
+    telemetry_compacted_through = models.DateTimeField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
@@ -602,6 +699,13 @@ class Subscription(models.Model):
     status = models.CharField(max_length=12, choices=Status.choices, default=Status.TRIAL)
     started_at = models.DateTimeField(auto_now_add=True)
     current_period_end = models.DateTimeField(null=True, blank=True)
+    # The company's drivers / vehicles, kept by signals in the transaction of
+    # every create and delete (accounts/subscriptions.py) so the plan check
+    # and usage never count rows. Save with update_fields: a full save() of a
+    # stale instance would overwrite them. `manage.py reconcile_subscriptions`
+    # repairs drift from writes that bypass signals.
+    driver_count = models.PositiveIntegerField(default=0)
+    vehicle_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"sub<{self.company.company_name} / {self.plan.code} / {self.status}>"
@@ -689,3 +793,35 @@ class Incident(models.Model):
 
     def __str__(self):
         return f"incident<{self.kind}/{self.severity}>"
+
+
+class DailyKpi(models.Model):
+    """Per-day fleet KPIs (accounts/kpi_rollups.py), in the company's time
+    zone. One row per (company, day, vehicle, driver) that had activity;
+    vehicle/driver null = not attributed. A day's rows are rebuilt from the
+    raw tables whenever a trip, expense or incident of that day changes."""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name="daily_kpis")
+    day = models.DateField()
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.SET_NULL, null=True, blank=True,
+                                related_name="daily_kpis")
+    driver = models.ForeignKey(Driver, on_delete=models.SET_NULL, null=True, blank=True,
+                               related_name="daily_kpis")
+    trips_completed = models.PositiveIntegerField(default=0)
+    distance_km = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    expenses = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    expenses_by_category = models.JSONField(default=dict, blank=True)
+    fuel_liters = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    incidents_opened = models.PositiveIntegerField(default=0)
+    incidents_open = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["day"]
+        indexes = [models.Index(fields=["company", "day"])]
+        constraints = [
+            models.UniqueConstraint(fields=["company", "day", "vehicle", "driver"],
+                                    nulls_distinct=False, name="uniq_daily_kpi_row"),
+        ]
+
+    def __str__(self):
+        return f"kpi<{self.company_id} {self.day}>"
@@ -0,0 +1,69 @@
+"""
+Radius search over vehicles' latest positions ("closest available truck").
+
+Ingest keeps Vehicle.geohash in step with lat/lng (accounts/latest_state.py).
+A search first narrows the company's vehicles to the 3x3 block of geohash
+cells around the point, at the finest precision whose cells still span the
+radius — an indexed prefix scan on (company, geohash) — and only those
+candidates get an exact haversine distance. A radius too large for any
+prefix (thousands of km) scans the company's positioned vehicles instead.
+With coalesced writes the stored geohash can lag the cached position, so
+vehicles with an unflushed state are always candidates.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+from . import geo
+from .fleet_status import company_thresholds, has_valid_position, vehicle_live_status
+from .latest_state import overlay_vehicles, unflushed_vehicle_ids
+from .models import Trip
+
+MAX_RADIUS_M = 1_000_000
+MAX_LIMIT = 100
+
+
+def candidates(vehicles, lat, lng, radius_m):
+    """`vehicles` narrowed to those whose geohash can lie within the radius."""
+    prefixes = geo.geohash_cover(lat, lng, radius_m)
+    if not prefixes:
+        return vehicles.exclude(geohash="")
+    near = reduce(or_, (Q(geohash__startswith=p) for p in prefixes))
+    pending = unflushed_vehicle_ids()
+    if pending:
+        near |= Q(pk__in=pending)
+    return vehicles.filter(near)
+
+
+def available(vehicles):
+    """Vehicles that can take a new trip: in service and not on one."""
+    busy = Trip.objects.filter(status='ACTIVE', vehicle_ref__isnull=False).values('vehicle_ref')
+    return vehicles.filter(status='Active').exclude(id__in=busy)
+
+
+def nearest(company, vehicles, lat, lng, radius_m, limit):
+    """Up to `limit` of `vehicles` within `radius_m` of (lat, lng), nearest
+    first, each with its distance in metres."""
+    found = list(candidates(vehicles, lat, lng, radius_m).prefetch_related('assignments__driver'))
+    overlay_vehicles(found)
+    found = [v for v in found if has_valid_position(v)]
+    if not found:
+        return []
+    distances = geo.haversine([lat] * len(found), [lng] * len(found),
+                              [v.lat for v in found], [v.lng for v in found])
+    ranked = sorted(((float(d), v) for d, v in zip(distances, found) if d <= radius_m),
+                    key=lambda pair: pair[0])[:limit]
+    moving_speed, offline_timeout = company_thresholds(company)
+    rows = []
+    for distance, v in ranked:
+        assign = next((a for a in v.assignments.all() if a.is_active), None)
+        rows.append({
+            'id': v.id, 'plate_number': v.plate_number, 'vehicle_type': v.vehicle_type,
+            'status': v.status, 'lat': v.lat, 'lng': v.lng,
+            'distance_m': round(distance), 'last_seen_at': v.last_seen_at,
+            'live_status': vehicle_live_status(v, moving_speed, offline_timeout),
+            'driver': ({'id': assign.driver.id, 'full_name': assign.driver.full_name}
+                       if assign else None),
+        })
+    return rows
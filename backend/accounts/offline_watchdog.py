@@ -0,0 +1,133 @@
+"""
+Offline detection by deadline instead of by scanning.
+
+A vehicle goes OFFLINE when nothing happens — its last fix simply ages past
+the company's offline_timeout_seconds — so the fleet scan had to re-derive
+vehicle_live_status for every vehicle to notice. The watchdog keeps a sorted
+index (a heap) of each vehicle's deadline, last_seen_at + offline timeout, and
+on every tick:
+
+  1. reads only the vehicles that reported since the previous tick (indexed
+     on last_seen_at) and reschedules them; a vehicle that had been declared
+     offline and is reporting again has its alert resolved;
+  2. pops the deadlines that have passed and opens VEHICLE_OFFLINE for those
+     still Active.
+
+Work per tick is proportional to what changed, not to the fleet. Entries are
+never removed from the heap: a rescheduled vehicle leaves its old entry
+behind, and an entry whose last_seen_at is no longer the vehicle's is skipped
+when popped. A company whose offline timeout changed is rescheduled as a whole
+(`refresh_company`).
+
+The index lives in the process that ticks it (the alert evaluator, see
+accounts/alert_evaluator.py) and is rebuilt from one scan on start. The read
+in step 1 looks back SLACK_SECONDS past the previous tick, because
+last_seen_at is the time a fix was RECEIVED and can land in the database
+later than that (coalesced latest state, the telemetry spool).
+
+Drivers have no stored offline state or alert — their status is derived on
+read (fleet_status.driver_status) — so only vehicles are scheduled.
+"""
+import heapq
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .alerts_engine import offline_alert
+from .fleet_status import company_thresholds
+from .models import FleetAlert, Vehicle
+
+SLACK_SECONDS = getattr(settings, "FLEET_OFFLINE_WATCHDOG_SLACK_SECONDS", 120)
+
+
+class OfflineWatchdog:
+    def __init__(self, now=timezone.now):
+        self.now = now
+        self.heap = []          # (deadline, vehicle_id, last_seen_at)
+        self.vehicles = {}      # vehicle_id -> (company_id, last_seen_at)
+        self.fired = set()      # vehicle ids declared offline
+        self.watermark = None   # newest last_seen_at read so far
+        self.timeouts = {}      # company_id -> offline timeout scheduled with
+        self.started = False
+
+    def _schedule(self, vehicle_id, company_id, last_seen_at):
+        self.vehicles[vehicle_id] = (company_id, last_seen_at)
+        if company_id not in self.timeouts:
+            self.timeouts[company_id] = company_thresholds(company_id)[1]
+        heapq.heappush(self.heap, (self.deadline(vehicle_id), vehicle_id, last_seen_at))
+
+    def deadline(self, vehicle_id):
+        company_id, last_seen_at = self.vehicles[vehicle_id]
+        return last_seen_at + timedelta(seconds=self.timeouts[company_id])
+
+    def refresh_company(self, company_id):
+        """Reschedule a company's vehicles if its offline timeout changed."""
+        if company_id not in self.timeouts:
+            return
+        timeout = company_thresholds(company_id)[1]
+        if timeout == self.timeouts[company_id]:
+            return
+        self.timeouts[company_id] = timeout
+        for vehicle_id, (cid, last_seen_at) in list(self.vehicles.items()):
+            if cid == company_id:
+                self._schedule(vehicle_id, cid, last_seen_at)
+
+    def _read_reports(self, now):
+        """Schedule what reported since the last tick. Returns the ids of
+        declared-offline vehicles whose new deadline is still ahead."""
+        qs = Vehicle.objects.filter(last_seen_at__isnull=False)
+        if self.watermark is not None:
+            qs = qs.filter(last_seen_at__gt=self.watermark - timedelta(seconds=SLACK_SECONDS))
+        back = []
+        for vehicle_id, company_id, last_seen_at in qs.values_list(
+                "id", "company_id", "last_seen_at").iterator():
+            if self.vehicles.get(vehicle_id, (None, None))[1] == last_seen_at:
+                continue
+            self._schedule(vehicle_id, company_id, last_seen_at)
+            if vehicle_id in self.fired and self.deadline(vehicle_id) > now:
+                self.fired.discard(vehicle_id)
+                back.append(vehicle_id)
+            if self.watermark is None or last_seen_at > self.watermark:
+                self.watermark = last_seen_at
+        return back
+
+    def _pop_due(self, now):
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            _, vehicle_id, last_seen_at = heapq.heappop(self.heap)
+            known = self.vehicles.get(vehicle_id)
+            if known is not None and known[1] == last_seen_at and vehicle_id not in self.fired:
+                due.append(vehicle_id)
+        return due
+
+    def tick(self):
+        """Advance to now. Returns (opened, resolved) VEHICLE_OFFLINE alerts."""
+        now = self.now()
+        if not self.started:
+            # Open alerts from before a restart: declared already.
+            self.fired = set(FleetAlert.objects.filter(
+                alert_type=FleetAlert.Type.VEHICLE_OFFLINE, resolved_at__isnull=True,
+                vehicle__isnull=False).values_list("vehicle_id", flat=True))
+            self.started = True
+        back = self._read_reports(now)
+        resolved = 0
+        if back:
+            resolved = FleetAlert.objects.filter(
+                alert_type=FleetAlert.Type.VEHICLE_OFFLINE, vehicle_id__in=back,
+                resolved_at__isnull=True,
+            ).update(resolved_at=now)
+
+        due = self._pop_due(now)
+        if not due:
+            return 0, resolved
+        self.fired.update(due)
+        already = set(FleetAlert.objects.filter(
+            alert_type=FleetAlert.Type.VEHICLE_OFFLINE, vehicle_id__in=due,
+            resolved_at__isnull=True).values_list("vehicle_id", flat=True))
+        created = FleetAlert.objects.bulk_create([
+            offline_alert(v) for v in Vehicle.objects.filter(id__in=due, status="Active")
+                                     .only("id", "company_id", "plate_number")
+            if v.id not in already
+        ])
+        return len(created), resolved
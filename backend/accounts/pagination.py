@@ -0,0 +1,147 @@
+"""
+Keyset ("cursor") pagination for the API's list endpoints.
+
+PageNumberPagination answered page N with OFFSET (N-1)*size — the database
+still walks every skipped row — plus a COUNT(*) over the whole filtered table
+on every page, so trips, expenses and alerts got slower the further back one
+paged and the larger the tenant grew. A page here is instead "the next `size`
+rows after this one" in the list's ordering, with the row's id as the
+tie-breaker:
+
+    WHERE company = ? AND (start_time < :v OR (start_time = :v AND id < :id))
+    ORDER BY start_time DESC, id DESC LIMIT size + 1
+
+which the (company, <ordering>) indexes answer without scanning what came
+before. The ordering is the view's `keyset_ordering`, else the queryset's,
+else the model's Meta.ordering; it must start with a concrete field.
+
+Responses are {"next", "previous", "results"}; `next`/`previous` carry an
+opaque ?cursor=. No count is computed unless asked: ?count=estimate adds
+"count" from the PostgreSQL planner's row estimate (exact on other
+databases, where there are no planner statistics to read).
+"""
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def _encode(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def estimate_count(queryset):
+    """Rows `queryset` would return: the planner's estimate on PostgreSQL,
+    an exact COUNT elsewhere."""
+    qs = queryset.order_by().values("pk")
+    connection = connections[qs.db]
+    if connection.vendor != "postgresql":
+        return qs.count()
+    sql, params = qs.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+
+    def _ordering(self, queryset, view):
+        ordering = (getattr(view, "keyset_ordering", None)
+                    or queryset.query.order_by or queryset.model._meta.ordering)
+        if not ordering or not isinstance(ordering[0], str):
+            raise ImproperlyConfigured(f"{type(view).__name__}: keyset pagination needs an ordering.")
+        name = ordering[0].lstrip("-")
+        try:
+            field = queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            field = None
+        if field is None or not field.concrete or field.null:
+            raise ImproperlyConfigured(
+                f"{type(view).__name__}: keyset ordering must start with a non-null field, not {name!r}.")
+        return field, ordering[0].startswith("-")
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def _decode(self, raw, field):
+        try:
+            data = json.loads(base64.urlsafe_b64decode(raw.encode()).decode())
+            return field.to_python(data["v"]), int(data["i"]), bool(data.get("r"))
+        except Exception:
+            raise NotFound("Invalid cursor.")
+
+    def _cursor(self, row, reverse=False):
+        data = {"v": _encode(getattr(row, self.field.attname)), "i": row.pk}
+        if reverse:
+            data["r"] = 1
+        raw = base64.urlsafe_b64encode(json.dumps(data, separators=(",", ":")).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, raw)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.field, descending = self._ordering(queryset, view)
+        self.count = None
+        if request.query_params.get(self.count_query_param) == "estimate":
+            self.count = estimate_count(queryset)
+
+        size = self.get_page_size(request)
+        raw = request.query_params.get(self.cursor_query_param)
+        value, pk, reverse = self._decode(raw, self.field) if raw else (None, None, False)
+
+        # Walking backwards flips both the comparison and the order.
+        backwards = descending != reverse
+        name = self.field.name
+        order = ("-" if backwards else "") + name, ("-" if backwards else "") + "pk"
+        qs = queryset.order_by(*order)
+        if raw:
+            op = "lt" if backwards else "gt"
+            qs = qs.filter(Q(**{f"{name}__{op}": value}) | Q(**{name: value, f"pk__{op}": pk}))
+        rows = list(qs[:size + 1])
+        more, rows = len(rows) > size, rows[:size]
+        if reverse:
+            rows.reverse()
+            self.next = self._cursor(rows[-1]) if rows else None
+            self.previous = self._cursor(rows[0], reverse=True) if rows and more else None
+        else:
+            self.next = self._cursor(rows[-1]) if more else None
+            self.previous = self._cursor(rows[0], reverse=True) if raw and rows else None
+        return rows
+
+    def get_paginated_response(self, data):
+        body = {"next": self.next, "previous": self.previous}
+        if self.count is not None:
+            body["count"] = self.count
+        body["results"] = data
+        return Response(body)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "count": {"type": "integer", "description": "Only with ?count=estimate."},
+                "results": schema,
+            },
+        }
@@ -0,0 +1,139 @@
+"""
+Extra request parsers for the location-ingest endpoint.
+
+DRF's JSONParser reads and decodes the whole body before the view sees the
+first fix. A driver reconnecting after a day offline can have tens of
+thousands of fixes queued, so the ingest endpoint also accepts
+newline-delimited JSON (one fix object per line), optionally gzip-compressed
+with `Content-Encoding: gzip`. The parser does NOT materialise the upload: it
+returns a FixStream that decodes one line at a time while the view feeds
+accounts.telemetry.ingest_stream() in fixed-size chunks.
+
+The same streaming path serves the compact binary encoding defined in
+accounts/fix_codec.py (application/vnd.pathnio.fixes).
+
+Streams are usually sent with `Transfer-Encoding: chunked` and no
+Content-Length, which DRF reads as an empty body. unsized_body() hands such
+a body to the parser where the server has delimited it (ASGI, or a WSGI
+server that sets wsgi.input_terminated); otherwise the view answers 411.
+"""
+import gzip
+import json
+import zlib
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from . import fix_codec
+from .telemetry import MalformedFix
+
+# A single fix is a few hundred bytes; anything longer is not a fix.
+MAX_LINE_BYTES = 64 * 1024
+
+
+class FixStream:
+    """Lazily decoded sequence of raw fixes from a streamed upload.
+
+    Iterating yields one fix dict per record (or a MalformedFix for a record
+    that cannot be decoded, so it is reported at its index). It can only be
+    consumed once.
+    """
+
+    def __init__(self, records):
+        self._records = records
+
+    def __iter__(self):
+        try:
+            yield from self._records
+        except (OSError, EOFError, zlib.error) as exc:
+            # Corrupt / truncated gzip member: stop here; everything decoded
+            # so far has already been handed to storage.
+            yield MalformedFix(f"Upload could not be decompressed: {exc}")
+
+
+def _decompressed(stream, parser_context):
+    request = (parser_context or {}).get("request")
+    encoding = ""
+    if request is not None:
+        encoding = request.META.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+    if encoding in ("", "identity"):
+        return stream
+    if encoding in ("gzip", "x-gzip"):
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    raise ParseError(f"Unsupported Content-Encoding: {encoding}.")
+
+
+def _ndjson_records(stream, charset):
+    while True:
+        line = stream.readline(MAX_LINE_BYTES + 1)
+        if not line:
+            return
+        if len(line) > MAX_LINE_BYTES and not line.endswith(b"\n"):
+            # Skip the rest of the oversized record, then report it.
+            while line and not line.endswith(b"\n"):
+                line = stream.readline(MAX_LINE_BYTES + 1)
+            yield MalformedFix("Record exceeds the maximum line length.")
+            continue
+        line = line.strip()
+        if not line:
+            continue  # blank lines (e.g. the trailing newline) are not records
+        try:
+            yield json.loads(line.decode(charset))
+        except (UnicodeDecodeError, ValueError) as exc:
+            yield MalformedFix(f"Invalid JSON: {exc}")
+
+
+def unsized_body(request):
+    """For a chunked upload without Content-Length, point the DRF `request`
+    at the de-chunked body. False if this server cannot provide it."""
+    meta = request.META
+    if meta.get("CONTENT_LENGTH") or meta.get("HTTP_CONTENT_LENGTH"):
+        return True
+    if "chunked" not in meta.get("HTTP_TRANSFER_ENCODING", "").lower():
+        return True  # genuinely empty
+    django_request = request._request
+    environ = getattr(django_request, "environ", {})
+    if "wsgi.input" in environ:
+        if not environ.get("wsgi.input_terminated"):
+            return False  # reading to EOF could block on the socket
+        request._stream = environ["wsgi.input"]
+    else:
+        request._stream = django_request._stream  # ASGI: the spooled body
+    return True
+
+
+class NDJSONParser(BaseParser):
+    """application/x-ndjson: one JSON fix per line, optionally gzip'd."""
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return FixStream(iter(()))
+        charset = (parser_context or {}).get("encoding") or "utf-8"
+        return FixStream(_ndjson_records(_decompressed(stream, parser_context), charset))
+
+
+class FixBinaryParser(BaseParser):
+    """application/vnd.pathnio.fixes: the fixed-width binary fix format."""
+    media_type = fix_codec.MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return FixStream(iter(()))
+        source = _decompressed(stream, parser_context)
+        records = fix_codec.iter_decode(source)
+        try:
+            # Fail fast on a bad header/version (400) before anything is stored.
+            first = next(records, None)
+        except fix_codec.CodecError as exc:
+            raise ParseError(str(exc))
+        except (OSError, EOFError, zlib.error) as exc:
+            raise ParseError(f"Upload could not be decompressed: {exc}")
+        if first is None:
+            return FixStream(iter(()))
+        return FixStream(_prepend(first, records))
+
+
+def _prepend(first, rest):
+    yield first
+    yield from rest
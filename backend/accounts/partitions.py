@@ -0,0 +1,278 @@
+"""
+Time-partitioned storage for LocationPing history.
+
+On PostgreSQL the accounts_locationping table can be converted (once,
+explicitly — see `manage.py location_partitions --convert`) into a table
+PARTITIONED BY RANGE (recorded_at), one partition per month or ISO week:
+
+  accounts_locationping                 parent (no rows of its own)
+  accounts_locationping_p20261001       [2026-10-01, 2026-11-01)   monthly
+  accounts_locationping_p20261012       [2026-10-12, 2026-10-19)   weekly
+  accounts_locationping_default         anything outside every range (a phone
+                                        with a wildly wrong clock)
+
+When a range is created later for fixes that already sit in the default
+partition (a clock far in the future), those rows are moved into the new
+table before it is attached; PostgreSQL refuses to add the range otherwise.
+
+PostgreSQL requires every unique index on a partitioned table to contain the
+partition key, so the primary key becomes (id, recorded_at) and
+uniq_location_event_id becomes (event_id, recorded_at). Django's model keeps
+`id` as the primary key — ids stay unique via the shared identity sequence.
+
+Behaviour change: de-duplication is now per (event_id, recorded_at). The
+ingest engine bounds its event_id lookup by the batch's recorded_at span (on
+every database, so that the lookup prunes to the partitions concerned), and
+the partitioned unique index only catches a repeat with the same
+recorded_at. A retransmit must therefore repeat the fix's original
+recorded_at, as the driver app's offline queue does. A client that
+re-stamps a resent fix gets a second row.
+
+Queries prune only when they constrain recorded_at: use
+LocationPing.objects.between() / .for_trip() for time-range reads.
+
+Retention is then a cheap DETACH (+ DROP) of whole partitions instead of a
+huge DELETE. On SQLite (and unconverted PostgreSQL) the same entry points fall
+back to: nothing to create, and chunked DELETEs for retention.
+"""
+import re
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+TABLE = "accounts_locationping"
+LEGACY = TABLE + "_legacy"
+DEFAULT_PARTITION = TABLE + "_default"
+PREFIX = TABLE + "_p"
+
+# Rows per DELETE in the non-partitioned fallback: short statements, short locks.
+DELETE_CHUNK = 5000
+
+# Oldest history given its own partitions on --convert.
+MAX_BACKFILL_DAYS = 3 * 365
+
+MONTH = "month"
+WEEK = "week"
+
+
+def granularity():
+    return getattr(settings, "TELEMETRY_PARTITION_GRANULARITY", MONTH)
+
+
+def supported() -> bool:
+    return connection.vendor == "postgresql"
+
+
+def is_partitioned() -> bool:
+    if not supported():
+        return False
+    with connection.cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_partitioned_table p "
+                    "JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s", [TABLE])
+        return cur.fetchone() is not None
+
+
+# --- Period arithmetic ------------------------------------------------------
+
+def period_start(day: date, unit=None) -> date:
+    unit = unit or granularity()
+    if unit == WEEK:
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def next_period(start: date, unit=None) -> date:
+    unit = unit or granularity()
+    if unit == WEEK:
+        return start + timedelta(days=7)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def periods(first: date, last: date, unit=None):
+    """Period starts covering [first, last]."""
+    start = period_start(first, unit)
+    while start <= last:
+        yield start
+        start = next_period(start, unit)
+
+
+def partition_name(start: date) -> str:
+    return f"{PREFIX}{start:%Y%m%d}"
+
+
+def _bound(day: date) -> str:
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc).isoformat()
+
+
+# --- PostgreSQL -------------------------------------------------------------
+
+def existing_partitions():
+    """{period start: partition name} for the ranged partitions we created."""
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = %s", [TABLE])
+        names = [r[0] for r in cur.fetchall()]
+    found = {}
+    for name in names:
+        if name.startswith(PREFIX):
+            try:
+                found[datetime.strptime(name[len(PREFIX):], "%Y%m%d").date()] = name
+            except ValueError:
+                continue
+    return found
+
+
+def _create_partition(cur, start, unit):
+    """Add the range partition for the period beginning `start`. Call inside
+    a transaction: rows of that range already in the default partition are
+    moved into the new table before it is attached."""
+    name, low, high = partition_name(start), _bound(start), _bound(next_period(start, unit))
+    cur.execute(f'SELECT 1 FROM "{DEFAULT_PARTITION}" '
+                f"WHERE recorded_at >= %s AND recorded_at < %s LIMIT 1", [low, high])
+    if cur.fetchone() is None:
+        cur.execute(f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{TABLE}" '
+                    f"FOR VALUES FROM (%s) TO (%s)", [low, high])
+        return
+    cur.execute(f'CREATE TABLE "{name}" (LIKE "{TABLE}" INCLUDING DEFAULTS)')
+    cur.execute(
+        f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" '
+        f"WHERE recorded_at >= %s AND recorded_at < %s RETURNING *) "
+        f'INSERT INTO "{name}" SELECT * FROM moved', [low, high])
+    cur.execute(f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}" '
+                f"FOR VALUES FROM (%s) TO (%s)", [low, high])
+
+
+def ensure_partitions(ahead=3, unit=None, today=None):
+    """Create the current period's partition and `ahead` more. Returns the
+    names created; [] where partitioning is not in use."""
+    if not is_partitioned():
+        return []
+    unit = unit or granularity()
+    today = today or timezone.now().date()
+    have = existing_partitions()
+    start = period_start(today, unit)
+    created = []
+    for _ in range(ahead + 1):
+        if start not in have:
+            with transaction.atomic(), connection.cursor() as cur:
+                _create_partition(cur, start, unit)
+            created.append(partition_name(start))
+        start = next_period(start, unit)
+    return created
+
+
+def convert(unit=None, ahead=3, keep_legacy=False):
+    """Rebuild accounts_locationping as a range-partitioned table, copying
+    every row. Takes an exclusive lock for the duration: run it in a
+    maintenance window. Returns the number of rows copied."""
+    if not supported():
+        raise RuntimeError("Partitioning requires PostgreSQL.")
+    if is_partitioned():
+        return 0
+    unit = unit or granularity()
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute(f'LOCK TABLE "{TABLE}" IN ACCESS EXCLUSIVE MODE')
+        cur.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{LEGACY}"')
+        for name in _constraint_and_index_names(cur, LEGACY):
+            cur.execute(f'ALTER INDEX IF EXISTS "{name}" RENAME TO "{name}_legacy"')
+        cur.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{LEGACY}" INCLUDING DEFAULTS INCLUDING IDENTITY) '
+            f"PARTITION BY RANGE (recorded_at)")
+        cur.execute(f'ALTER TABLE "{TABLE}" ADD PRIMARY KEY (id, recorded_at)')
+        cur.execute(f'CREATE UNIQUE INDEX uniq_location_event_id ON "{TABLE}" '
+                    f"(event_id, recorded_at) WHERE event_id IS NOT NULL")
+        for col in ("company_id", "vehicle_id", "driver_id", "trip_id"):
+            cur.execute(f'CREATE INDEX "{TABLE}_{col}_rec" ON "{TABLE}" ({col}, recorded_at)')
+        cur.execute(f'CREATE INDEX "{TABLE}_event_id" ON "{TABLE}" (event_id)')
+        for col, target in (("company_id", "accounts_company"),
+                            ("driver_id", "accounts_driver"),
+                            ("vehicle_id", "accounts_vehicle"),
+                            ("trip_id", "accounts_trip")):
+            cur.execute(f'ALTER TABLE "{TABLE}" ADD FOREIGN KEY ({col}) '
+                        f'REFERENCES "{target}" (id) DEFERRABLE INITIALLY DEFERRED')
+        cur.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+
+        cur.execute(f'SELECT min(recorded_at), max(recorded_at) FROM "{LEGACY}"')
+        low, high = cur.fetchone()
+        today = timezone.now().date()
+        last = max(high.date() if high else today, today)
+        # Bad device clocks can put a fix decades back; those land in the
+        # default partition rather than spawning hundreds of empty ranges.
+        first = max(low.date() if low else today, last - timedelta(days=MAX_BACKFILL_DAYS))
+        for start in periods(first, last, unit):
+            _create_partition(cur, start, unit)
+        start = next_period(period_start(last, unit), unit)
+        for _ in range(ahead):
+            _create_partition(cur, start, unit)
+            start = next_period(start, unit)
+
+        cur.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{LEGACY}"')
+        copied = cur.rowcount
+        cur.execute(f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+                    f'coalesce((SELECT max(id) FROM "{TABLE}"), 1))', [TABLE])
+        if not keep_legacy:
+            cur.execute(f'DROP TABLE "{LEGACY}"')
+    return copied
+
+
+def _constraint_and_index_names(cur, table):
+    cur.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", [table])
+    return [r[0] for r in cur.fetchall()]
+
+
+# --- Retention --------------------------------------------------------------
+
+def detach_before(cutoff, drop=False):
+    """Remove history recorded before `cutoff` (a date).
+
+    Partitioned: detach every partition that ends on or before the cutoff
+    (and DROP it with drop=True); returns the partition names. Otherwise:
+    chunked DELETEs of rows older than the cutoff; returns the row count.
+    """
+    if is_partitioned():
+        gone = []
+        with connection.cursor() as cur:
+            for name, upper in _partition_bounds(cur):
+                if upper <= cutoff:
+                    cur.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+                    if drop:
+                        cur.execute(f'DROP TABLE "{name}"')
+                    gone.append(name)
+        return gone
+    return delete_before(datetime.combine(cutoff, time.min, tzinfo=dt_timezone.utc))
+
+
+def _partition_bounds(cur):
+    """(name, upper bound date) of every ranged partition, oldest first. Read
+    from the catalog, so monthly and weekly partitions left over from a
+    granularity switch are both handled."""
+    cur.execute(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = %s", [TABLE])
+    bounds = []
+    for name, expr in cur.fetchall():
+        match = _UPPER.search(expr or "")
+        if match:
+            bounds.append((name, date.fromisoformat(match.group(1))))
+    return sorted(bounds, key=lambda b: b[1])
+
+
+_UPPER = re.compile(r"TO \('(\d{4}-\d{2}-\d{2})")
+
+
+def delete_before(moment, chunk=DELETE_CHUNK):
+    """Delete fixes recorded before `moment` a chunk at a time (each DELETE is
+    its own short statement). Returns the number of rows deleted."""
+    from .models import LocationPing
+    deleted = 0
+    while True:
+        ids = list(LocationPing.objects.filter(recorded_at__lt=moment)
+                   .order_by().values_list("id", flat=True)[:chunk])
+        if not ids:
+            return deleted
+        deleted += LocationPing.objects.filter(id__in=ids).delete()[0]
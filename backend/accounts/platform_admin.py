@@ -5,97 +5,256 @@ This is the SUPER-admin surface (is_staff), distinct from a company owner: it
 sees ACROSS all companies to run the whole SaaS. Every endpoint here is gated
 by IsAdminUser, so a normal company owner can never reach it — the company
 isolation that protects tenants does not apply to the platform operator.
+
+The overview's platform-wide numbers are computed in two aggregate queries
+and cached for ADMIN_OVERVIEW_CACHE_SECONDS; past that the cached copy is
+still served (stale-while-revalidate) to every request but the one that
+recomputes it. That refresh runs inside the request, not in a thread: the
+Vercel WSGI function (api/index.py) freezes once it has answered, and a LocMem
+cache is per instance, so a thread's result might never land or never be
+seen. `manage.py refresh_admin_overview` keeps a shared cache warm so no
+request has to.
 """
+import csv
+import logging
+import time
 from datetime import timedelta
+from decimal import Decimal
 
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db.models import Count, Q
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from . import telemetry_spool
+from .pagination import KeysetPagination
 from .models import (
     Company, Driver, Vehicle, Trip, Expense, ContactMessage,
     Subscription, Plan, Membership, FleetAlert,
 )
 
+logger = logging.getLogger(__name__)
+
+OVERVIEW_CACHE_SECONDS = getattr(settings, "ADMIN_OVERVIEW_CACHE_SECONDS", 30)
+OVERVIEW_STALE_SECONDS = getattr(settings, "ADMIN_OVERVIEW_STALE_SECONDS", 300)
+OVERVIEW_KEY = "admin:overview"
+OVERVIEW_REFRESHING_KEY = "admin:overview:refreshing"
+
+
+def _single(queryset, **aggregates):
+    """`queryset` aggregated to one row, with no GROUP BY — usable as a
+    scalar subquery, and one row even over an empty table."""
+    return queryset.order_by().annotate(_one=Value(1)).values("_one").annotate(**aggregates)
+
+
+def _count(queryset):
+    return Subquery(_single(queryset, n=Count("pk")).values("n"))
+
+
+def overview_metrics():
+    """The overview's numbers in two queries: every scalar in one SELECT of
+    conditional aggregates and scalar subqueries, then the plan breakdown."""
+    month_ago = timezone.now() - timedelta(days=30)
+    active = Q(status=Subscription.Status.ACTIVE)
+
+    def subs(aggregate):
+        return Subquery(_single(Subscription.objects, v=aggregate).values("v"))
+
+    row = _single(
+        Company.objects,
+        companies=Count("pk"),
+        companies_new_30d=Count("pk", filter=Q(date_joined__gte=month_ago)),
+        users=_count(User.objects),
+        staff=_count(User.objects.filter(is_staff=True)),
+        drivers=_count(Driver.objects),
+        vehicles=_count(Vehicle.objects),
+        trips=_count(Trip.objects),
+        open_alerts=_count(FleetAlert.objects.filter(resolved_at__isnull=True)),
+        open_messages=_count(ContactMessage.objects.filter(status="open")),
+        # Monthly recurring revenue = sum of the plan price of every ACTIVE sub.
+        mrr=subs(Sum("plan__price_monthly", filter=active)),
+        subs_active=subs(Count("pk", filter=active)),
+        subs_trial=subs(Count("pk", filter=Q(status=Subscription.Status.TRIAL))),
+        subs_cancelled=subs(Count("pk", filter=Q(status=Subscription.Status.CANCELLED))),
+    ).values(
+        "companies", "companies_new_30d", "users", "staff", "drivers", "vehicles", "trips",
+        "open_alerts", "open_messages", "mrr", "subs_active", "subs_trial", "subs_cancelled",
+    ).get()
+    plan_rows = (
+        Subscription.objects.values("plan__code", "plan__name")
+        .annotate(count=Count("id"))
+        .order_by("-count")
+    )
+    mrr = Decimal(row.pop("mrr") or 0).quantize(Decimal("0.01"))
+    return {
+        **{k: v for k, v in row.items() if not k.startswith("subs_")},
+        "mrr": str(mrr),
+        "subscriptions": {
+            "active": row["subs_active"],
+            "trial": row["subs_trial"],
+            "cancelled": row["subs_cancelled"],
+        },
+        "plan_distribution": [
+            {"code": r["plan__code"], "name": r["plan__name"], "count": r["count"]}
+            for r in plan_rows
+        ],
+    }
+
+
+def refresh_overview():
+    """Recompute the overview and cache it."""
+    data = overview_metrics()
+    cache.set(OVERVIEW_KEY, {"at": time.time(), "data": data},
+              timeout=OVERVIEW_CACHE_SECONDS + OVERVIEW_STALE_SECONDS)
+    return data
+
+
+def cached_overview():
+    """overview_metrics(), at most OVERVIEW_CACHE_SECONDS old. Once older,
+    the first request to notice recomputes it; requests meanwhile (and that
+    one, if the refresh fails) get the stale copy, up to
+    OVERVIEW_STALE_SECONDS more."""
+    entry = cache.get(OVERVIEW_KEY)
+    if entry is None:
+        return refresh_overview()
+    if (time.time() - entry["at"] >= OVERVIEW_CACHE_SECONDS
+            and cache.add(OVERVIEW_REFRESHING_KEY, 1, timeout=60)):
+        try:
+            return refresh_overview()
+        except Exception:
+            logger.exception("admin overview refresh failed")
+        finally:
+            cache.delete(OVERVIEW_REFRESHING_KEY)
+    return entry["data"]
+
 
 class AdminOverviewView(APIView):
     """Top-line platform metrics for the admin dashboard."""
     permission_classes = [IsAdminUser]
 
     def get(self, request):
-        now = timezone.now()
-        month_ago = now - timedelta(days=30)
+        return Response(cached_overview())
 
-        subs = Subscription.objects.select_related("plan")
-        # Monthly recurring revenue = sum of the plan price of every ACTIVE sub.
-        mrr = sum(
-            (s.plan.price_monthly for s in subs if s.status == Subscription.Status.ACTIVE),
-            start=0,
-        )
-        plan_rows = (
-            Subscription.objects.values("plan__code", "plan__name")
-            .annotate(count=Count("id"))
-            .order_by("-count")
-        )
 
-        return Response({
-            "companies": Company.objects.count(),
-            "companies_new_30d": Company.objects.filter(date_joined__gte=month_ago).count(),
-            "users": User.objects.count(),
-            "staff": User.objects.filter(is_staff=True).count(),
-            "drivers": Driver.objects.count(),
-            "vehicles": Vehicle.objects.count(),
-            "trips": Trip.objects.count(),
-            "open_alerts": FleetAlert.objects.filter(resolved_at__isnull=True).count(),
-            "open_messages": ContactMessage.objects.filter(status="open").count(),
-            "mrr": str(mrr),
-            "subscriptions": {
-                "active": subs.filter(status=Subscription.Status.ACTIVE).count(),
-                "trial": subs.filter(status=Subscription.Status.TRIAL).count(),
-                "cancelled": subs.filter(status=Subscription.Status.CANCELLED).count(),
-            },
-            "plan_distribution": [
-                {"code": r["plan__code"], "name": r["plan__name"], "count": r["count"]}
-                for r in plan_rows
-            ],
-        })
+# --- Platform-wide lists ----------------------------------------------------
+
+LIST_PARAMS = ("cursor", "page_size", "search", "sort", "count", "export")
+EXPORT_CHUNK = 2000
+# Rows of the legacy parameterless answer; page past that with ?page_size=.
+PLAIN_LIMIT = getattr(settings, "ADMIN_LIST_PLAIN_LIMIT", 1000)
+# Leading characters a spreadsheet reads as a formula.
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+class _Echo:
+    """csv.writer target that hands each row back instead of buffering it."""
+    def write(self, value):
+        return value
+
+
+def _csv_cell(value):
+    """Quote user-entered text that Excel/Sheets would otherwise evaluate."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _export_csv(queryset, row, columns, filename):
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield writer.writerow(columns)
+        for obj in queryset.iterator(chunk_size=EXPORT_CHUNK):
+            data = row(obj)
+            yield writer.writerow([_csv_cell(data[c]) for c in columns])
+    response = StreamingHttpResponse(lines(), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def admin_list(request, view, queryset, row, *, search_fields, sorts, columns, filename):
+    """A platform-wide list: ?search= across `search_fields`, ?sort= one of
+    `sorts` (prefix - for descending; the first is the default), keyset pages
+    (accounts/pagination.py), or ?export=csv streamed in chunks.
+
+    Without any of these parameters the answer is the plain array older
+    clients read, cut at PLAIN_LIMIT rows."""
+    params = request.query_params
+    search = params.get("search", "").strip()
+    if search:
+        match = Q()
+        for field in search_fields:
+            match |= Q(**{f"{field}__icontains": search})
+        queryset = queryset.filter(match)
+    sort = params.get("sort") or sorts[0]
+    if sort.lstrip("-") not in {s.lstrip("-") for s in sorts}:
+        return Response({"sort": [f"Choose one of: {', '.join(s.lstrip('-') for s in sorts)}."]},
+                        status=400)
+    descending = "-" if sort.startswith("-") else ""
+    queryset = queryset.order_by(sort, f"{descending}pk")
+
+    if params.get("export") == "csv":
+        return _export_csv(queryset, row, columns, filename)
+    if not any(p in params for p in LIST_PARAMS):
+        return Response([row(obj) for obj in queryset[:PLAIN_LIMIT]])
+    view.keyset_ordering = [sort]
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(queryset, request, view=view)
+    return paginator.get_paginated_response([row(obj) for obj in page])
+
+
+def _count_of(model):
+    """Rows of `model` per company, as a correlated subquery (company index)."""
+    return Coalesce(Subquery(
+        model.objects.filter(company=OuterRef("pk")).order_by()
+        .values("company").annotate(n=Count("pk")).values("n")), 0)
 
 
 class AdminCompanyListView(APIView):
-    """Every company on the platform, with the numbers an operator needs."""
+    """Every company on the platform, with the numbers an operator needs.
+
+    ?search= (name, manager, owner email, phone), ?sort= date_joined |
+    company_name, ?cursor=/?page_size= for pages, ?export=csv for all of it."""
     permission_classes = [IsAdminUser]
+    columns = ("id", "company_name", "manager_full_name", "email", "phone", "date_joined",
+               "driver_count", "vehicle_count", "is_active", "plan", "plan_name",
+               "subscription_status")
+
+    @staticmethod
+    def row(c):
+        sub = getattr(c, "subscription", None)
+        return {
+            "id": c.id,
+            "company_name": c.company_name,
+            "manager_full_name": c.manager_full_name,
+            "email": c.user.email if c.user_id else "",
+            "phone": c.phone,
+            "date_joined": c.date_joined,
+            "driver_count": c.driver_count,
+            "vehicle_count": c.vehicle_count,
+            "is_active": c.user.is_active if c.user_id else False,
+            "plan": sub.plan.code if sub else None,
+            "plan_name": sub.plan.name if sub else None,
+            "subscription_status": sub.status if sub else None,
+        }
 
     def get(self, request):
         companies = (
             Company.objects
             .select_related("user", "subscription", "subscription__plan")
-            .annotate(
-                driver_count=Count("drivers", distinct=True),
-                vehicle_count=Count("vehicles", distinct=True),
-            )
-            .order_by("-date_joined")
+            .annotate(driver_count=_count_of(Driver), vehicle_count=_count_of(Vehicle))
         )
-        out = []
-        for c in companies:
-            sub = getattr(c, "subscription", None)
-            out.append({
-                "id": c.id,
-                "company_name": c.company_name,
-                "manager_full_name": c.manager_full_name,
-                "email": c.user.email if c.user_id else "",
-                "phone": c.phone,
-                "date_joined": c.date_joined,
-                "driver_count": c.driver_count,
-                "vehicle_count": c.vehicle_count,
-                "is_active": c.user.is_active if c.user_id else False,
-                "plan": sub.plan.code if sub else None,
-                "plan_name": sub.plan.name if sub else None,
-                "subscription_status": sub.status if sub else None,
-            })
-        return Response(out)
+        return admin_list(
+            request, self, companies, self.row,
+            search_fields=("company_name", "manager_full_name", "user__email", "phone"),
+            sorts=("-date_joined", "company_name"),
+            columns=self.columns, filename="companies.csv")
 
 
 class AdminCompanyActionView(APIView):
@@ -146,3 +305,11 @@ class AdminMessageListView(APIView):
             "created_at": m.created_at,
             "answered_at": m.answered_at,
         } for m in qs[:100]])
+
+
+class AdminTelemetrySpoolView(APIView):
+    """Depth and drain lag of the write-behind telemetry spool."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(telemetry_spool.stats())
@@ -0,0 +1,62 @@
+"""
+Request-scoped memoization.
+
+Lookups such as "the caller's membership", "this company's thresholds" or
+"this company's subscription" are asked for many times while serving one
+request — by permissions, querysets, serializers (once per row) and views.
+RequestCacheMiddleware opens a memo for the duration of each request and
+`memoize` answers repeats from it, so each lookup costs one query per request.
+
+Outside a request (management commands, the telemetry drainer, tests calling
+functions directly) there is no memo and every call computes afresh. Writes
+that change a memoized value call `forget` (see accounts/signals.py), so a
+request that changes a membership sees the change in its own later reads.
+"""
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+_memo = ContextVar("request_memo", default=None)
+
+
+class RequestCacheMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _memo.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            _memo.reset(token)
+
+    async def __acall__(self, request):
+        token = _memo.set({})
+        try:
+            return await self.get_response(request)
+        finally:
+            _memo.reset(token)
+
+
+def memoize(namespace, key, compute):
+    """compute() once per (namespace, key) per request."""
+    memo = _memo.get()
+    if memo is None:
+        return compute()
+    slot = (namespace, key)
+    if slot not in memo:
+        memo[slot] = compute()
+    return memo[slot]
+
+
+def forget(namespace, key):
+    memo = _memo.get()
+    if memo is not None:
+        memo.pop((namespace, key), None)
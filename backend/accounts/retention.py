@@ -0,0 +1,178 @@
+"""
+Telemetry retention and downsampling.
+
+Per company (CompanySettings):
+
+  raw_telemetry_days        every fix is kept this long; older fixes are
+                            reduced to a downsampled track
+  downsample_method         "distance_time": drop a fix unless it moved
+                            downsample_distance_m from the previous kept fix
+                            or came downsample_interval_seconds after it;
+                            "douglas_peucker": keep the shape within
+                            downsample_distance_m
+  telemetry_retention_days  hard horizon: history older than this is deleted
+
+Both steps are 0 (= off) by default, so history is kept until a company
+opts in.
+
+Downsampling walks forward from CompanySettings.telemetry_compacted_through
+one WINDOW of recorded_at at a time. Each window is streamed once and thinned
+per track (vehicle, driver, trip — so every trip keeps its own endpoints, and
+stop/start transitions of is_moving are always kept). Discarded rows are
+deleted DELETE_CHUNK at a time as the tracks are read, each chunk committed
+on its own, so no transaction holds a big tenant's window of row locks and
+memory stays bounded by one track. The watermark advances in its own short
+write once the window is done. An interrupted run resumes at the first
+unfinished window and thins it again; rows already deleted stay deleted.
+Fixes that arrive after their window was compacted (a very late offline
+backlog) are kept raw.
+"""
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import geo
+from .models import CompanySettings, LocationPing
+
+WINDOW = timedelta(hours=getattr(settings, "TELEMETRY_RETENTION_WINDOW_HOURS", 24))
+DELETE_CHUNK = 2000
+READ_CHUNK = 5000
+
+_TRACK_FIELDS = ("id", "vehicle_id", "driver_id", "trip_id",
+                 "lat", "lng", "recorded_at", "is_moving")
+
+
+class RetentionReport:
+    def __init__(self, company_id=None):
+        self.company_id = company_id
+        self.scanned = 0
+        self.kept = 0
+        self.removed = 0
+        self.expired = 0  # deleted by the hard horizon
+        self.windows = 0
+
+    def add(self, other):
+        for field in ("scanned", "kept", "removed", "expired", "windows"):
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+
+    def as_dict(self):
+        return {"company": self.company_id, "scanned": self.scanned, "kept": self.kept,
+                "removed": self.removed, "expired": self.expired, "windows": self.windows}
+
+
+def _delete_ids(ids):
+    """Delete `ids` DELETE_CHUNK at a time, each chunk its own transaction
+    (callers must not wrap this in atomic())."""
+    removed = 0
+    for i in range(0, len(ids), DELETE_CHUNK):
+        removed += LocationPing.objects.filter(id__in=ids[i:i + DELETE_CHUNK]).delete()[0]
+    return removed
+
+
+def _kept_indices(rows, cs):
+    points = [(r[4], r[5]) for r in rows]
+    if cs.downsample_method == "douglas_peucker":
+        kept = set(geo.douglas_peucker(points, cs.downsample_distance_m))
+    else:
+        kept = set(geo.thin_by_distance_time(points, [r[6] for r in rows],
+                                             cs.downsample_distance_m,
+                                             cs.downsample_interval_seconds))
+    # A stop or a start is an event, not noise.
+    for i in range(1, len(rows)):
+        if rows[i][7] != rows[i - 1][7]:
+            kept.update((i - 1, i))
+    return kept
+
+
+def downsample_window(cs, start, end, dry_run=False):
+    """Thin one company's fixes recorded in [start, end)."""
+    report = RetentionReport(cs.company_id)
+    rows = (LocationPing.objects
+            .filter(company_id=cs.company_id, recorded_at__gte=start, recorded_at__lt=end)
+            .order_by("vehicle_id", "driver_id", "trip_id", "recorded_at", "id")
+            .values_list(*_TRACK_FIELDS))
+    drop = []
+
+    def flush():
+        report.removed += len(drop) if dry_run else _delete_ids(drop)
+        drop.clear()
+
+    for _, track in groupby(rows.iterator(chunk_size=READ_CHUNK), key=lambda r: r[1:4]):
+        track = list(track)
+        kept = _kept_indices(track, cs)
+        report.scanned += len(track)
+        report.kept += len(kept)
+        drop.extend(r[0] for i, r in enumerate(track) if i not in kept)
+        if len(drop) >= DELETE_CHUNK:
+            flush()
+    flush()
+    report.windows = 1
+    return report
+
+
+def expire(cs, now, dry_run=False):
+    """Delete history beyond the company's hard horizon, in chunks."""
+    report = RetentionReport(cs.company_id)
+    if not cs.telemetry_retention_days:
+        return report
+    old = LocationPing.objects.filter(
+        company_id=cs.company_id,
+        recorded_at__lt=now - timedelta(days=cs.telemetry_retention_days))
+    if dry_run:
+        report.expired = report.scanned = old.count()
+        return report
+    while True:
+        ids = list(old.order_by().values_list("id", flat=True)[:DELETE_CHUNK])
+        if not ids:
+            return report
+        n = _delete_ids(ids)
+        report.expired += n
+        report.scanned += n
+
+
+def downsample(cs, now, max_windows=None, dry_run=False):
+    """Compact from the company's watermark up to now - raw_telemetry_days,
+    at most `max_windows` windows this run."""
+    report = RetentionReport(cs.company_id)
+    if not cs.raw_telemetry_days:
+        return report
+    until = now - timedelta(days=cs.raw_telemetry_days)
+    start = cs.telemetry_compacted_through
+    while max_windows is None or report.windows < max_windows:
+        # Jump straight to the next fix: empty stretches cost one query.
+        pending = LocationPing.objects.filter(company_id=cs.company_id, recorded_at__lt=until)
+        if start is not None:
+            pending = pending.filter(recorded_at__gte=start)
+        nxt = pending.order_by("recorded_at").values_list("recorded_at", flat=True).first()
+        if nxt is None:
+            if not dry_run:
+                cs.telemetry_compacted_through = until
+                cs.save(update_fields=["telemetry_compacted_through"])
+            break
+        if start is None or nxt >= start + WINDOW:
+            start = nxt
+        end = min(start + WINDOW, until)
+        report.add(downsample_window(cs, start, end, dry_run=dry_run))
+        if not dry_run:
+            # Only once the whole window is thinned.
+            cs.telemetry_compacted_through = end
+            cs.save(update_fields=["telemetry_compacted_through"])
+        start = end
+    return report
+
+
+def run(companies=None, *, now=None, max_windows=None, dry_run=False):
+    """Apply retention for every company that has it configured (or the
+    given company ids). Returns one RetentionReport per company."""
+    now = now or timezone.now()
+    qs = CompanySettings.objects.exclude(raw_telemetry_days=0, telemetry_retention_days=0)
+    if companies:
+        qs = qs.filter(company_id__in=companies)
+    reports = []
+    for cs in qs.order_by("company_id"):
+        report = expire(cs, now, dry_run=dry_run)
+        report.add(downsample(cs, now, max_windows=max_windows, dry_run=dry_run))
+        reports.append(report)
+    return reports
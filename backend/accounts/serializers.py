@@ -282,7 +282,7 @@ class DriverSerializer(serializers.ModelSerializer):
                 .select_related("vehicle").first()
             )
         vehicle = assignment.vehicle if assignment else None
-        _, offline_timeout = company_thresholds(obj.company)
+        _, offline_timeout = company_thresholds(obj.company_id)
         raw = driver_status(obj, has_active_trip, vehicle, offline_timeout)
         # Map engine states -> stable UI labels (display only).
         return {
@@ -430,6 +430,7 @@ class TripSerializer(serializers.ModelSerializer):
     driver_name = serializers.SerializerMethodField()
     vehicle_plate = serializers.SerializerMethodField()
     cargos = CargoSerializer(many=True, read_only=True)
+    metrics = serializers.SerializerMethodField()
 
     class Meta:
         model = Trip
@@ -443,6 +444,22 @@ class TripSerializer(serializers.ModelSerializer):
     def get_vehicle_plate(self, obj):
         return obj.vehicle_ref.plate_number if obj.vehicle_ref_id else (obj.plate_number or None)
 
+    def get_metrics(self, obj):
+        """GPS-derived movement summary (TripMetrics), None before any fix."""
+        m = getattr(obj, 'metrics', None)
+        if m is None:
+            return None
+        return {
+            'distance_km': round(m.distance_m / 1000, 2),
+            'moving_seconds': round(m.moving_seconds),
+            'idle_seconds': round(m.idle_seconds),
+            'max_speed_kmh': round(m.max_speed * 3.6, 1),
+            'avg_speed_kmh': round(m.avg_speed * 3.6, 1),
+            'fix_count': m.fix_count,
+            'first_fix_at': m.first_fix_at,
+            'last_fix_at': m.last_fix_at,
+        }
+
 
 class ExpenseSerializer(serializers.ModelSerializer):
     class Meta:
@@ -506,8 +523,12 @@ class CompanySettingsSerializer(serializers.ModelSerializer):
         model = CompanySettings
         fields = ('id', 'timezone', 'distance_unit', 'currency',
                   'offline_timeout_seconds', 'moving_speed_kmh',
-                  'telemetry_interval_seconds', 'updated_at')
-        read_only_fields = ('id', 'updated_at')
+                  'telemetry_interval_seconds', 'speed_limit_kmh', 'idle_alert_minutes',
+                  'low_battery_percent', 'gps_accuracy_alert_m', 'raw_telemetry_days',
+                  'telemetry_retention_days', 'downsample_method',
+                  'downsample_distance_m', 'downsample_interval_seconds',
+                  'telemetry_compacted_through', 'updated_at')
+        read_only_fields = ('id', 'telemetry_compacted_through', 'updated_at')
 
     def validate_offline_timeout_seconds(self, v):
         if v < 10 or v > 86400:
@@ -519,6 +540,21 @@ class CompanySettingsSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Moving-speed threshold must be between 0 and 300 km/h.")
         return v
 
+    def validate_speed_limit_kmh(self, v):
+        if v > 300:
+            raise serializers.ValidationError("Speed limit must be between 0 (off) and 300 km/h.")
+        return v
+
+    def validate_idle_alert_minutes(self, v):
+        if v > 1440:
+            raise serializers.ValidationError("Idle alert must be between 0 (off) and 1440 minutes.")
+        return v
+
+    def validate_low_battery_percent(self, v):
+        if v > 100:
+            raise serializers.ValidationError("Low battery alert must be between 0 (off) and 100%.")
+        return v
+
     def validate_telemetry_interval_seconds(self, v):
         if v < 5 or v > 3600:
             raise serializers.ValidationError("Telemetry interval must be between 5 and 3600 seconds.")
@@ -528,3 +564,22 @@ class CompanySettingsSerializer(serializers.ModelSerializer):
         if v not in ("km", "mi"):
             raise serializers.ValidationError("Distance unit must be 'km' or 'mi'.")
         return v
+
+    def validate_downsample_distance_m(self, v):
+        if v < 1 or v > 5000:
+            raise serializers.ValidationError("Downsample distance must be between 1 and 5000 metres.")
+        return v
+
+    def validate_downsample_interval_seconds(self, v):
+        if v < 10 or v > 86400:
+            raise serializers.ValidationError("Downsample interval must be between 10 and 86400 seconds.")
+        return v
+
+    def validate(self, attrs):
+        raw = attrs.get('raw_telemetry_days', getattr(self.instance, 'raw_telemetry_days', 0))
+        horizon = attrs.get('telemetry_retention_days',
+                            getattr(self.instance, 'telemetry_retention_days', 0))
+        if raw and horizon and horizon <= raw:
+            raise serializers.ValidationError({'telemetry_retention_days':
+                'Retention must be longer than the raw-telemetry window.'})
+        return attrs
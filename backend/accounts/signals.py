@@ -0,0 +1,183 @@
+"""
+Model signal handlers. Connected in AccountsConfig.ready().
+
+Cached reads — company thresholds, per-request memberships and
+subscriptions (accounts/request_cache.py) — are invalidated here on write,
+and each Subscription's driver/vehicle counters (accounts/subscriptions.py)
+are moved here in the transaction of the create or delete.
+
+Everything shown on the Live Map besides ingest positions changes through an
+ordinary save/delete of one of these models, so the feed's change log
+(accounts/live_versions.py) is kept here. Ingest itself — which also saves
+positions with update_fields, or not at all when latest state is coalesced —
+reports through telemetry.after_ingest instead.
+
+The daily KPI rollups (accounts/kpi_rollups.py) are refreshed here too: a
+trip, expense or incident write schedules a rebuild of the days it touched,
+including the day it was on before the write. Deleting a vehicle or driver
+rebuilds the days its rows were on.
+"""
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import kpi_rollups, live_versions, request_cache, subscriptions
+from .alert_rules import RULE_FIELDS, invalidate_rules
+from .fleet_status import invalidate_thresholds
+from .models import (
+    Cargo, CompanySettings, Driver, DriverVehicleAssignment, Expense, Incident, Membership,
+    Subscription, Trip, Vehicle,
+)
+
+# Saves limited to these fields come from ingest (telemetry.after_ingest).
+_PRESENCE_FIELDS = {"lat", "lng", "speed", "geohash", "last_seen_at"}
+_THRESHOLD_FIELDS = {"moving_speed_kmh", "offline_timeout_seconds"}
+
+
+def _from_ingest(update_fields):
+    return update_fields is not None and set(update_fields) <= _PRESENCE_FIELDS
+
+
+@receiver(pre_save, sender=Vehicle)
+@receiver(pre_save, sender=Driver)
+def counted_saving(sender, instance, update_fields=None, **kwargs):
+    # A driver or vehicle moved between companies moves between counters.
+    moving = instance.pk and (update_fields is None or "company" in update_fields)
+    instance._previous_company_id = (
+        sender.objects.filter(pk=instance.pk).values_list("company_id", flat=True).first()
+        if moving else None)
+
+
+def _count(kind, instance, created):
+    if created:
+        subscriptions.adjust(instance.company_id, kind, 1)
+        return
+    previous = getattr(instance, "_previous_company_id", None)
+    if previous is not None and previous != instance.company_id:
+        subscriptions.adjust(previous, kind, -1)
+        subscriptions.adjust(instance.company_id, kind, 1)
+
+
+@receiver(post_save, sender=Vehicle)
+def vehicle_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    _count("vehicle", instance, created)
+    if not _from_ingest(update_fields):
+        live_versions.touch(instance.company_id, instance.id)
+
+
+@receiver(pre_delete, sender=Vehicle)
+def vehicle_deleting(sender, instance, **kwargs):
+    kpi_rollups.detach(vehicle=instance)
+
+
+@receiver(pre_delete, sender=Driver)
+def driver_deleting(sender, instance, **kwargs):
+    kpi_rollups.detach(driver=instance)
+
+
+@receiver(post_delete, sender=Vehicle)
+def vehicle_deleted(sender, instance, **kwargs):
+    subscriptions.adjust(instance.company_id, "vehicle", -1)
+    live_versions.touch(instance.company_id, instance.id)
+
+
+@receiver(post_delete, sender=Driver)
+def driver_deleted(sender, instance, **kwargs):
+    subscriptions.adjust(instance.company_id, "driver", -1)
+
+
+@receiver(post_save, sender=Driver)
+def driver_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    _count("driver", instance, created)
+    # The driver's name is on the row of the vehicle they are assigned to.
+    if created or (update_fields is not None and "full_name" not in update_fields):
+        return
+    vehicle_ids = (DriverVehicleAssignment.objects
+                   .filter(driver=instance, is_active=True)
+                   .values_list("vehicle_id", flat=True))
+    live_versions.touch(instance.company_id, *vehicle_ids)
+
+
+@receiver([post_save, post_delete], sender=DriverVehicleAssignment)
+def assignment_changed(sender, instance, **kwargs):
+    live_versions.touch(instance.company_id, instance.vehicle_id)
+
+
+@receiver(pre_save, sender=Trip)
+def trip_saving(sender, instance, **kwargs):
+    # A trip moved to another vehicle changes the old vehicle's row too, and
+    # one re-dated or un-completed leaves a KPI day behind.
+    previous = (Trip.objects.filter(pk=instance.pk)
+                .only("company_id", "vehicle_ref_id", "status", "completed_at",
+                      "end_time", "start_time").first()
+                if instance.pk else None)
+    instance._previous_vehicle_id = previous.vehicle_ref_id if previous else None
+    instance._previous_kpi = (
+        (previous.company_id, kpi_rollups.completed_moment(previous)) if previous else None)
+
+
+@receiver([post_save, post_delete], sender=Trip)
+def trip_changed(sender, instance, **kwargs):
+    live_versions.touch(instance.company_id, instance.vehicle_ref_id,
+                        getattr(instance, "_previous_vehicle_id", None))
+    _kpis_changed(instance, kpi_rollups.completed_moment(instance))
+
+
+def _kpis_changed(instance, moment):
+    previous = getattr(instance, "_previous_kpi", None)
+    if previous and previous[0] != instance.company_id:
+        kpi_rollups.schedule(*previous)
+        previous = None
+    kpi_rollups.schedule(instance.company_id, moment, previous and previous[1])
+
+
+@receiver(pre_save, sender=Expense)
+def expense_saving(sender, instance, **kwargs):
+    previous = (Expense.objects.filter(pk=instance.pk).values_list("company_id", "date").first()
+                if instance.pk else None)
+    instance._previous_kpi = previous
+
+
+@receiver([post_save, post_delete], sender=Expense)
+def expense_changed(sender, instance, **kwargs):
+    _kpis_changed(instance, instance.date)
+
+
+@receiver([post_save, post_delete], sender=Incident)
+def incident_changed(sender, instance, **kwargs):
+    kpi_rollups.schedule(instance.company_id, instance.created_at)
+
+
+@receiver([post_save, post_delete], sender=Cargo)
+def cargo_changed(sender, instance, **kwargs):
+    vehicle_id = (Trip.objects.filter(pk=instance.trip_id)
+                  .values_list("vehicle_ref_id", flat=True).first())
+    live_versions.touch(instance.company_id, vehicle_id)
+
+
+@receiver([post_save, post_delete], sender=CompanySettings)
+def company_settings_saved(sender, instance, update_fields=None, **kwargs):
+    # Thresholds decide every vehicle's live_status.
+    if update_fields is None or set(update_fields) & _THRESHOLD_FIELDS:
+        invalidate_thresholds(instance.company_id)
+        live_versions.touch_all(instance.company_id)
+    if update_fields is None or set(update_fields) & set(RULE_FIELDS):
+        invalidate_rules(instance.company_id)
+
+
+@receiver([post_save, post_delete], sender=Membership)
+def membership_changed(sender, instance, **kwargs):
+    request_cache.forget("membership", instance.user_id)
+    request_cache.forget("tenant", instance.user_id)
+
+
+@receiver(pre_save, sender=Subscription)
+def subscription_saving(sender, instance, **kwargs):
+    # The counters start from the company's real numbers.
+    if instance._state.adding:
+        instance.driver_count, instance.vehicle_count = (
+            subscriptions.actual_counts(instance.company_id))
+
+
+@receiver([post_save, post_delete], sender=Subscription)
+def subscription_changed(sender, instance, **kwargs):
+    request_cache.forget("subscription", instance.company_id)
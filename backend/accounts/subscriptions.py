@@ -1,8 +1,18 @@
 """
 Internal subscription/plan enforcement (Phase 18). No external payment provider.
+
+Usage is read from counters on the Subscription row (driver_count,
+vehicle_count) rather than by counting Driver/Vehicle rows: the plan check
+runs under the Subscription row lock, and a COUNT there kept every concurrent
+create waiting behind it. The counters move in the same transaction as the
+row they count (signals -> adjust()); a Subscription starts from a real
+count when created, and reconcile() (`manage.py reconcile_subscriptions`)
+repairs what bulk writes or raw SQL left behind.
 """
+from django.db.models import F
 from rest_framework.exceptions import ValidationError
 
+from . import request_cache
 from .models import Subscription, Plan, Driver, Vehicle
 
 # Existing companies (and any without an explicit sub) default to the top plan
@@ -11,21 +21,25 @@ DEFAULT_PLAN_CODE = "BUSINESS"
 
 
 def get_or_create_subscription(company):
-    sub = Subscription.objects.filter(company=company).select_related("plan").first()
-    if sub:
-        return sub
-    plan = (Plan.objects.filter(code=DEFAULT_PLAN_CODE).first()
-            or Plan.objects.order_by("-max_drivers").first())
-    return Subscription.objects.create(company=company, plan=plan)
+    """The company's Subscription (with plan), created on the default plan if
+    missing. Memoized per request."""
+    def lookup():
+        sub = Subscription.objects.filter(company=company).select_related("plan").first()
+        if sub:
+            return sub
+        plan = (Plan.objects.filter(code=DEFAULT_PLAN_CODE).first()
+                or Plan.objects.order_by("-max_drivers").first())
+        return Subscription.objects.create(company=company, plan=plan)
+    return request_cache.memoize("subscription", company.pk, lookup)
 
 
 def lock_subscription_for_plan_check(company):
     """Row-lock the company's Subscription for the rest of the current
     transaction.
 
-    check_can_add() is a count-then-create check: without a lock, two
-    concurrent requests can both count N (under the limit), both pass, and
-    both create — overshooting the plan limit. Call this INSIDE a
+    check_can_add() is a check-then-create: without a lock, two concurrent
+    requests can both read N (under the limit), both pass, and both create —
+    overshooting the plan limit. Call this INSIDE a
     transaction.atomic() block, before check_can_add() and the actual
     Driver/Vehicle create, so the two concurrent requests serialize on this
     row instead of racing.
@@ -34,6 +48,50 @@ def lock_subscription_for_plan_check(company):
     return Subscription.objects.select_for_update().get(company=company)
 
 
+_COUNTERS = {"driver": "driver_count", "vehicle": "vehicle_count"}
+
+
+def actual_counts(company_id):
+    """(drivers, vehicles) of a company, counted."""
+    return (Driver.objects.filter(company_id=company_id).count(),
+            Vehicle.objects.filter(company_id=company_id).count())
+
+
+def adjust(company_id, kind, delta):
+    """Move a company's `kind` counter by `delta` within the current
+    transaction (an atomic UPDATE; never below zero)."""
+    if not company_id or not delta:
+        return
+    field = _COUNTERS[kind]
+    qs = Subscription.objects.filter(company_id=company_id)
+    if delta < 0:
+        qs = qs.filter(**{f"{field}__gte": -delta})
+    qs.update(**{field: F(field) + delta})
+    request_cache.forget("subscription", company_id)
+
+
+def reconcile(company_ids=None):
+    """Reset counters that drifted from the real counts.
+    Returns [(company_id, (old drivers, old vehicles), (drivers, vehicles))]."""
+    subs = Subscription.objects.order_by("company_id")
+    if company_ids:
+        subs = subs.filter(company_id__in=company_ids)
+    fixed = []
+    for company_id, drivers, vehicles in subs.values_list(
+            "company_id", "driver_count", "vehicle_count").iterator():
+        actual = actual_counts(company_id)
+        if actual != (drivers, vehicles):
+            Subscription.objects.filter(company_id=company_id).update(
+                driver_count=actual[0], vehicle_count=actual[1])
+            fixed.append((company_id, (drivers, vehicles), actual))
+    return fixed
+
+
+def _counts(company):
+    return (Subscription.objects.filter(company=company)
+            .values_list("driver_count", "vehicle_count").first()) or (0, 0)
+
+
 def check_can_add(company, kind):
     """Raise if the company is at its plan limit for `kind` ('driver'|'vehicle').
 
@@ -41,13 +99,13 @@ def check_can_add(company, kind):
     call lock_subscription_for_plan_check(company) first, inside the same
     transaction.atomic() block that performs the create.
     """
-    sub = get_or_create_subscription(company)
-    plan = sub.plan
-    if kind == "driver" and Driver.objects.filter(company=company).count() >= plan.max_drivers:
+    plan = get_or_create_subscription(company).plan
+    drivers, vehicles = _counts(company)
+    if kind == "driver" and drivers >= plan.max_drivers:
         raise ValidationError(
             {"detail": f"Driver limit reached for the {plan.name} plan "
                        f"({plan.max_drivers}). Upgrade to add more."})
-    if kind == "vehicle" and Vehicle.objects.filter(company=company).count() >= plan.max_vehicles:
+    if kind == "vehicle" and vehicles >= plan.max_vehicles:
         raise ValidationError(
             {"detail": f"Vehicle limit reached for the {plan.name} plan "
                        f"({plan.max_vehicles}). Upgrade to add more."})
@@ -60,6 +118,5 @@ def usage(company):
                  "max_drivers": sub.plan.max_drivers, "max_vehicles": sub.plan.max_vehicles,
                  "price_monthly": str(sub.plan.price_monthly)},
         "status": sub.status,
-        "usage": {"drivers": Driver.objects.filter(company=company).count(),
-                  "vehicles": Vehicle.objects.filter(company=company).count()},
+        "usage": {"drivers": sub.driver_count, "vehicles": sub.vehicle_count},
     }
@@ -0,0 +1,205 @@
+"""
+Batch telemetry ingest engine.
+
+LocationIngestView used to handle each fix on its own: a fresh
+LocationPingSerializer, an exists() query on event_id and a savepoint + INSERT
+per fix, so a 200-fix offline backlog from one phone cost ~600 round trips.
+The engine does the same work per BATCH instead:
+
+  1. validate every fix in one pass with a single serializer instance
+     (per-fix errors keep their original `index`);
+  2. resolve retransmitted fixes with ONE `event_id__in` lookup;
+  3. write the survivors with ONE bulk_create(ignore_conflicts=True), which
+     lets uniq_location_event_id absorb a concurrent retransmit instead of
+     raising IntegrityError;
+  4. one follow-up read tells which of our event_id rows actually landed, so a
+     fix that lost that race is still counted as a duplicate, exactly as the
+     per-fix path did.
+
+The query count is therefore constant per batch (not per fix).
+
+Streamed uploads (NDJSON, see accounts/parsers.py) go through ingest_stream(),
+which feeds the same engine in fixed-size chunks so memory stays flat however
+many fixes a reconnecting phone sends.
+"""
+from itertools import islice
+
+from django.conf import settings
+from rest_framework import serializers
+
+from . import alert_rules, latest_state, live_stream, live_versions, trip_metrics, tracks
+from .models import LocationPing
+from .serializers import LocationPingSerializer
+
+# Rows per INSERT statement. Keeps a very large backlog under the database's
+# bound-parameter limits (SQLite in particular) without a round trip per fix.
+BULK_BATCH_SIZE = getattr(settings, "TELEMETRY_BULK_BATCH_SIZE", 500)
+# Fixes per chunk when a streamed upload is fed to storage.
+STREAM_CHUNK_SIZE = getattr(settings, "TELEMETRY_STREAM_CHUNK_SIZE", 500)
+# Upper bound on fixes accepted from ONE streamed upload (a day offline at a
+# 1s cadence is ~86k fixes); anything beyond it is reported, not stored.
+STREAM_MAX_FIXES = getattr(settings, "TELEMETRY_STREAM_MAX_FIXES", 100_000)
+
+
+class MalformedFix:
+    """Placeholder for a streamed record that could not even be decoded (bad
+    JSON line, truncated record). Validation reports it at its index like any
+    other invalid fix."""
+
+    def __init__(self, message):
+        self.message = message
+
+
+class IngestResult:
+    """Outcome of one ingest call: the counts the API reports, plus the newest
+    stored fix (what the Vehicle / Driver latest state is mirrored from)."""
+
+    def __init__(self):
+        self.saved = 0
+        self.duplicates = 0
+        self.errors = []
+        self.latest = None
+
+    def add_saved(self, pings):
+        self.saved += len(pings)
+        for p in pings:
+            if self.latest is None or p.recorded_at > self.latest.recorded_at:
+                self.latest = p
+
+
+def validate_fixes(raw, start=0):
+    """Validate a list of raw fixes in one pass.
+
+    Returns (valid, errors): `valid` is a list of validated_data dicts,
+    `errors` the [{'index', 'errors'}] entries the API has always returned.
+    `start` offsets the reported index (used when a batch arrives in chunks).
+    """
+    ser = LocationPingSerializer()
+    valid, errors = [], []
+    for i, item in enumerate(raw, start=start):
+        if isinstance(item, MalformedFix):
+            errors.append({"index": i, "errors": {"non_field_errors": [item.message]}})
+            continue
+        try:
+            valid.append(ser.run_validation(item))
+        except serializers.ValidationError as exc:
+            errors.append({"index": i, "errors": serializers.as_serializer_error(exc)})
+    return valid, errors
+
+
+def store_fixes(valid, *, company=None, driver=None, vehicle=None, trip=None):
+    """Persist validated fixes, idempotent on event_id.
+
+    Returns (stored_pings, duplicates). Duplicates are fixes whose event_id is
+    already stored, repeated within the batch, or inserted concurrently by a
+    retransmission racing this one.
+    """
+    keyed = [d for d in valid if d.get("event_id")]
+    event_ids = {d["event_id"] for d in keyed}
+    # A retransmitted fix repeats its recorded_at, so both event_id lookups
+    # are bounded to the batch's time span — which is what lets them prune
+    # to the relevant partitions of a partitioned table (accounts/partitions.py).
+    # A resend with a re-stamped recorded_at is therefore NOT recognised.
+    span = {}
+    if keyed:
+        times = [d["recorded_at"] for d in keyed]
+        span = {"recorded_at__range": (min(times), max(times))}
+    existing = set()
+    if event_ids:
+        existing = set(LocationPing.objects
+                       .filter(event_id__in=event_ids, **span)
+                       .values_list("event_id", flat=True))
+
+    pings, seen, duplicates = [], set(), 0
+    for data in valid:
+        eid = data.get("event_id")
+        if eid:
+            if eid in existing or eid in seen:
+                duplicates += 1  # retransmitted offline fix — skip silently
+                continue
+            seen.add(eid)
+        pings.append(LocationPing(company=company, driver=driver,
+                                  vehicle=vehicle, trip=trip, **data))
+    if not pings:
+        return [], duplicates
+
+    # ignore_conflicts: a concurrent retransmission that slipped past the
+    # lookup above is dropped by uniq_location_event_id instead of failing the
+    # whole statement (and, unlike a caught IntegrityError, it never leaves an
+    # outer transaction marked "needs rollback").
+    LocationPing.objects.bulk_create(pings, batch_size=BULK_BATCH_SIZE,
+                                     ignore_conflicts=True)
+    if seen:
+        # bulk_create stamped created_at on each of OUR instances; a row that
+        # carries a different stamp for the same event_id was written by the
+        # racing request, so ours was the one ignored.
+        stamps = dict(LocationPing.objects
+                      .filter(event_id__in=seen, **span)
+                      .values_list("event_id", "created_at"))
+        landed = [p for p in pings
+                  if p.event_id is None or stamps.get(p.event_id) == p.created_at]
+        duplicates += len(pings) - len(landed)
+        pings = landed
+    return pings, duplicates
+
+
+def ingest_fixes(raw, *, company=None, driver=None, vehicle=None, trip=None,
+                 result=None, start=0):
+    """Validate + store one batch of raw fixes. Pass `result` to accumulate
+    several chunks of the same upload into one IngestResult."""
+    result = result if result is not None else IngestResult()
+    valid, errors = validate_fixes(raw, start=start)
+    result.errors.extend(errors)
+    pings, duplicates = store_fixes(valid, company=company, driver=driver,
+                                    vehicle=vehicle, trip=trip)
+    result.duplicates += duplicates
+    result.add_saved(pings)
+    # Per stored chunk, so a streamed upload never holds all its fixes.
+    trip_metrics.apply(trip, pings)
+    alert_rules.apply(vehicle, pings, driver=driver, trip=trip)
+    return result
+
+
+def ingest_stream(items, *, chunk_size=None, max_fixes=None, **kwargs):
+    """Ingest an iterable of raw fixes in fixed-size chunks.
+
+    Only one chunk is held in memory at a time, and each chunk is committed as
+    it goes — if the connection drops half-way the phone simply retransmits
+    and event_id de-duplication skips what already landed.
+    """
+    chunk_size = chunk_size or STREAM_CHUNK_SIZE
+    max_fixes = max_fixes or STREAM_MAX_FIXES
+    result = IngestResult()
+    items = iter(items)
+    start = 0
+    while start < max_fixes:
+        chunk = list(islice(items, min(chunk_size, max_fixes - start)))
+        if not chunk:
+            return result
+        ingest_fixes(chunk, result=result, start=start, **kwargs)
+        start += len(chunk)
+    if next(items, None) is not None:
+        result.errors.append({"index": start, "errors": {"non_field_errors": [
+            f"Upload truncated: at most {max_fixes} fixes are accepted per request."]}})
+    return result
+
+
+def update_latest_state(latest, *, vehicle=None, driver=None, now=None):
+    """Mirror the newest stored fix onto the Vehicle (live map position) and
+    mark the Driver as present. Driver presence is tracked independently of
+    any vehicle, so a driver reporting real GPS is online even with no
+    assignment. Written through, or coalesced — see accounts/latest_state.py."""
+    latest_state.record(latest, vehicle=vehicle, driver=driver, now=now)
+
+
+def after_ingest(result, *, vehicle=None, driver=None, trip=None, received_at=None):
+    """Side effects of a stored batch, shared by the request path and the
+    write-behind drainer (accounts/telemetry_spool.py). `received_at` is when
+    the server accepted the fixes, so presence timers are not skewed by queue
+    lag."""
+    update_latest_state(result.latest, vehicle=vehicle, driver=driver, now=received_at)
+    if result.latest is not None and vehicle is not None:
+        live_versions.touch(vehicle.company_id, vehicle.id)
+        live_stream.publish_position(vehicle)
+    if trip is not None and result.saved:
+        tracks.invalidate(trip.id)
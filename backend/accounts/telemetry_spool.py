@@ -0,0 +1,376 @@
+"""
+Write-behind spool for telemetry ingest (optional).
+
+With TELEMETRY_ASYNC_INGEST enabled, a request carrying
+`Prefer: respond-async` is validated, appended to a local append-only journal
+and answered 202 straight away; the Vehicle/Driver latest-state writes and the
+LocationPing INSERTs happen later, when a drainer (the drain_telemetry_spool
+management command) commits the journal in large transactions.
+
+Journal layout under TELEMETRY_SPOOL_DIR (must be a persistent, local volume —
+NOT available on serverless hosts, which is why this is off by default):
+
+  active.jsonl               writers append one JSON record per accepted
+                             chunk, under an exclusive flock, fsync'd; a
+                             writer that got the lock on a file sealed in
+                             the meantime reopens the new active.jsonl
+  segment-<ns>.jsonl         sealed by the drainer (atomic rename of
+                             active.jsonl), drained oldest first
+  segment-<ns>.jsonl.offset  byte offset of the last committed record
+  quarantine.jsonl           records whose ingest raised (a deploy that no
+                             longer accepts them, a broken row): each with
+                             its error, set aside so the drain moves past it
+
+Idempotency across crashes and replays: every spooled fix carries an event_id
+(fixes that arrived without one get a deterministic uuid5 of their batch and
+position), so re-draining a segment after a crash between COMMIT and the
+checkpoint write only produces duplicates that the ingest engine skips.
+"""
+import fcntl
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .telemetry import (
+    after_ingest, ingest_fixes, validate_fixes, STREAM_CHUNK_SIZE, STREAM_MAX_FIXES,
+)
+
+FORMAT_VERSION = 1
+ACTIVE = "active.jsonl"
+SEGMENT_PREFIX = "segment-"
+QUARANTINE = "quarantine.jsonl"
+
+logger = logging.getLogger(__name__)
+
+
+def spool_dir():
+    return str(getattr(settings, "TELEMETRY_SPOOL_DIR",
+                       os.path.join(settings.BASE_DIR, "var", "telemetry-spool")))
+
+
+def async_ingest_enabled() -> bool:
+    return bool(getattr(settings, "TELEMETRY_ASYNC_INGEST", False))
+
+
+def wants_async(request) -> bool:
+    """RFC 7240: the client opts in per request with `Prefer: respond-async`."""
+    prefer = request.META.get("HTTP_PREFER", "")
+    return async_ingest_enabled() and "respond-async" in prefer.lower()
+
+
+def _path(name):
+    return os.path.join(spool_dir(), name)
+
+
+# --- Writer -----------------------------------------------------------------
+
+class SpoolReceipt:
+    """What the 202 response reports: how many fixes were accepted for later
+    storage, the per-index validation errors, and the batch id."""
+
+    def __init__(self, batch):
+        self.batch = batch
+        self.accepted = 0
+        self.errors = []
+
+
+def _lock_active():
+    """Open active.jsonl and hold its exclusive flock. Retries when the file
+    was sealed (renamed) between our open and getting the lock: appending to
+    that inode would land in a segment the drainer may already have read and
+    is about to remove."""
+    path = _path(ACTIVE)
+    while True:
+        fh = open(path, "a+b")
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            if os.stat(path).st_ino == os.fstat(fh.fileno()).st_ino:
+                return fh
+        except FileNotFoundError:
+            pass
+        fcntl.flock(fh, fcntl.LOCK_UN)
+        fh.close()
+
+
+def _append(lines):
+    os.makedirs(spool_dir(), exist_ok=True)
+    with _lock_active() as fh:
+        try:
+            # A writer that crashed mid-record left a partial line; start on a
+            # fresh line so the damage stays confined to that one record.
+            # Read through the locked descriptor, never by path.
+            size = os.fstat(fh.fileno()).st_size
+            if size and os.pread(fh.fileno(), 1, size - 1) != b"\n":
+                fh.write(b"\n")
+            fh.write(b"".join(lines))
+            fh.flush()
+            os.fsync(fh.fileno())
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def spool_fixes(raw, *, company=None, driver=None, vehicle=None, trip=None):
+    """Validate `raw` (a list or a FixStream) and durably append the valid
+    fixes to the journal. Nothing touches the database."""
+    receipt = SpoolReceipt(uuid.uuid4())
+    received_at = timezone.now()
+    lines, start = [], 0
+    items = iter(raw)
+    while start < STREAM_MAX_FIXES:
+        chunk = [f for _, f in zip(range(STREAM_CHUNK_SIZE), items)]
+        if not chunk:
+            break
+        valid, errors = validate_fixes(chunk, start=start)
+        receipt.errors.extend(errors)
+        for n, fix in enumerate(valid):
+            if not fix.get("event_id"):
+                fix["event_id"] = uuid.uuid5(receipt.batch, f"{start}:{n}")
+        if valid:
+            lines.append(json.dumps({
+                "v": FORMAT_VERSION, "batch": receipt.batch,
+                "received_at": received_at,
+                "company": getattr(company, "id", None),
+                "driver": getattr(driver, "id", None),
+                "vehicle": getattr(vehicle, "id", None),
+                "trip": getattr(trip, "id", None),
+                "fixes": valid,
+            }, cls=DjangoJSONEncoder).encode() + b"\n")
+            receipt.accepted += len(valid)
+        start += len(chunk)
+    if lines:
+        _append(lines)
+    return receipt
+
+
+# --- Drainer ----------------------------------------------------------------
+
+def _segments():
+    try:
+        names = os.listdir(spool_dir())
+    except FileNotFoundError:
+        return []
+    return sorted(n for n in names
+                  if n.startswith(SEGMENT_PREFIX) and n.endswith(".jsonl"))
+
+
+def _seal():
+    """Move the active journal aside so writers start a fresh file."""
+    path = _path(ACTIVE)
+    if not os.path.exists(path):
+        return
+    with _lock_active() as fh:
+        try:
+            if os.fstat(fh.fileno()).st_size:
+                os.replace(path, _path(f"{SEGMENT_PREFIX}{time.time_ns()}.jsonl"))
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _read_offset(segment):
+    try:
+        with open(_path(segment + ".offset")) as fh:
+            return int(fh.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def _write_offset(segment, offset):
+    tmp = _path(segment + ".offset.tmp")
+    with open(tmp, "w") as fh:
+        fh.write(str(offset))
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, _path(segment + ".offset"))
+
+
+class _Entities:
+    """Per-run lookup cache: journal records carry ids, the engine wants rows.
+    A row deleted since the fix was spooled resolves to None (SET_NULL, the
+    same outcome as deleting it after an inline ingest)."""
+
+    def __init__(self):
+        self._rows = {}
+
+    def get(self, model, pk):
+        if pk is None:
+            return None
+        key = (model, pk)
+        if key not in self._rows:
+            self._rows[key] = model.objects.filter(pk=pk).first()
+        return self._rows[key]
+
+
+class DrainReport:
+    def __init__(self):
+        self.records = 0
+        self.saved = 0
+        self.duplicates = 0
+        self.corrupt = 0
+        self.quarantined = 0
+
+
+def _quarantine(segment, rec, error):
+    """Set a record aside with its error. Appended before the batch commits,
+    so a crash in between may quarantine it twice, never lose it."""
+    line = json.dumps({"segment": segment, "error": repr(error),
+                       "quarantined_at": timezone.now(), "record": rec},
+                      cls=DjangoJSONEncoder).encode() + b"\n"
+    with open(_path(QUARANTINE), "ab") as fh:
+        fh.write(line)
+        fh.flush()
+        os.fsync(fh.fileno())
+
+
+def _commit(segment, records, entities, report):
+    from .models import Company, Driver, Trip, Vehicle
+    with transaction.atomic():
+        for rec in records:
+            try:
+                # One savepoint per record: a record that fails rolls back
+                # alone instead of blocking this segment and every later one.
+                with transaction.atomic():
+                    kwargs = {
+                        "company": entities.get(Company, rec.get("company")),
+                        "driver": entities.get(Driver, rec.get("driver")),
+                        "vehicle": entities.get(Vehicle, rec.get("vehicle")),
+                        "trip": entities.get(Trip, rec.get("trip")),
+                    }
+                    result = ingest_fixes(rec["fixes"], **kwargs)
+                    after_ingest(result, vehicle=kwargs["vehicle"], driver=kwargs["driver"],
+                                 trip=kwargs["trip"],
+                                 received_at=parse_datetime(rec["received_at"]))
+            except Exception as e:
+                logger.exception("telemetry spool: quarantining record of batch %s from %s",
+                                 rec.get("batch"), segment)
+                _quarantine(segment, rec, e)
+                report.quarantined += 1
+                continue
+            report.saved += result.saved
+            report.duplicates += result.duplicates
+    report.records += len(records)
+
+
+def _drain_segment(segment, entities, report, batch_fixes):
+    path = _path(segment)
+    offset = _read_offset(segment)
+    with open(path, "rb") as fh:
+        fh.seek(offset)
+        pending, fixes = [], 0
+        for line in fh:
+            end = offset + len(line)
+            try:
+                rec = json.loads(line) if line.endswith(b"\n") else None
+            except ValueError:
+                rec = None
+            if rec is None or rec.get("v") != FORMAT_VERSION:
+                report.corrupt += 1  # torn write from a crashed writer
+            else:
+                pending.append(rec)
+                fixes += len(rec["fixes"])
+            offset = end
+            if fixes >= batch_fixes:
+                _commit(segment, pending, entities, report)
+                _write_offset(segment, offset)
+                pending, fixes = [], 0
+        if pending:
+            _commit(segment, pending, entities, report)
+        _write_offset(segment, offset)
+    os.remove(path)
+    os.remove(_path(segment + ".offset"))
+
+
+def drain(batch_fixes=5000):
+    """Commit everything spooled so far. Safe to run from several workers:
+    only one drains at a time, the others return an empty report."""
+    report = DrainReport()
+    os.makedirs(spool_dir(), exist_ok=True)
+    with open(_path("drain.lock"), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return report
+        try:
+            _seal()
+            entities = _Entities()
+            for segment in _segments():
+                _drain_segment(segment, entities, report, batch_fixes)
+            _write_state({"last_drain_at": timezone.now(),
+                          "last_drain_records": report.records,
+                          "last_drain_quarantined": report.quarantined})
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return report
+
+
+# --- Metrics ----------------------------------------------------------------
+
+def _write_state(state):
+    tmp = _path("state.json.tmp")
+    with open(tmp, "w") as fh:
+        json.dump(state, fh, cls=DjangoJSONEncoder)
+    os.replace(tmp, _path("state.json"))
+
+
+def _read_state():
+    try:
+        with open(_path("state.json")) as fh:
+            return json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def stats():
+    """Queue depth and drain lag, for sizing drain workers.
+
+    pending_records / pending_bytes: journal records not yet committed.
+    lag_seconds: age of the oldest uncommitted record (0 when empty).
+    quarantined_records: records set aside in quarantine.jsonl because their
+    ingest failed; they need a look (and a replay) by hand.
+    """
+    pending_records = pending_bytes = 0
+    oldest = None
+    files = [(s, _read_offset(s)) for s in _segments()] + [(ACTIVE, 0)]
+    for name, offset in files:
+        try:
+            with open(_path(name), "rb") as fh:
+                fh.seek(offset)
+                first = fh.readline()
+                if first and oldest is None:
+                    try:
+                        oldest = parse_datetime(json.loads(first)["received_at"])
+                    except (ValueError, KeyError, TypeError):
+                        pass
+                pending_bytes += len(first)
+                pending_records += 1 if first else 0
+                for block in iter(lambda: fh.read(1 << 20), b""):
+                    pending_bytes += len(block)
+                    pending_records += block.count(b"\n")
+        except FileNotFoundError:
+            continue
+    try:
+        with open(_path(QUARANTINE), "rb") as fh:
+            quarantined = sum(block.count(b"\n") for block in iter(lambda: fh.read(1 << 20), b""))
+    except FileNotFoundError:
+        quarantined = 0
+    state = _read_state()
+    lag = (timezone.now() - oldest).total_seconds() if isinstance(oldest, datetime) else 0
+    return {
+        "enabled": async_ingest_enabled(),
+        "pending_records": pending_records,
+        "pending_bytes": pending_bytes,
+        "segments": len(files) - 1,
+        "oldest_pending_at": oldest,
+        "lag_seconds": round(max(lag, 0), 3),
+        "last_drain_at": state.get("last_drain_at"),
+        "last_drain_records": state.get("last_drain_records", 0),
+        "quarantined_records": quarantined,
+    }
@@ -7,16 +7,71 @@ body for authorization. This is the single chokepoint that enforces tenant
 isolation across the app.
 """
 from rest_framework.permissions import BasePermission, SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from . import request_cache
 from .models import Membership, Company
 
 
 # --- Resolving company + role from the authenticated user ------------------
+#
+# One TenantContext per user per request (accounts/request_cache.py): the
+# permission check, get_queryset, perform_create and serializers all ask, and
+# only the first pays. TenantJWTAuthentication fetches the membership in the
+# same query as the user, so for API requests it costs nothing extra. Nothing
+# is cached beyond the request, so a membership or role change applies to
+# the very next request — and to the rest of the current one (the Membership
+# signals in accounts/signals.py drop the memo). A company's thresholds are
+# not carried here: fleet_status.company_thresholds memoizes them per company.
+
+class TenantContext:
+    """Who is asking, on behalf of which company, in which role."""
+
+    def __init__(self, user, membership=None, company=None, role=None):
+        self.user = user
+        self.membership = membership
+        self.company = company
+        self.role = role
+
 
 def membership_for(user):
-    """Return the user's Membership, or None."""
+    """Return the user's Membership, or None. Memoized per request."""
     if not user or not user.is_authenticated:
         return None
-    return Membership.objects.filter(user=user).select_related("company").first()
+    return request_cache.memoize(
+        "membership", user.pk,
+        lambda: Membership.objects.filter(user=user).select_related("company").first())
+
+
+def _resolve(user):
+    if not user or not user.is_authenticated:
+        return TenantContext(user)
+    m = membership_for(user)
+    if m:
+        company, role = m.company, m.role
+    else:
+        # Legacy fallbacks (pre-Membership data / in-flight requests)
+        company, role = getattr(user, "company_profile", None), None
+        if company is not None:
+            role = Membership.Role.COMPANY_OWNER
+        else:
+            driver = getattr(user, "driver_profile", None)
+            if driver is not None:
+                company, role = driver.company, Membership.Role.DRIVER
+    # Staff/superusers act as platform admin.
+    if getattr(user, "is_staff", False) or getattr(user, "is_superuser", False):
+        role = "PLATFORM_ADMIN"
+    return TenantContext(user, m, company, role)
+
+
+def tenant_for(user):
+    """The user's TenantContext, resolved once per request."""
+    if not user or not user.is_authenticated:
+        return TenantContext(user)
+    return request_cache.memoize("tenant", user.pk, lambda: _resolve(user))
 
 
 def company_for(user):
@@ -26,30 +81,40 @@ def company_for(user):
     company_profile / driver_profile relations so nothing breaks during the
     migration window.
     """
-    m = membership_for(user)
-    if m:
-        return m.company
-    # Legacy fallbacks (pre-Membership data / in-flight requests)
-    company = getattr(user, "company_profile", None)
-    if company is not None:
-        return company
-    driver = getattr(user, "driver_profile", None)
-    return getattr(driver, "company", None) if driver else None
+    return tenant_for(user).company
 
 
 def role_for(user):
     """The user's role string, or None. Staff/superusers act as platform admin."""
-    if getattr(user, "is_staff", False) or getattr(user, "is_superuser", False):
-        return "PLATFORM_ADMIN"
-    m = membership_for(user)
-    if m:
-        return m.role
-    # Legacy fallback
-    if getattr(user, "company_profile", None) is not None:
-        return Membership.Role.COMPANY_OWNER
-    if getattr(user, "driver_profile", None) is not None:
-        return Membership.Role.DRIVER
-    return None
+    return tenant_for(user).role
+
+
+class TenantJWTAuthentication(JWTAuthentication):
+    """simplejwt's JWTAuthentication, loading the user's membership and
+    company in the same query and seeding this request's tenant lookups."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+        try:
+            user = (self.user_model.objects.select_related("membership__company")
+                    .get(**{jwt_settings.USER_ID_FIELD: user_id}))
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+        if jwt_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        if (jwt_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+                jwt_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)):
+            raise AuthenticationFailed("The user's password has been changed.",
+                                       code="password_changed")
+        try:
+            membership = user.membership
+        except Membership.DoesNotExist:
+            membership = None
+        request_cache.memoize("membership", user.pk, lambda: membership)
+        return user
 
 
 def is_owner(user):
@@ -28,3 +28,24 @@ class AdminSeparationTests(APITestCase):
         self.client.force_authenticate(self.admin)
         r = self.client.get("/api/accounts/users/all/")
         self.assertEqual(r.status_code, 200)
+
+    def test_user_list_is_constant_queries_with_search_and_pages(self):
+        for i in range(5):
+            User.objects.create_user(f"member{i}", password="pw123456")
+        self.client.force_authenticate(self.admin)
+        with self.assertNumQueries(1):
+            rows = self.client.get("/api/accounts/users/all/").json()
+        self.assertEqual(len(rows), 7)  # plain array without list parameters
+        owner = next(u for u in rows if u["username"] == "owner")
+        self.assertEqual((owner["company_name"], owner["is_manager"]), ("Alpha", True))
+
+        r = self.client.get("/api/accounts/users/all/",
+                            {"search": "member", "sort": "username", "page_size": 3}).json()
+        self.assertEqual([u["username"] for u in r["results"]], ["member0", "member1", "member2"])
+        self.assertEqual([u["username"] for u in self.client.get(r["next"]).json()["results"]],
+                         ["member3", "member4"])
+
+        r = self.client.get("/api/accounts/users/all/", {"export": "csv", "search": "alpha"})
+        lines = b"".join(r.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn("owner", lines[1])
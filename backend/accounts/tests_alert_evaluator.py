@@ -0,0 +1,94 @@
+"""The scheduled alert evaluator: changed tenants first, a sweep for the
+rest, per-tenant reports, and an alerts list that is a read while it runs."""
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts import alert_evaluator
+from accounts.models import Company, FleetAlert, Membership, Vehicle
+
+
+class EvaluatorTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)  # the heartbeat would outlive the test
+        self.now = 1000.0
+        self.evaluator = alert_evaluator.Evaluator(sweep_seconds=60, clock=lambda: self.now)
+        self.companies = []
+        for name in ("North", "South"):
+            owner = User.objects.create_user(f"ev_{name}", password="pw123456")
+            company = Company.objects.create(
+                user=owner, company_name=name, manager_full_name="O", phone="1")
+            Membership.objects.create(user=owner, company=company,
+                                      role=Membership.Role.COMPANY_OWNER)
+            Vehicle.objects.create(company=company, plate_number=f"{name}-1",
+                                   vehicle_type="Van", status="Active")
+            self.companies.append(company)
+        self.north, self.south = self.companies
+
+    def _evaluated(self):
+        return [r.company_id for r in self.evaluator.run_once()]
+
+    def test_first_pass_evaluates_every_company(self):
+        self.assertCountEqual(self._evaluated(), [self.north.id, self.south.id])
+        self.assertEqual(self._evaluated(), [])
+
+    def test_changed_company_is_evaluated_next_pass(self):
+        self._evaluated()
+        vehicle = self.north.vehicles.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            vehicle.status = "Maintenance"
+            vehicle.save()
+        reports = self.evaluator.run_once()
+        self.assertEqual([(r.company_id, r.opened, r.changed) for r in reports],
+                         [(self.north.id, 1, True)])
+
+    def test_unchanged_companies_are_swept(self):
+        self._evaluated()
+        self.south.vehicles.update(fuel_level=4)  # no version bump
+        self.assertEqual(self._evaluated(), [])
+        self.now += 61
+        reports = {r.company_id: r for r in self.evaluator.run_once()}
+        self.assertEqual(set(reports), {self.north.id, self.south.id})
+        self.assertEqual(reports[self.south.id].opened, 1)
+        self.assertFalse(reports[self.south.id].changed)
+
+    def test_vehicles_going_offline_are_caught_between_sweeps(self):
+        self._evaluated()
+        self.south.vehicles.update(last_seen_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self._evaluated(), [])
+        self.assertEqual(self.evaluator.offline, (1, 0))
+        self.assertTrue(FleetAlert.objects.filter(
+            company=self.south, alert_type=FleetAlert.Type.VEHICLE_OFFLINE).exists())
+
+    def test_reports_resolutions(self):
+        self.north.vehicles.update(status="Maintenance")
+        self._evaluated()
+        self.north.vehicles.update(status="Active")
+        self.now += 61
+        reports = {r.company_id: r for r in self.evaluator.run_once()}
+        self.assertEqual(reports[self.north.id].resolved, 1)
+
+    def test_alerts_list_is_a_read_while_evaluator_runs(self):
+        self.north.vehicles.update(status="Maintenance")
+        self.client.force_authenticate(self.north.user)
+        cache.set(alert_evaluator.HEARTBEAT, timezone.now())
+        self.assertEqual(self.client.get("/api/accounts/fleet-alerts/").status_code, 200)
+        self.assertFalse(FleetAlert.objects.exists())
+        # A stale heartbeat (evaluator stopped): the list refreshes itself.
+        cache.set(alert_evaluator.HEARTBEAT, timezone.now() - timedelta(hours=1))
+        self.client.get("/api/accounts/fleet-alerts/")
+        self.assertTrue(FleetAlert.objects.filter(company=self.north).exists())
+
+    def test_command_once_reports_and_beats(self):
+        self.south.vehicles.update(fuel_level=3)
+        out = StringIO()
+        call_command("evaluate_fleet_alerts", "--once", stdout=out)
+        self.assertIn(f"company {self.south.id}: 1 opened, 0 resolved", out.getvalue())
+        self.assertIn("evaluated 2 companies: 1 opened, 0 resolved", out.getvalue())
+        self.assertTrue(alert_evaluator.is_running())
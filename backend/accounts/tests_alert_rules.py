@@ -0,0 +1,106 @@
+"""Ingest-time alert rules: speeding, idling, device battery and GPS accuracy
+are raised from the fixes as they arrive, and resolved when they clear."""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from accounts.models import (
+    Company, CompanySettings, Driver, DriverVehicleAssignment, FleetAlert, Membership, Trip,
+    Vehicle,
+)
+
+LOC = "/api/accounts/locations/"
+T0 = datetime(2026, 8, 11, 10, 0, tzinfo=dt_timezone.utc)
+
+
+class AlertRuleTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        owner = User.objects.create_user("rules_owner", password="pw123456")
+        self.company = Company.objects.create(
+            user=owner, company_name="Rules", manager_full_name="O", phone="1")
+        Membership.objects.create(user=owner, company=self.company,
+                                  role=Membership.Role.COMPANY_OWNER)
+        CompanySettings.objects.create(company=self.company, speed_limit_kmh=90)
+        self.mob = User.objects.create_user("rules_mob", password="pw123456")
+        self.driver = Driver.objects.create(user=self.mob, full_name="D", mobile="1",
+                                            company=self.company)
+        Membership.objects.create(user=self.mob, company=self.company,
+                                  role=Membership.Role.DRIVER)
+        self.vehicle = Vehicle.objects.create(company=self.company, plate_number="R-1",
+                                              vehicle_type="Truck")
+        DriverVehicleAssignment.objects.create(company=self.company, driver=self.driver,
+                                               vehicle=self.vehicle, is_active=True)
+        self.client.force_authenticate(self.mob)
+
+    def _send(self, *fixes):
+        """fixes: (seconds after T0, speed km/h, extra fields)."""
+        body = {"locations": [
+            {"lat": 52.5, "lng": 13.4, "speed": kmh / 3.6,
+             "recorded_at": (T0 + timedelta(seconds=s)).isoformat(), **extra}
+            for s, kmh, extra in fixes]}
+        r = self.client.post(LOC, body, format="json")
+        self.assertEqual(r.status_code, 201, r.content)
+
+    def _alerts(self, atype, **filters):
+        return FleetAlert.objects.filter(vehicle=self.vehicle, alert_type=atype, **filters)
+
+    def test_sustained_speeding_opens_once_and_resolves(self):
+        self._send((0, 100, {}), (20, 104, {}))
+        self.assertFalse(self._alerts(FleetAlert.Type.SPEEDING).exists())  # < 30 s
+        self._send((45, 98, {}))
+        self._send((90, 101, {}))
+        alert = self._alerts(FleetAlert.Type.SPEEDING).get()
+        self.assertIsNone(alert.resolved_at)
+        self.assertIn("104 km/h (limit 90 km/h)", alert.message)
+        self.assertEqual(alert.driver, self.driver)
+        self._send((135, 70, {}))
+        alert.refresh_from_db()
+        self.assertIsNotNone(alert.resolved_at)
+
+    def test_single_spike_is_not_speeding(self):
+        self._send((0, 150, {}), (45, 60, {}))
+        self.assertFalse(self._alerts(FleetAlert.Type.SPEEDING).exists())
+
+    def test_episode_inside_one_backlog_is_recorded_resolved(self):
+        self._send((0, 95, {}), (40, 120, {}), (80, 50, {}))
+        alert = self._alerts(FleetAlert.Type.SPEEDING).get()
+        self.assertIsNotNone(alert.resolved_at)
+        self.assertIn("120 km/h", alert.message)
+
+    def test_idling_only_counts_on_a_trip(self):
+        self._send(*[(s, 0, {}) for s in range(0, 1500, 300)])
+        self.assertFalse(self._alerts(FleetAlert.Type.IDLING).exists())
+        Trip.objects.create(company=self.company, origin="A", destination="B",
+                            driver_ref=self.driver, vehicle_ref=self.vehicle, status="ACTIVE")
+        self._send(*[(s, 0, {}) for s in range(1500, 3000, 300)])
+        self.assertTrue(self._alerts(FleetAlert.Type.IDLING, resolved_at__isnull=True).exists())
+
+    def test_battery_and_gps_accuracy(self):
+        self._send((0, 50, {"battery": 40, "accuracy": 250}),
+                   (45, 50, {"battery": 12, "accuracy": 300}))
+        self.assertTrue(self._alerts(FleetAlert.Type.LOW_BATTERY, resolved_at__isnull=True).exists())
+        self.assertFalse(self._alerts(FleetAlert.Type.GPS_UNAVAILABLE).exists())  # 2 of 3
+        self._send((90, 50, {"battery": 60, "accuracy": 400}))
+        self.assertTrue(self._alerts(FleetAlert.Type.LOW_BATTERY, resolved_at__isnull=False).exists())
+        self.assertTrue(self._alerts(FleetAlert.Type.GPS_UNAVAILABLE, resolved_at__isnull=True).exists())
+
+    def test_disabled_rule_resolves_and_stays_quiet(self):
+        self._send((0, 100, {}), (45, 100, {}))
+        self.assertTrue(self._alerts(FleetAlert.Type.SPEEDING, resolved_at__isnull=True).exists())
+        self.company.settings.speed_limit_kmh = 0
+        self.company.settings.save()
+        self._send((90, 140, {}), (135, 140, {}))
+        self.assertFalse(self._alerts(FleetAlert.Type.SPEEDING, resolved_at__isnull=True).exists())
+
+    def test_quiet_batches_run_no_alert_queries(self):
+        self._send((0, 50, {}))
+        with CaptureQueriesContext(connection) as ctx:
+            self._send((45, 55, {}))
+        self.assertFalse([q for q in ctx.captured_queries
+                          if "accounts_fleetalert" in q["sql"]])
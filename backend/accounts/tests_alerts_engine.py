@@ -0,0 +1,74 @@
+"""Set-based alert refresh: a constant number of queries per refresh, whatever
+the fleet size, with the same open/resolve semantics per (vehicle, type)."""
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts.alerts_engine import refresh_fleet_alerts
+from accounts.models import Company, FleetAlert, Membership, Vehicle
+
+
+class SetBasedRefreshTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("eng_owner", password="pw123456")
+        self.company = Company.objects.create(
+            user=self.owner, company_name="EngCo", manager_full_name="O", phone="1")
+        Membership.objects.create(user=self.owner, company=self.company,
+                                  role=Membership.Role.COMPANY_OWNER)
+        self.n = 0
+
+    def _vehicle(self, **fields):
+        self.n += 1
+        fields.setdefault("status", "Active")
+        return Vehicle.objects.create(company=self.company, plate_number=f"EN-{self.n}",
+                                      vehicle_type="Van", **fields)
+
+    def _fleet(self, size):
+        stale = timezone.now() - timedelta(hours=2)
+        for _ in range(size):
+            self._vehicle(status="Maintenance")
+            self._vehicle(fuel_level=5, last_seen_at=stale)
+
+    def _queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            refresh_fleet_alerts(self.company)
+        return len(ctx.captured_queries)
+
+    def _open(self, atype):
+        return FleetAlert.objects.filter(company=self.company, alert_type=atype,
+                                         resolved_at__isnull=True)
+
+    def test_query_count_does_not_grow_with_fleet(self):
+        self._fleet(2)
+        small_first, small_again = self._queries(), self._queries()
+        FleetAlert.objects.all().delete()
+        self._fleet(20)
+        self.assertEqual(self._queries(), small_first)
+        self.assertEqual(self._queries(), small_again)
+
+    def test_opens_each_condition_once(self):
+        self._fleet(3)
+        self.assertEqual(refresh_fleet_alerts(self.company), 9)
+        self.assertEqual(refresh_fleet_alerts(self.company), 0)
+        self.assertEqual(self._open(FleetAlert.Type.MAINTENANCE_DUE).count(), 3)
+        self.assertEqual(self._open(FleetAlert.Type.LOW_FUEL).count(), 3)
+        self.assertEqual(self._open(FleetAlert.Type.VEHICLE_OFFLINE).count(), 3)
+
+    def test_resolves_only_cleared_conditions(self):
+        v = self._vehicle(fuel_level=5, last_seen_at=timezone.now() - timedelta(hours=2))
+        refresh_fleet_alerts(self.company)
+        Vehicle.objects.filter(pk=v.pk).update(fuel_level=80)
+        refresh_fleet_alerts(self.company)
+        self.assertFalse(self._open(FleetAlert.Type.LOW_FUEL).exists())
+        self.assertTrue(self._open(FleetAlert.Type.VEHICLE_OFFLINE).exists())
+
+    def test_other_alert_types_are_left_alone(self):
+        v = self._vehicle()
+        FleetAlert.objects.create(company=self.company, vehicle=v,
+                                  alert_type=FleetAlert.Type.INCIDENT, title="Breakdown")
+        refresh_fleet_alerts(self.company)
+        self.assertTrue(self._open(FleetAlert.Type.INCIDENT).exists())
@@ -14,6 +14,7 @@ page can ever fall back to demo data:
 from datetime import timedelta
 
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.utils import timezone
 from rest_framework.test import APITestCase
 
@@ -25,6 +26,8 @@ from accounts.models import (
 
 class TwoCompanies(APITestCase):
     def setUp(self):
+        # Company ids are reused across rolled-back tests; drop their cached thresholds.
+        cache.clear()
         self.oa = User.objects.create_user("oa", password="pw123456")
         self.ca = Company.objects.create(user=self.oa, company_name="A", manager_full_name="A", phone="1")
         Membership.objects.create(user=self.oa, company=self.ca, role=Membership.Role.COMPANY_OWNER)
@@ -0,0 +1,54 @@
+"""Geometry kernels: array results agree with the scalar formulas, on
+whichever backend is active and on the pure-Python fallback."""
+import unittest
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from accounts import geo
+
+LATS = [52.5, 52.5005, 52.501, 52.5012, 52.5030]
+LNGS = [13.4, 13.4007, 13.4011, 13.4030, 13.4031]
+SQUARE = [(0, 0), (0, 10), (10, 10), (10, 0)]
+
+
+class KernelChecks:
+    def test_haversine_matches_scalar(self):
+        got = geo.step_distances(LATS, LNGS)
+        for i, d in enumerate(got):
+            self.assertAlmostEqual(d, geo.haversine_m(LATS[i], LNGS[i], LATS[i + 1], LNGS[i + 1]),
+                                   places=6)
+
+    def test_cumulative_distance(self):
+        cum = geo.cumulative_distance(LATS, LNGS)
+        self.assertEqual(len(cum), 5)
+        self.assertEqual(cum[0], 0)
+        self.assertAlmostEqual(cum[-1], geo.path_length_m(LATS, LNGS), places=6)
+
+    def test_bearing(self):
+        north, east = geo.bearing([0, 0], [0, 0], [1, 0], [0, 1])
+        self.assertAlmostEqual(north, 0, places=6)
+        self.assertAlmostEqual(east, 90, places=6)
+
+    def test_points_in_polygon(self):
+        inside = geo.points_in_polygon([5, 15, 5, -1], [5, 5, 11, 5], SQUARE + [SQUARE[0]])
+        self.assertEqual([bool(v) for v in inside], [True, False, False, False])
+        with self.assertRaises(ValueError):
+            geo.points_in_polygon([0], [0], [(0, 0), (1, 1)])
+
+    def test_simplify_keeps_corners(self):
+        lats = [0] * 10 + [i * 1e-4 for i in range(1, 10)]
+        lngs = [i * 1e-4 for i in range(10)] + [9e-4] * 9
+        self.assertEqual(geo.simplify(lats, lngs, 5), [0, 9, 18])
+
+
+class FallbackKernelTests(KernelChecks, SimpleTestCase):
+    def setUp(self):
+        patcher = patch.object(geo, "HAVE_NUMPY", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+@unittest.skipUnless(geo.HAVE_NUMPY, "NumPy is not installed")
+class NumpyKernelTests(KernelChecks, SimpleTestCase):
+    pass
@@ -0,0 +1,87 @@
+"""Batch ingest engine — same saved/duplicates/errors contract as the per-fix
+path, at a constant number of queries per batch."""
+import uuid
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from accounts.models import (
+    Company, Driver, Vehicle, Membership, DriverVehicleAssignment, LocationPing,
+)
+from accounts.telemetry import store_fixes, validate_fixes
+
+LOC = "/api/accounts/locations/"
+
+
+def fix(i=0, **kw):
+    data = {"event_id": str(uuid.uuid4()), "lat": 52.5, "lng": 13.4, "speed": 5,
+            "recorded_at": f"2026-08-11T10:{i // 60:02d}:{i % 60:02d}Z"}
+    data.update(kw)
+    return data
+
+
+class BatchIngestTests(APITestCase):
+    def setUp(self):
+        cache.clear()  # per-vehicle alert rule state (accounts/alert_rules.py)
+        owner = User.objects.create_user("owner", password="pw123456")
+        self.company = Company.objects.create(
+            user=owner, company_name="Alpha", manager_full_name="A", phone="1")
+        self.mob = User.objects.create_user("mob", password="pw123456")
+        self.driver = Driver.objects.create(user=self.mob, full_name="D", mobile="1",
+                                            company=self.company)
+        Membership.objects.create(user=self.mob, company=self.company,
+                                  role=Membership.Role.DRIVER)
+        self.vehicle = Vehicle.objects.create(company=self.company, plate_number="A-1")
+        DriverVehicleAssignment.objects.create(company=self.company, driver=self.driver,
+                                               vehicle=self.vehicle, is_active=True)
+        self.client.force_authenticate(self.mob)
+
+    def _queries(self, n):
+        body = {"locations": [fix(i) for i in range(n)]}
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.post(LOC, body, format="json")
+        self.assertEqual(r.json()["saved"], n)
+        return len(ctx.captured_queries)
+
+    def test_query_count_is_flat_in_batch_size(self):
+        # The first batch of a vehicle also reads its open rule alerts.
+        self.client.post(LOC, {"locations": [fix(0, recorded_at="2026-08-11T09:00:00Z")]},
+                         format="json")
+        self.assertEqual(self._queries(5), self._queries(50))
+
+    def test_mixed_batch_counts(self):
+        dup = fix(0)
+        self.client.post(LOC, {"locations": [dup]}, format="json")
+        repeated = fix(2)
+        body = {"locations": [dup, fix(1), {"lat": "x"}, repeated, repeated]}
+        r = self.client.post(LOC, body, format="json").json()
+        self.assertEqual((r["saved"], r["duplicates"]), (2, 2))
+        self.assertEqual([e["index"] for e in r["errors"]], [2])
+        self.assertIn("lat", r["errors"][0]["errors"])
+
+    def test_latest_fix_is_mirrored_regardless_of_order(self):
+        body = {"locations": [fix(5, lat=10.0), fix(9, lat=11.0), fix(1, lat=12.0)]}
+        self.client.post(LOC, body, format="json")
+        self.vehicle.refresh_from_db()
+        self.assertEqual(self.vehicle.lat, 11.0)
+
+    def test_concurrent_retransmit_counts_as_duplicate(self):
+        eid = uuid.uuid4()
+        valid, errors = validate_fixes([fix(0, event_id=str(eid)), fix(1)])
+        self.assertEqual(errors, [])
+        # The racing request lands its copy after our event_id lookup.
+        real_bulk_create = LocationPing.objects.bulk_create
+
+        def racing_bulk_create(objs, **kw):
+            LocationPing.objects.create(event_id=eid, lat=1, lng=1,
+                                        recorded_at="2026-08-11T09:00:00Z")
+            return real_bulk_create(objs, **kw)
+
+        with patch.object(LocationPing.objects, "bulk_create", racing_bulk_create):
+            pings, duplicates = store_fixes(valid, company=self.company)
+        self.assertEqual((len(pings), duplicates), (1, 1))
+        self.assertEqual(LocationPing.objects.filter(event_id=eid).count(), 1)
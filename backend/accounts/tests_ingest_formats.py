@@ -0,0 +1,155 @@
+"""Alternative wire formats for the location-ingest endpoint (streamed NDJSON,
+optionally gzip'd, and the compact binary encoding) — same
+saved/duplicates/errors contract as JSON."""
+import gzip
+import io
+import json
+import uuid
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from rest_framework.test import APITestCase
+
+from accounts import fix_codec
+from accounts.models import (
+    Company, Driver, Vehicle, Membership, DriverVehicleAssignment, LocationPing,
+)
+from accounts.serializers import LocationPingSerializer
+
+LOC = "/api/accounts/locations/"
+NDJSON = "application/x-ndjson"
+
+
+def fix(i=0, **kw):
+    data = {"event_id": str(uuid.uuid4()), "lat": 52.5, "lng": 13.4 + i * 1e-4,
+            "speed": 5, "recorded_at": f"2026-08-11T10:{i // 60:02d}:{i % 60:02d}Z"}
+    data.update(kw)
+    return data
+
+
+def ndjson(rows):
+    return "".join((r if isinstance(r, str) else json.dumps(r)) + "\n"
+                   for r in rows).encode()
+
+
+class IngestFormatBase(APITestCase):
+    def setUp(self):
+        owner = User.objects.create_user("owner", password="pw123456")
+        self.company = Company.objects.create(
+            user=owner, company_name="Alpha", manager_full_name="A", phone="1")
+        self.mob = User.objects.create_user("mob", password="pw123456")
+        self.driver = Driver.objects.create(user=self.mob, full_name="D", mobile="1",
+                                            company=self.company)
+        Membership.objects.create(user=self.mob, company=self.company,
+                                  role=Membership.Role.DRIVER)
+        self.vehicle = Vehicle.objects.create(company=self.company, plate_number="A-1")
+        DriverVehicleAssignment.objects.create(company=self.company, driver=self.driver,
+                                               vehicle=self.vehicle, is_active=True)
+        self.client.force_authenticate(self.mob)
+
+
+class NDJSONIngestTests(IngestFormatBase):
+    def test_plain_stream(self):
+        rows = [fix(i) for i in range(3)]
+        r = self.client.post(LOC, ndjson(rows), content_type=NDJSON)
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(r.json()["saved"], 3)
+        self.vehicle.refresh_from_db()
+        self.assertAlmostEqual(self.vehicle.lng, rows[2]["lng"])
+
+    def test_gzip_stream_keeps_per_line_errors(self):
+        first = fix(0)
+        body = gzip.compress(ndjson([first, "{not json", {"lat": 1}, first, fix(1)]))
+        r = self.client.post(LOC, body, content_type=NDJSON, HTTP_CONTENT_ENCODING="gzip")
+        self.assertEqual(r.status_code, 201)
+        data = r.json()
+        self.assertEqual((data["saved"], data["duplicates"]), (2, 1))
+        self.assertEqual([e["index"] for e in data["errors"]], [1, 2])
+
+    def test_stream_is_stored_in_chunks(self):
+        from accounts import telemetry
+        rows = [fix(i) for i in range(7)]
+        with patch.object(telemetry, "STREAM_CHUNK_SIZE", 3), \
+                patch.object(telemetry, "store_fixes", wraps=telemetry.store_fixes) as store:
+            r = self.client.post(LOC, ndjson(rows), content_type=NDJSON)
+        self.assertEqual(r.json()["saved"], 7)
+        self.assertEqual([len(c.args[0]) for c in store.call_args_list], [3, 3, 1])
+        self.assertEqual(LocationPing.objects.count(), 7)
+
+    def test_corrupt_gzip_is_a_client_error(self):
+        r = self.client.post(LOC, b"\x1f\x8bnot-really", content_type=NDJSON,
+                             HTTP_CONTENT_ENCODING="gzip")
+        self.assertEqual(r.status_code, 400)
+
+    def test_chunked_stream_without_content_length(self):
+        body = ndjson([fix(i) for i in range(3)])
+        chunked = {"CONTENT_LENGTH": "", "HTTP_TRANSFER_ENCODING": "chunked"}
+        # The server has de-chunked the body and marks EOF as its end.
+        r = self.client.post(LOC, body, content_type=NDJSON, **chunked,
+                             **{"wsgi.input": io.BytesIO(body), "wsgi.input_terminated": True})
+        self.assertEqual(r.status_code, 201, r.content)
+        self.assertEqual(r.json()["saved"], 3)
+        # A server that leaves the body delimited only by the socket: refuse
+        # rather than store nothing.
+        r = self.client.post(LOC, ndjson([fix(9)]), content_type=NDJSON, **chunked)
+        self.assertEqual(r.status_code, 411)
+        self.assertEqual(LocationPing.objects.count(), 3)
+
+    def test_unknown_encoding_rejected(self):
+        r = self.client.post(LOC, ndjson([fix()]), content_type=NDJSON,
+                             HTTP_CONTENT_ENCODING="br")
+        self.assertEqual(r.status_code, 400)
+
+
+class BinaryIngestTests(IngestFormatBase):
+    def _full_fix(self, i=0):
+        return fix(i, speed=13.37, heading=271.5, accuracy=4.2, altitude=-12.34,
+                   battery=87, is_moving=False, lat=-33.8688197, lng=151.2092955)
+
+    def test_codec_round_trip_matches_serializer(self):
+        rows = [self._full_fix(i) for i in range(3)] + [fix(5, heading=None, battery=None)]
+        ser = LocationPingSerializer()
+        via_json = [ser.run_validation(r) for r in rows]
+        via_wire = [ser.run_validation(r) for r in fix_codec.decode(fix_codec.encode(rows))]
+        for a, b in zip(via_json, via_wire):
+            # The binary record always carries every field; a key the JSON fix
+            # omitted decodes to what the model would have stored anyway.
+            a = {"is_moving": True, **a}
+            self.assertEqual(a["recorded_at"], b["recorded_at"])
+            self.assertEqual(a["event_id"], b["event_id"])
+            self.assertEqual(a["is_moving"], b["is_moving"])
+            self.assertEqual(a.get("battery"), b.get("battery"))
+            for key, places in (("lat", 6), ("lng", 6), ("speed", 2), ("accuracy", 1),
+                                ("altitude", 2), ("heading", 2)):
+                if a.get(key) is None:
+                    self.assertIsNone(b.get(key))
+                else:
+                    self.assertAlmostEqual(a[key], b[key], places=places)
+
+    def test_out_of_order_fixes_keep_their_timestamps(self):
+        rows = [fix(30), fix(10), fix(50)]
+        decoded = fix_codec.decode(fix_codec.encode(rows))
+        self.assertEqual([d["recorded_at"].second for d in decoded], [30, 10, 50])
+
+    def test_binary_upload_is_stored(self):
+        rows = [self._full_fix(i) for i in range(4)]
+        r = self.client.post(LOC, fix_codec.encode(rows), content_type=fix_codec.MEDIA_TYPE)
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(r.json()["saved"], 4)
+        ping = LocationPing.objects.get(event_id=rows[0]["event_id"])
+        self.assertEqual((ping.battery, ping.is_moving), (87, False))
+        again = self.client.post(LOC, fix_codec.encode(rows), content_type=fix_codec.MEDIA_TYPE)
+        self.assertEqual(again.json()["duplicates"], 4)
+
+    def test_unknown_version_rejected(self):
+        payload = bytearray(fix_codec.encode([fix()]))
+        payload[4] = 99
+        r = self.client.post(LOC, bytes(payload), content_type=fix_codec.MEDIA_TYPE)
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(LocationPing.objects.count(), 0)
+
+    def test_truncated_payload_reports_missing_records(self):
+        payload = fix_codec.encode([fix(i) for i in range(3)])[:-10]
+        r = self.client.post(LOC, payload, content_type=fix_codec.MEDIA_TYPE)
+        self.assertEqual(r.json()["saved"], 2)
+        self.assertEqual([e["index"] for e in r.json()["errors"]], [2])
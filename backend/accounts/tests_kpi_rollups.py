@@ -0,0 +1,169 @@
+"""Daily KPI rollups: trip, expense and incident writes rebuild the days they
+touch, in the company's time zone, and kpis/ reads the rollup rows."""
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from rest_framework.test import APITestCase
+
+from accounts import kpi_rollups
+from accounts.models import (
+    Company, CompanySettings, DailyKpi, Driver, Expense, Incident, Membership, Trip, Vehicle,
+)
+
+URL = "/api/accounts/kpis/"
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=dt_timezone.utc)
+
+
+class KpiRollupTests(APITestCase):
+    def setUp(self):
+        owner = User.objects.create_user("kpi_owner", password="pw123456")
+        self.company = Company.objects.create(
+            user=owner, company_name="Kpi", manager_full_name="O", phone="1")
+        Membership.objects.create(user=owner, company=self.company,
+                                  role=Membership.Role.COMPANY_OWNER)
+        CompanySettings.objects.create(company=self.company, timezone="Asia/Tehran")
+        self.vehicle = Vehicle.objects.create(company=self.company, plate_number="K-1",
+                                              vehicle_type="Truck")
+        self.driver = Driver.objects.create(full_name="D", mobile="1", company=self.company)
+        self.client.force_authenticate(owner)
+
+    def _trip(self, **kw):
+        fields = dict(company=self.company, origin="A", destination="B",
+                      vehicle_ref=self.vehicle, driver_ref=self.driver, distance=120,
+                      revenue=Decimal("300.00"), status="COMPLETED",
+                      start_time=utc(2026, 9, 1, 8), completed_at=utc(2026, 9, 1, 12))
+        fields.update(kw)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Trip.objects.create(**fields)
+
+    def _expense(self, **kw):
+        fields = dict(company=self.company, title="Fuel", category="Fuel",
+                      amount=Decimal("50.00"), liters=Decimal("30.00"),
+                      date=date(2026, 9, 1), vehicle_ref=self.vehicle)
+        fields.update(kw)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Expense.objects.create(**fields)
+
+    def _day(self, day):
+        return DailyKpi.objects.filter(company=self.company, day=day)
+
+    def test_completed_trip_counts_on_its_local_completion_day(self):
+        # 21:00 UTC is already the next day in Tehran (UTC+3:30).
+        self._trip(completed_at=utc(2026, 9, 1, 21))
+        self._trip(status="ACTIVE", completed_at=None)
+        row = self._day(date(2026, 9, 2)).get()
+        self.assertEqual((row.trips_completed, row.distance_km, row.revenue),
+                         (1, 120, Decimal("300.00")))
+        self.assertEqual((row.vehicle_id, row.driver_id), (self.vehicle.id, self.driver.id))
+        self.assertFalse(self._day(date(2026, 9, 1)).exists())
+
+    def test_edits_and_deletes_rebuild_old_and_new_days(self):
+        trip = self._trip()
+        trip.completed_at = utc(2026, 9, 3, 12)
+        with self.captureOnCommitCallbacks(execute=True):
+            trip.save()
+        self.assertFalse(self._day(date(2026, 9, 1)).exists())
+        self.assertEqual(self._day(date(2026, 9, 3)).get().trips_completed, 1)
+
+        trip.status = "CANCELLED"
+        with self.captureOnCommitCallbacks(execute=True):
+            trip.save()
+        self.assertFalse(DailyKpi.objects.exists())
+
+        expense = self._expense()
+        with self.captureOnCommitCallbacks(execute=True):
+            expense.delete()
+        self.assertFalse(DailyKpi.objects.exists())
+
+    def test_expenses_by_category_skip_rejected_and_follow_their_date(self):
+        self._expense()
+        self._expense(category="Tolls", amount=Decimal("7.50"), liters=None)
+        self._expense(amount=Decimal("999.00"), approval="REJECTED")
+        row = self._day(date(2026, 9, 1)).get()
+        self.assertEqual(row.expenses, Decimal("57.50"))
+        self.assertEqual(row.fuel_liters, Decimal("30.00"))
+        self.assertEqual(row.expenses_by_category, {"Fuel": "50.00", "Tolls": "7.50"})
+
+        moved = Expense.objects.get(category="Tolls")
+        moved.date = date(2026, 9, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            moved.save()
+        self.assertEqual(self._day(date(2026, 9, 1)).get().expenses, Decimal("50.00"))
+        self.assertEqual(self._day(date(2026, 9, 2)).get().expenses, Decimal("7.50"))
+
+    def test_resolving_an_incident_updates_the_open_count(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            incident = Incident.objects.create(company=self.company, vehicle=self.vehicle,
+                                               description="Flat tyre")
+        row = DailyKpi.objects.get(company=self.company)
+        self.assertEqual((row.incidents_opened, row.incidents_open), (1, 1))
+        incident.resolved_at = incident.created_at
+        with self.captureOnCommitCallbacks(execute=True):
+            incident.save()
+        row = DailyKpi.objects.get(company=self.company)
+        self.assertEqual((row.incidents_opened, row.incidents_open), (1, 0))
+
+    def test_api_reads_the_rollups(self):
+        self._trip()
+        self._trip(completed_at=utc(2026, 9, 2, 12), vehicle_ref=None)
+        self._expense()
+        r = self.client.get(URL, {"from": "2026-09-01", "to": "2026-09-30", "group": "vehicle"})
+        self.assertEqual(r.status_code, 200)
+        by_vehicle = {row["vehicle"]: row for row in r.data["results"]}
+        self.assertEqual(by_vehicle[self.vehicle.id]["trips_completed"], 1)
+        self.assertEqual(by_vehicle[self.vehicle.id]["expenses"], "50.00")
+        self.assertEqual(by_vehicle[None]["revenue"], "300.00")
+
+        r = self.client.get(URL, {"from": "2026-09-01", "to": "2026-09-30"})
+        self.assertEqual([row["day"] for row in r.data["results"]],
+                         [date(2026, 9, 1), date(2026, 9, 2)])
+        self.assertEqual(self.client.get(URL, {"group": "month"}).status_code, 400)
+        self.assertEqual(self.client.get(URL, {"from": "2026-09-30", "to": "2026-09-01"})
+                         .status_code, 400)
+
+    def test_backfill_rebuilds_what_bypassed_the_signals(self):
+        Trip.objects.bulk_create([Trip(
+            company=self.company, origin="A", destination="B", vehicle_ref=self.vehicle,
+            distance=10, status="COMPLETED", completed_at=utc(2026, 9, 5, 12))])
+        self.assertFalse(DailyKpi.objects.exists())
+        out = StringIO()
+        call_command("rollup_kpis", "--company", str(self.company.id),
+                     "--since", "2026-09-01", stdout=out)
+        self.assertEqual(self._day(date(2026, 9, 5)).get().distance_km, 10)
+        self.assertIn("company", out.getvalue())
+        # Idempotent.
+        kpi_rollups.rebuild(self.company.id, date(2026, 9, 1), date(2026, 9, 30))
+        self.assertEqual(DailyKpi.objects.count(), 1)
+
+    @skipUnless(connection.vendor == "postgresql", "NULLS NOT DISTINCT needs PostgreSQL 15+")
+    def test_a_day_cannot_hold_the_same_unattributed_row_twice(self):
+        DailyKpi.objects.create(company=self.company, day=date(2026, 9, 1))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DailyKpi.objects.create(company=self.company, day=date(2026, 9, 1))
+
+    def test_deleting_a_vehicle_folds_its_rows_into_the_unattributed_one(self):
+        self._expense()
+        self._expense(vehicle_ref=None, amount=Decimal("5.00"), liters=None)
+        self.assertEqual(self._day(date(2026, 9, 1)).count(), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vehicle.delete()
+        # One row per (day, vehicle, driver): with SET_NULL alone there would
+        # be two unattributed rows, which PostgreSQL's constraint rejects.
+        row = self._day(date(2026, 9, 1)).get()
+        self.assertEqual((row.vehicle_id, row.driver_id, row.expenses),
+                         (None, None, Decimal("55.00")))
+
+        self._trip(vehicle_ref=None)
+        self._trip(vehicle_ref=None, driver_ref=None)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.driver.delete()
+        row = self._day(date(2026, 9, 1)).get()
+        self.assertEqual((row.trips_completed, row.expenses), (2, Decimal("55.00")))
@@ -0,0 +1,86 @@
+"""Coalesced vehicle/driver latest state: ingest writes the cache, the live
+map reads it, one bulk UPDATE per model flushes it."""
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from accounts import latest_state
+from accounts.models import Company, Driver, Vehicle, Membership, DriverVehicleAssignment
+
+LOC = "/api/accounts/locations/"
+LIVE = "/api/accounts/vehicles/live/"
+
+
+def fix(i=0, **kw):
+    data = {"event_id": str(uuid.uuid4()), "lat": 52.5, "lng": 13.4 + i * 1e-3,
+            "speed": 10, "recorded_at": f"2026-08-11T10:00:{i:02d}Z"}
+    data.update(kw)
+    return data
+
+
+@override_settings(FLEET_LATEST_STATE_FLUSH_SECONDS=3600)
+class CoalescedLatestStateTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user("owner", password="pw123456")
+        self.company = Company.objects.create(
+            user=self.owner, company_name="Alpha", manager_full_name="A", phone="1")
+        self.vehicles, self.drivers = [], []
+        for n in range(3):
+            user = User.objects.create_user(f"mob{n}", password="pw123456")
+            driver = Driver.objects.create(user=user, full_name=f"D{n}", mobile="1",
+                                           company=self.company)
+            Membership.objects.create(user=user, company=self.company,
+                                      role=Membership.Role.DRIVER)
+            vehicle = Vehicle.objects.create(company=self.company, plate_number=f"A-{n}")
+            DriverVehicleAssignment.objects.create(company=self.company, driver=driver,
+                                                   vehicle=vehicle, is_active=True)
+            self.vehicles.append(vehicle)
+            self.drivers.append(driver)
+
+    def _post(self, n, *fixes):
+        self.client.force_authenticate(self.drivers[n].user)
+        r = self.client.post(LOC, {"locations": list(fixes)}, format="json")
+        self.assertEqual(r.status_code, 201)
+
+    def test_ingest_defers_row_updates_but_live_map_is_fresh(self):
+        self._post(0, fix(0))
+        self._post(0, fix(1))
+        v = Vehicle.objects.get(pk=self.vehicles[0].pk)
+        self.assertIsNone(v.last_seen_at)  # not flushed yet
+
+        self.client.force_authenticate(self.owner)
+        rows = {r["id"]: r for r in self.client.get(LIVE).json()}
+        live = rows[self.vehicles[0].pk]
+        self.assertAlmostEqual(live["lng"], 13.401)
+        self.assertEqual((live["speed"], live["live_status"]), (36, "MOVING"))
+
+    def test_flush_is_one_update_per_model(self):
+        for n in range(3):
+            self._post(n, fix(n))
+        self._post(0, fix(5))
+        with self.assertNumQueries(2):
+            self.assertEqual(latest_state.flush(), 6)
+        v = Vehicle.objects.get(pk=self.vehicles[0].pk)
+        self.assertAlmostEqual(v.lng, 13.405)
+        self.assertIsNotNone(Driver.objects.get(pk=self.drivers[2].pk).last_seen_at)
+        # Nothing new since: nothing to write.
+        with self.assertNumQueries(0):
+            self.assertEqual(latest_state.flush(), 0)
+
+    def test_missing_log_entry_waits_once(self):
+        self._post(0, fix(0))
+        cache.delete(f"{latest_state.PREFIX}dirty:1")  # vehicle entry evicted
+        latest_state.flush()
+        self.assertEqual(cache.get(latest_state.FLUSHED), 0)
+        latest_state.flush()
+        self.assertEqual(cache.get(latest_state.FLUSHED), 2)
+        self.assertIsNotNone(Driver.objects.get(pk=self.drivers[0].pk).last_seen_at)
+
+    @override_settings(FLEET_LATEST_STATE_FLUSH_SECONDS=0)
+    def test_default_writes_through(self):
+        self._post(1, fix(0))
+        self.assertIsNotNone(Vehicle.objects.get(pk=self.vehicles[1].pk).last_seen_at)
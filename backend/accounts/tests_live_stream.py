@@ -0,0 +1,149 @@
+"""Live Map SSE stream: snapshot, then per-vehicle position events pushed by
+ingest through the in-process broadcaster."""
+import asyncio
+import json
+import uuid
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core import signing
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts import live_stream
+from accounts.models import Company, Driver, Vehicle, Membership, DriverVehicleAssignment
+
+STREAM = "/api/accounts/vehicles/live/stream/"
+TICKET = "/api/accounts/vehicles/live/stream/ticket/"
+LOC = "/api/accounts/locations/"
+
+
+def parse(chunk):
+    lines = dict(line.split(": ", 1) for line in chunk.decode().strip().split("\n"))
+    return lines["event"], json.loads(lines["data"])
+
+
+class LiveStreamTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="pw123456")
+        self.company = Company.objects.create(
+            user=self.owner, company_name="Alpha", manager_full_name="A", phone="1")
+        self.mob = User.objects.create_user("mob", password="pw123456")
+        self.driver = Driver.objects.create(user=self.mob, full_name="D", mobile="1",
+                                            company=self.company)
+        Membership.objects.create(user=self.mob, company=self.company,
+                                  role=Membership.Role.DRIVER)
+        self.vehicle = Vehicle.objects.create(company=self.company, plate_number="A-1")
+        DriverVehicleAssignment.objects.create(company=self.company, driver=self.driver,
+                                               vehicle=self.vehicle, is_active=True)
+        self.token = str(RefreshToken.for_user(self.owner).access_token)
+
+    def _ingest(self):
+        client = APIClient()
+        client.force_authenticate(self.mob)
+        with self.captureOnCommitCallbacks(execute=True):
+            r = client.post(LOC, {"locations": [{
+                "event_id": str(uuid.uuid4()), "lat": 52.5, "lng": 13.4, "speed": 10,
+                "recorded_at": timezone.now().isoformat()}]}, format="json")
+        self.assertEqual(r.status_code, 201)
+
+    async def test_snapshot_then_position_events(self):
+        r = await self.async_client.post(TICKET, headers={"Authorization": f"Bearer {self.token}"})
+        self.assertEqual(r.status_code, 200)
+        r = await self.async_client.get(STREAM, {"ticket": r.json()["ticket"]})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r["Content-Type"], "text/event-stream")
+        events = aiter(r.streaming_content)
+        self.assertTrue((await anext(events)).startswith(b"retry:"))
+        event, rows = parse(await anext(events))
+        self.assertEqual(event, "snapshot")
+        self.assertEqual([(v["plate_number"], v["lat"]) for v in rows], [("A-1", None)])
+        self.assertEqual(rows[0]["driver"]["full_name"], "D")
+
+        await sync_to_async(self._ingest)()
+        event, row = parse(await asyncio.wait_for(anext(events), 5))
+        self.assertEqual(event, "position")
+        self.assertEqual((row["id"], row["lat"], row["speed"], row["live_status"]),
+                         (self.vehicle.id, 52.5, 36, "MOVING"))
+        await events.aclose()
+
+    async def test_heartbeat_and_resync(self):
+        with mock.patch.object(live_stream, "HEARTBEAT_SECONDS", 0.01), \
+                mock.patch.object(live_stream, "RESYNC_SECONDS", 0.05):
+            r = await self.async_client.get(STREAM, headers={"Authorization": f"Bearer {self.token}"})
+            events = aiter(r.streaming_content)
+            await anext(events), await anext(events)
+            self.assertEqual(await anext(events), b": ping\n\n")
+            chunks = [await anext(events) for _ in range(10)]
+            await events.aclose()
+        self.assertTrue(any(c.startswith(b"event: snapshot") for c in chunks))
+
+    async def _stream_until_closed(self, user):
+        token = str(RefreshToken.for_user(user).access_token)
+        r = await self.async_client.get(STREAM, headers={"Authorization": f"Bearer {token}"})
+        self.assertEqual(r.status_code, 200)
+        events = aiter(r.streaming_content)
+        await anext(events), await anext(events)
+        self.assertEqual(await anext(events), b": ping\n\n")
+        return events
+
+    async def test_stream_ends_when_viewer_leaves_the_company(self):
+        dispatcher = await sync_to_async(User.objects.create_user)("disp", password="pw123456")
+        membership = await sync_to_async(Membership.objects.create)(
+            user=dispatcher, company=self.company, role=Membership.Role.DISPATCHER)
+        with mock.patch.object(live_stream, "HEARTBEAT_SECONDS", 0.01):
+            events = await self._stream_until_closed(dispatcher)
+            await sync_to_async(membership.delete)()
+            with self.assertRaises(StopAsyncIteration):
+                for _ in range(5):
+                    await asyncio.wait_for(anext(events), 5)
+
+    async def test_stream_ends_when_company_is_suspended(self):
+        with mock.patch.object(live_stream, "HEARTBEAT_SECONDS", 0.01):
+            events = await self._stream_until_closed(self.owner)
+            await sync_to_async(User.objects.filter(pk=self.owner.pk).update)(is_active=False)
+            with self.assertRaises(StopAsyncIteration):
+                for _ in range(5):
+                    await asyncio.wait_for(anext(events), 5)
+
+    async def test_overflow_queues_a_resync(self):
+        with mock.patch.object(live_stream, "QUEUE_SIZE", 2):
+            sub = live_stream.broadcaster.subscribe(self.company.id)
+        try:
+            for i in range(3):
+                live_stream.broadcaster.publish(self.company.id, b"x")
+            live_stream.broadcaster.publish(self.company.id + 1, b"other company")
+            await asyncio.sleep(0)
+            self.assertIs(sub.queue.get_nowait(), live_stream.RESYNC)
+            self.assertTrue(sub.queue.empty())
+        finally:
+            live_stream.broadcaster.unsubscribe(sub)
+
+    async def test_requires_company_member_ticket(self):
+        stranger = await sync_to_async(User.objects.create_user)("x")
+        foreign = await sync_to_async(live_stream.issue_ticket)(stranger)
+        signed_elsewhere = signing.dumps(self.owner.pk, salt="other")
+        for params, expected in (({}, 401), ({"ticket": "nope"}, 401),
+                                 ({"ticket": signed_elsewhere}, 401),
+                                 ({"token": self.token}, 401), ({"ticket": foreign}, 403)):
+            r = await self.async_client.get(STREAM, params)
+            self.assertEqual(r.status_code, expected, params)
+        r = await self.async_client.post(
+            TICKET, headers={"Authorization": f"Bearer {RefreshToken.for_user(stranger).access_token}"})
+        self.assertEqual(r.status_code, 403)
+
+    async def test_expired_ticket_is_refused(self):
+        ticket = await sync_to_async(live_stream.issue_ticket)(self.owner)
+        with mock.patch.object(live_stream, "TICKET_SECONDS", -1):
+            r = await self.async_client.get(STREAM, {"ticket": ticket})
+        self.assertEqual(r.status_code, 401)
+
+    def test_wsgi_is_told_to_poll(self):
+        self.client.force_authenticate(self.owner)
+        with self.assertLogs("accounts.live_stream", "DEBUG"), \
+                self.assertNoLogs("django.request", "WARNING"):
+            self.assertEqual(self.client.post(TICKET).status_code, 501)
+            self.assertEqual(self.client.get(
+                STREAM, {"ticket": live_stream.issue_ticket(self.owner)}).status_code, 501)
@@ -0,0 +1,134 @@
+"""Versioned Live Map feed: ETag/304, ?since= deltas fed by ingest and by
+assignment/trip/settings changes, and time-driven OFFLINE transitions."""
+import time
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts import live_versions
+from accounts.models import (
+    Company, CompanySettings, Driver, Vehicle, Membership, DriverVehicleAssignment, Trip,
+)
+
+LIVE = "/api/accounts/vehicles/live/"
+LOC = "/api/accounts/locations/"
+
+
+class LiveVersionTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user("owner", password="pw123456")
+        self.company = Company.objects.create(
+            user=self.owner, company_name="Alpha", manager_full_name="A", phone="1")
+        self.mob = User.objects.create_user("mob", password="pw123456")
+        self.driver = Driver.objects.create(user=self.mob, full_name="D", mobile="1",
+                                            company=self.company)
+        Membership.objects.create(user=self.mob, company=self.company,
+                                  role=Membership.Role.DRIVER)
+        self.v1 = Vehicle.objects.create(company=self.company, plate_number="A-1")
+        self.v2 = Vehicle.objects.create(company=self.company, plate_number="A-2")
+        DriverVehicleAssignment.objects.create(company=self.company, driver=self.driver,
+                                               vehicle=self.v1, is_active=True)
+        self.client.force_authenticate(self.owner)
+
+    def _ingest(self):
+        self.client.force_authenticate(self.mob)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(LOC, {"locations": [{
+                "event_id": str(uuid.uuid4()), "lat": 52.5, "lng": 13.4, "speed": 1,
+                "recorded_at": timezone.now().isoformat()}]}, format="json")
+        self.client.force_authenticate(self.owner)
+
+    def _since(self, version):
+        return self.client.get(LIVE, {"since": version}).json()
+
+    def test_etag_304_until_ingest(self):
+        r = self.client.get(LIVE)
+        self.assertEqual(len(r.json()), 2)
+        etag = r["ETag"]
+        self.assertEqual(self.client.get(LIVE, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self._ingest()
+        r = self.client.get(LIVE, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(r["ETag"], etag)
+
+    def test_since_returns_only_changed_vehicles(self):
+        first = self._since("")
+        self.assertTrue(first["full"])
+        self.assertEqual(len(first["vehicles"]), 2)
+        self.assertEqual(self._since(first["version"])["vehicles"], [])
+
+        self._ingest()
+        delta = self._since(first["version"])
+        self.assertFalse(delta["full"])
+        self.assertEqual([(v["id"], v["lat"]) for v in delta["vehicles"]], [(self.v1.id, 52.5)])
+
+    def test_trip_assignment_and_deletion_are_tracked(self):
+        version = self._since("")["version"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Trip.objects.create(company=self.company, origin="A", destination="B",
+                                vehicle_ref=self.v2, status="ACTIVE")
+        delta = self._since(version)
+        self.assertEqual([v["trip"]["origin"] for v in delta["vehicles"]], ["A"])
+
+        version = delta["version"]
+        with self.captureOnCommitCallbacks(execute=True):
+            r = self.client.post(f"/api/accounts/vehicles/{self.v2.id}/assign/",
+                                 {"driver_id": self.driver.id}, format="json")
+        self.assertEqual(r.status_code, 200, r.content)
+        delta = self._since(version)
+        self.assertEqual({v["id"]: v["driver"] for v in delta["vehicles"]},
+                         {self.v1.id: None, self.v2.id: {"id": self.driver.id, "full_name": "D"}})
+
+        version = delta["version"]
+        v2_id = self.v2.id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.v2.delete()
+        delta = self._since(version)
+        self.assertEqual((delta["vehicles"], delta["removed"]), ([], [v2_id]))
+
+    def test_threshold_change_sends_full_fleet(self):
+        version = self._since("")["version"]
+        with self.captureOnCommitCallbacks(execute=True):
+            CompanySettings.objects.create(company=self.company, offline_timeout_seconds=60)
+        self.assertTrue(self._since(version)["full"])
+
+    def test_vehicle_going_offline_counts_as_change(self):
+        # Last fix 310 s ago: it crossed the 300 s timeout 10 s ago.
+        Vehicle.objects.filter(pk=self.v2.pk).update(
+            lat=52.5, lng=13.4, last_seen_at=timezone.now() - timedelta(seconds=310))
+        epoch, version, _, _ = live_versions.parse(self._since("")["version"])
+        a_minute_ago = f"{epoch}.{version}.{int(time.time()) - 60}"
+        delta = self._since(a_minute_ago)
+        self.assertEqual([(v["id"], v["live_status"]) for v in delta["vehicles"]],
+                         [(self.v2.id, "OFFLINE")])
+        self.assertEqual(self.client.get(LIVE, HTTP_IF_NONE_MATCH=f'"{a_minute_ago}"').status_code,
+                         200)
+
+    def test_foreign_or_stale_token_gets_full_fleet(self):
+        version = self._since("")["version"]
+        cache.delete(f"live:{self.company.id}:ver")
+        self._ingest()
+        self.assertTrue(self._since(version)["full"])
+        self.assertTrue(self._since("garbage")["full"])
+
+    def test_token_from_another_viewport_gets_the_full_set(self):
+        now = timezone.now()
+        Vehicle.objects.filter(pk=self.v1.pk).update(lat=52.5, lng=13.4, last_seen_at=now)
+        Vehicle.objects.filter(pk=self.v2.pk).update(lat=48.1, lng=11.6, last_seen_at=now)
+        berlin, munich = "13,52,14,53", "11,48,12,49"
+        r = self.client.get(LIVE, {"since": "", "bbox": berlin}).json()
+        self.assertEqual([v["id"] for v in r["vehicles"]], [self.v1.id])
+        same = self.client.get(LIVE, {"since": r["version"], "bbox": berlin}).json()
+        self.assertEqual((same["full"], same["vehicles"]), (False, []))
+        # v2 never changed, so only the viewport says it is new to the client.
+        moved = self.client.get(LIVE, {"since": r["version"], "bbox": munich}).json()
+        self.assertTrue(moved["full"])
+        self.assertEqual([v["id"] for v in moved["vehicles"]], [self.v2.id])
+        etag = self.client.get(LIVE, {"bbox": berlin})["ETag"]
+        self.assertEqual(self.client.get(LIVE, {"bbox": munich}, HTTP_IF_NONE_MATCH=etag)
+                         .status_code, 200)
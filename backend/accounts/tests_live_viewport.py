@@ -0,0 +1,63 @@
+"""Viewport-bounded Live Map: ?bbox= filtering in the database and grid
+clusters below the clustering zoom."""
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts.models import Company, Vehicle
+
+LIVE = "/api/accounts/vehicles/live/"
+
+
+class LiveViewportTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="pw123456")
+        self.company = Company.objects.create(
+            user=self.owner, company_name="Alpha", manager_full_name="A", phone="1")
+        now = timezone.now()
+        # Ten vehicles in Berlin, three in Hamburg, one never reported.
+        for i in range(10):
+            Vehicle.objects.create(company=self.company, plate_number=f"B-{i}",
+                                   lat=52.50 + i * 1e-3, lng=13.40, last_seen_at=now)
+        for i in range(3):
+            Vehicle.objects.create(company=self.company, plate_number=f"HH-{i}",
+                                   lat=53.55, lng=10.00 + i * 0.05, last_seen_at=now)
+        Vehicle.objects.create(company=self.company, plate_number="NEW")
+        self.client.force_authenticate(self.owner)
+
+    def test_bbox_returns_only_visible_vehicles(self):
+        r = self.client.get(LIVE, {"bbox": "13.3,52.4,13.5,52.6"})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(sorted(v["plate_number"] for v in r.json())[:2], ["B-0", "B-1"])
+        self.assertEqual(len(r.json()), 10)
+
+    def test_low_zoom_returns_clusters(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(LIVE, {"zoom": 5}).json()
+        # One GROUP BY; no vehicle rows are loaded.
+        self.assertEqual(len([q for q in ctx.captured_queries
+                              if "accounts_vehicle" in q["sql"]]), 1)
+        clusters = sorted(data["clusters"], key=lambda c: -c["count"])
+        self.assertEqual([c["count"] for c in clusters], [10, 3])
+        self.assertAlmostEqual(clusters[0]["lat"], 52.5045, places=4)
+        self.assertIsNone(clusters[0]["vehicle_id"])
+
+        # Zoomed in on Hamburg, each vehicle gets its own cell.
+        data = self.client.get(LIVE, {"zoom": 11, "bbox": "9.9,53.5,10.1,53.6"}).json()
+        self.assertEqual(len(data["clusters"]), 3)
+        self.assertTrue(all(c["vehicle_id"] for c in data["clusters"]))
+
+    def test_high_zoom_returns_markers(self):
+        r = self.client.get(LIVE, {"zoom": 15, "bbox": "9.9,53.5,10.1,53.6"})
+        self.assertEqual([v["plate_number"] for v in r.json()], ["HH-2", "HH-1", "HH-0"])
+
+    def test_antimeridian_and_validation(self):
+        Vehicle.objects.create(company=self.company, plate_number="FJ", lat=-17.7, lng=179.9,
+                               last_seen_at=timezone.now())
+        r = self.client.get(LIVE, {"bbox": "179,-20,-179,-15"})
+        self.assertEqual([v["plate_number"] for v in r.json()], ["FJ"])
+        self.assertEqual(self.client.get(LIVE, {"bbox": "1,2,3"}).status_code, 400)
+        self.assertEqual(self.client.get(LIVE, {"bbox": "0,10,1,5"}).status_code, 400)
+        self.assertEqual(self.client.get(LIVE, {"zoom": "x"}).status_code, 400)
@@ -0,0 +1,119 @@
+"""Radius search: geohash maintained by ingest, prefix-narrowed candidates,
+exact distance ordering and the availability filter."""
+import math
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts import geo, latest_state
+from accounts.models import (
+    Company, Driver, Vehicle, Membership, DriverVehicleAssignment, Trip,
+)
+
+NEARBY = "/api/accounts/vehicles/nearby/"
+DEPOT = (52.5200, 13.4050)
+
+
+class GeohashTests(SimpleTestCase):
+    def test_reference_value(self):
+        self.assertEqual(geo.geohash_encode(57.64911, 10.40744, 11), "u4pruydqqvj")
+
+    def test_cover_contains_every_point_in_radius(self):
+        lat, lng, radius = 52.52, 13.405, 5000
+        cover = geo.geohash_cover(lat, lng, radius)
+        self.assertEqual(len(cover), 9)
+        for bearing in range(0, 360, 15):
+            # A point 4.9 km away in each direction.
+            d = 4900 / geo.EARTH_RADIUS_M
+            b, p1, l1 = math.radians(bearing), math.radians(lat), math.radians(lng)
+            p2 = math.asin(math.sin(p1) * math.cos(d) + math.cos(p1) * math.sin(d) * math.cos(b))
+            l2 = l1 + math.atan2(math.sin(b) * math.sin(d) * math.cos(p1),
+                                 math.cos(d) - math.sin(p1) * math.sin(p2))
+            h = geo.geohash_encode(math.degrees(p2), math.degrees(l2))
+            self.assertTrue(any(h.startswith(c) for c in cover), bearing)
+        self.assertIsNone(geo.geohash_cover(0, 0, 5_000_000))
+
+
+class NearbyTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="pw123456")
+        self.company = Company.objects.create(
+            user=self.owner, company_name="Alpha", manager_full_name="A", phone="1")
+        self.mob = User.objects.create_user("mob", password="pw123456")
+        self.driver = Driver.objects.create(user=self.mob, full_name="D", mobile="1",
+                                            company=self.company)
+        Membership.objects.create(user=self.mob, company=self.company,
+                                  role=Membership.Role.DRIVER)
+        self.tracked = Vehicle.objects.create(company=self.company, plate_number="T-1")
+        DriverVehicleAssignment.objects.create(company=self.company, driver=self.driver,
+                                               vehicle=self.tracked, is_active=True)
+        now = timezone.now()
+        # ~0.7 km, ~3.4 km and ~35 km from the depot.
+        for plate, lat, lng in (("NEAR", 52.5230, 13.4140), ("MID", 52.5500, 13.4050),
+                                ("FAR", 52.8300, 13.4050)):
+            Vehicle.objects.create(company=self.company, plate_number=plate, lat=lat, lng=lng,
+                                   geohash=geo.geohash_encode(lat, lng), last_seen_at=now)
+        self.client.force_authenticate(self.owner)
+
+    def _search(self, **params):
+        params = {"lat": DEPOT[0], "lng": DEPOT[1], **params}
+        r = self.client.get(NEARBY, params)
+        self.assertEqual(r.status_code, 200, r.content)
+        return r.json()
+
+    def test_ingest_keeps_geohash(self):
+        self.client.force_authenticate(self.mob)
+        self.client.post("/api/accounts/locations/", {"locations": [{
+            "event_id": str(uuid.uuid4()), "lat": 52.5210, "lng": 13.4060, "speed": 0,
+            "recorded_at": timezone.now().isoformat()}]}, format="json")
+        self.tracked.refresh_from_db()
+        self.assertEqual(self.tracked.geohash, geo.geohash_encode(52.5210, 13.4060))
+        self.client.force_authenticate(self.owner)
+        self.assertEqual([v["plate_number"] for v in self._search(radius_km=1)],
+                         ["T-1", "NEAR"])
+
+    @override_settings(FLEET_LATEST_STATE_FLUSH_SECONDS=3600)
+    def test_coalesced_position_is_searched_before_the_flush(self):
+        cache.clear()
+        self.client.force_authenticate(self.mob)
+        self.client.post("/api/accounts/locations/", {"locations": [{
+            "event_id": str(uuid.uuid4()), "lat": 52.5210, "lng": 13.4060, "speed": 0,
+            "recorded_at": timezone.now().isoformat()}]}, format="json")
+        self.tracked.refresh_from_db()
+        self.assertEqual(self.tracked.geohash, "")  # not flushed yet
+        [overlaid] = latest_state.overlay_vehicles([self.tracked])
+        self.assertEqual(overlaid.geohash, geo.geohash_encode(52.5210, 13.4060))
+        self.client.force_authenticate(self.owner)
+        self.assertEqual([v["plate_number"] for v in self._search(radius_km=1)],
+                         ["T-1", "NEAR"])
+
+    def test_nearest_first_within_radius(self):
+        with CaptureQueriesContext(connection) as ctx:
+            rows = self._search(radius_km=5)
+        self.assertEqual([v["plate_number"] for v in rows], ["NEAR", "MID"])
+        self.assertAlmostEqual(rows[0]["distance_m"], 690, delta=30)
+        [sql] = [q["sql"] for q in ctx.captured_queries
+                 if 'FROM "accounts_vehicle"' in q["sql"]]
+        self.assertIn("geohash", sql)
+        self.assertEqual([v["plate_number"] for v in self._search(radius_km=50, limit=1)],
+                         ["NEAR"])
+
+    def test_available_skips_busy_and_off_road(self):
+        Trip.objects.create(company=self.company, origin="A", destination="B", status="ACTIVE",
+                            vehicle_ref=Vehicle.objects.get(plate_number="NEAR"))
+        Vehicle.objects.filter(plate_number="MID").update(status="Maintenance")
+        rows = self._search(radius_km=50, available="true")
+        self.assertEqual([v["plate_number"] for v in rows], ["FAR"])
+
+    def test_validation(self):
+        r = self.client.get(NEARBY, {"lat": 95, "lng": "x"})
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(set(r.json()), {"lat", "lng"})
+        self.assertEqual(self.client.get(NEARBY, {"lat": 1}).json()["lng"],
+                         ["This parameter is required."])
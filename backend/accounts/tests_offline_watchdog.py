@@ -0,0 +1,95 @@
+"""Offline watchdog: deadlines per vehicle from the company's own offline
+timeout, fired once when they pass, cleared when the vehicle reports again,
+with per-tick work that follows what changed rather than the fleet size."""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from accounts.models import Company, CompanySettings, FleetAlert, Vehicle
+from accounts.offline_watchdog import OfflineWatchdog
+
+T0 = datetime(2026, 8, 11, 10, 0, tzinfo=dt_timezone.utc)
+
+
+class OfflineWatchdogTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = T0
+        self.watchdog = OfflineWatchdog(now=lambda: self.now)
+        self.companies = []
+        for name, timeout in (("Quick", 120), ("Patient", 900)):
+            owner = User.objects.create_user(f"wd_{name}", password="pw123456")
+            company = Company.objects.create(
+                user=owner, company_name=name, manager_full_name="O", phone="1")
+            CompanySettings.objects.create(company=company, offline_timeout_seconds=timeout)
+            self.companies.append(company)
+        self.quick, self.patient = self.companies
+        self.q1 = self._vehicle(self.quick, "Q-1")
+        self.p1 = self._vehicle(self.patient, "P-1")
+
+    def _vehicle(self, company, plate):
+        return Vehicle.objects.create(company=company, plate_number=plate, vehicle_type="Van",
+                                      status="Active", last_seen_at=T0)
+
+    def _report(self, vehicle, at):
+        Vehicle.objects.filter(pk=vehicle.pk).update(last_seen_at=at)
+
+    def _offline(self, **filters):
+        return FleetAlert.objects.filter(alert_type=FleetAlert.Type.VEHICLE_OFFLINE, **filters)
+
+    def test_deadline_follows_each_company_timeout(self):
+        self.assertEqual(self.watchdog.tick(), (0, 0))
+        self.now = T0 + timedelta(seconds=121)
+        self.assertEqual(self.watchdog.tick(), (1, 0))
+        self.assertEqual(self._offline().get().vehicle, self.q1)
+        self.now = T0 + timedelta(seconds=901)
+        self.assertEqual(self.watchdog.tick(), (1, 0))
+        self.assertEqual(self.watchdog.tick(), (0, 0))  # fired once
+
+    def test_report_reschedules_and_resolves(self):
+        self.watchdog.tick()
+        self.now = T0 + timedelta(seconds=100)
+        self._report(self.q1, self.now)
+        self.now = T0 + timedelta(seconds=130)
+        self.assertEqual(self.watchdog.tick(), (0, 0))  # deadline moved to 220 s
+        self.now = T0 + timedelta(seconds=221)
+        self.assertEqual(self.watchdog.tick(), (1, 0))
+        self._report(self.q1, self.now)
+        self.assertEqual(self.watchdog.tick(), (0, 1))
+        self.assertFalse(self._offline(resolved_at__isnull=True).exists())
+
+    def test_timeout_change_reschedules_company(self):
+        self.watchdog.tick()
+        self.patient.settings.offline_timeout_seconds = 60
+        self.patient.settings.save()
+        self.watchdog.refresh_company(self.patient.id)
+        self.now = T0 + timedelta(seconds=61)
+        self.assertEqual(self.watchdog.tick(), (1, 0))
+        self.assertEqual(self._offline().get().vehicle, self.p1)
+
+    def test_restart_keeps_open_alerts_and_clears_stale_ones(self):
+        self.now = T0 + timedelta(seconds=121)
+        self.watchdog.tick()
+        self.assertEqual(OfflineWatchdog(now=lambda: self.now).tick(), (0, 0))
+        self._report(self.q1, self.now)
+        self.assertEqual(OfflineWatchdog(now=lambda: self.now).tick(), (0, 1))
+
+    def test_quiet_tick_reads_only_what_reported(self):
+        for i in range(20):
+            self._vehicle(self.patient, f"P-{i + 2}")
+        self.watchdog.tick()
+        self.now = T0 + timedelta(seconds=30)
+        self._report(self.p1, self.now)
+        with CaptureQueriesContext(connection) as ctx:
+            self.watchdog.tick()
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_inactive_vehicle_is_not_alerted(self):
+        Vehicle.objects.filter(pk=self.q1.pk).update(status="Maintenance")
+        self.watchdog.tick()
+        self.now = T0 + timedelta(seconds=121)
+        self.assertEqual(self.watchdog.tick(), (0, 0))
@@ -0,0 +1,81 @@
+"""Keyset pagination of list endpoints: stable pages through ties, cursors
+both ways, a flat query count however deep the page, and ?count=estimate."""
+from datetime import date
+from urllib.parse import urlparse
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from accounts.models import Company, Expense, Membership
+
+EXPENSES = "/api/accounts/expenses/"
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        owner = User.objects.create_user("page_owner", password="pw123456")
+        self.company = Company.objects.create(
+            user=owner, company_name="Pages", manager_full_name="O", phone="1")
+        Membership.objects.create(user=owner, company=self.company,
+                                  role=Membership.Role.COMPANY_OWNER)
+        # 25 expenses over 5 days: five per date, so pages split ties.
+        Expense.objects.bulk_create([
+            Expense(company=self.company, title=f"E{i}", amount=i, date=date(2026, 8, 1 + i % 5))
+            for i in range(25)])
+        self.client.force_authenticate(owner)
+
+    def _get(self, url):
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200, r.content)
+        return r.json()
+
+    @staticmethod
+    def _path(url):
+        u = urlparse(url)
+        return f"{u.path}?{u.query}"
+
+    def _walk(self, url):
+        pages = []
+        while url:
+            page = self._get(url)
+            pages.append([row["id"] for row in page["results"]])
+            url = page["next"] and self._path(page["next"])
+        return pages
+
+    def test_walks_every_row_once_in_order(self):
+        pages = self._walk(EXPENSES + "?page_size=7")
+        self.assertEqual([len(p) for p in pages], [7, 7, 7, 4])
+        ids = [i for p in pages for i in p]
+        expected = list(Expense.objects.order_by("-date", "-id").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_previous_returns_the_page_before(self):
+        first = self._get(EXPENSES + "?page_size=6")
+        self.assertIsNone(first["previous"])
+        second = self._get(self._path(first["next"]))
+        third = self._get(self._path(second["next"]))
+        back = self._get(self._path(third["previous"]))
+        self.assertEqual(back["results"], second["results"])
+        again = self._get(self._path(back["previous"]))
+        self.assertEqual(again["results"], first["results"])
+        self.assertIsNone(again["previous"])
+
+    def test_deep_pages_cost_the_same_queries(self):
+        def queries(url):
+            with CaptureQueriesContext(connection) as ctx:
+                page = self._get(url)
+            return len(ctx.captured_queries), page
+        first_cost, page = queries(EXPENSES + "?page_size=5")
+        for _ in range(3):
+            page = self._get(self._path(page["next"]))
+        deep_cost, _ = queries(self._path(page["next"]))
+        self.assertEqual(first_cost, deep_cost)
+
+    def test_count_only_on_request(self):
+        self.assertNotIn("count", self._get(EXPENSES))
+        self.assertEqual(self._get(EXPENSES + "?count=estimate")["count"], 25)
+
+    def test_bad_cursor_is_404(self):
+        self.assertEqual(self.client.get(EXPENSES + "?cursor=bogus").status_code, 404)
@@ -0,0 +1,104 @@
+"""Time-partitioned LocationPing storage: period arithmetic, time-bounded
+history reads, and the non-PostgreSQL retention fallback."""
+from datetime import date, datetime, timezone as dt_timezone
+import uuid
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+
+from accounts import partitions
+from accounts.models import Company, Trip, LocationPing
+
+
+def at(day, hour=12):
+    return datetime(2026, 8, day, hour, tzinfo=dt_timezone.utc)
+
+
+class PeriodTests(TestCase):
+    def test_month_periods(self):
+        starts = list(partitions.periods(date(2026, 11, 15), date(2027, 1, 3), partitions.MONTH))
+        self.assertEqual(starts, [date(2026, 11, 1), date(2026, 12, 1), date(2027, 1, 1)])
+        self.assertEqual(partitions.partition_name(starts[1]), "accounts_locationping_p20261201")
+
+    def test_week_periods_start_on_monday(self):
+        self.assertEqual(partitions.period_start(date(2026, 10, 18), partitions.WEEK),
+                         date(2026, 10, 12))
+        self.assertEqual(partitions.next_period(date(2026, 10, 12), partitions.WEEK),
+                         date(2026, 10, 19))
+
+
+class HistoryQueryTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user("owner", password="pw123456")
+        self.company = Company.objects.create(
+            user=owner, company_name="Alpha", manager_full_name="A", phone="1")
+        self.trip = Trip.objects.create(company=self.company, origin="A", destination="B",
+                                        start_time=at(10), end_time=at(10, 18))
+        for day in (1, 10, 20):
+            LocationPing.objects.create(company=self.company, trip=self.trip, lat=1, lng=1,
+                                        recorded_at=at(day))
+
+    def test_between_is_half_open(self):
+        self.assertEqual(LocationPing.objects.between(at(1), at(20)).count(), 2)
+        self.assertEqual(LocationPing.objects.between(start=at(10)).count(), 2)
+
+    def test_for_trip_bounds_by_trip_window(self):
+        qs = LocationPing.objects.for_trip(self.trip)
+        self.assertIn("recorded_at", str(qs.query))
+        self.assertEqual([p.recorded_at for p in qs], [at(10)])
+
+    def test_fallback_retention_deletes_in_chunks(self):
+        with patch.object(partitions, "DELETE_CHUNK", 1):
+            deleted = partitions.detach_before(date(2026, 8, 15))
+        self.assertEqual(deleted, 2)
+        self.assertEqual(LocationPing.objects.count(), 1)
+
+    def test_command_on_unpartitioned_table(self):
+        out = StringIO()
+        days = (datetime.now(dt_timezone.utc).date() - date(2026, 8, 15)).days
+        call_command("location_partitions", "--detach-older-than", str(days), stdout=out)
+        self.assertIn("not partitioned", out.getvalue())
+        self.assertIn("deleted 2 rows", out.getvalue())
+
+
+@skipUnless(connection.vendor == "postgresql", "partitioning needs PostgreSQL")
+class PostgresPartitionTests(TestCase):
+    def setUp(self):
+        partitions.convert(unit=partitions.MONTH, ahead=0)
+        owner = User.objects.create_user("pg_owner", password="pw123456")
+        self.company = Company.objects.create(
+            user=owner, company_name="Pg", manager_full_name="A", phone="1")
+
+    def _rows_in(self, table):
+        with connection.cursor() as cur:
+            cur.execute(f'SELECT count(*) FROM "{table}"')
+            return cur.fetchone()[0]
+
+    def test_creating_a_range_moves_rows_out_of_the_default_partition(self):
+        future = datetime(2099, 5, 17, 12, tzinfo=dt_timezone.utc)
+        LocationPing.objects.create(company=self.company, lat=1, lng=1, recorded_at=future)
+        self.assertEqual(self._rows_in(partitions.DEFAULT_PARTITION), 1)
+
+        created = partitions.ensure_partitions(ahead=0, unit=partitions.MONTH,
+                                               today=future.date())
+        self.assertEqual(created, ["accounts_locationping_p20990501"])
+        self.assertEqual(self._rows_in(partitions.DEFAULT_PARTITION), 0)
+        self.assertEqual(self._rows_in(created[0]), 1)
+        self.assertEqual(LocationPing.objects.between(future, None).count(), 1)
+
+    def test_event_id_is_unique_per_recorded_at(self):
+        event = uuid.uuid4()
+        LocationPing.objects.create(company=self.company, lat=1, lng=1,
+                                    recorded_at=at(3), event_id=event)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            LocationPing.objects.create(company=self.company, lat=1, lng=1,
+                                        recorded_at=at(3), event_id=event)
+        # Re-stamped: a second row (documented behaviour change).
+        LocationPing.objects.create(company=self.company, lat=1, lng=1,
+                                    recorded_at=at(4), event_id=event)
+        self.assertEqual(LocationPing.objects.filter(event_id=event).count(), 2)
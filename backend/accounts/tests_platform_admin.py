@@ -5,9 +5,17 @@ The overriding rule tested here: a normal company OWNER must never reach any
 of these endpoints (they would otherwise see every tenant's data), and an admin
 cannot lock itself out.
 """
+import csv
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
 from rest_framework.test import APITestCase
 
+from accounts import platform_admin
+
 from accounts.models import (
     Company, Driver, Vehicle, Membership, Plan, Subscription, ContactMessage,
 )
@@ -15,6 +23,8 @@ from accounts.models import (
 
 class PlatformAdminBase(APITestCase):
     def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
         self.admin = User.objects.create_user("root", password="pw123456", is_staff=True)
 
         self.owner = User.objects.create_user("own", password="pw123456", email="own@co.test")
@@ -51,6 +61,56 @@ class OverviewTests(PlatformAdminBase):
         self.assertEqual(d["open_messages"], 1)
         self.assertTrue(any(p["code"] == "PRO" for p in d["plan_distribution"]))
 
+    def test_overview_is_two_queries(self):
+        with self.assertNumQueries(2):
+            d = platform_admin.overview_metrics()
+        self.assertEqual((d["users"], d["staff"], d["trips"]), (3, 1, 0))
+        self.assertEqual(d["subscriptions"], {"active": 1, "trial": 0, "cancelled": 0})
+
+    def _vehicles(self):
+        return self.client.get("/api/accounts/admin/overview/").json()["vehicles"]
+
+    def _age_cached_copy(self):
+        entry = cache.get(platform_admin.OVERVIEW_KEY)
+        entry["at"] -= platform_admin.OVERVIEW_CACHE_SECONDS
+        cache.set(platform_admin.OVERVIEW_KEY, entry)
+
+    def test_stale_overview_is_served_while_one_refresh_runs(self):
+        self.client.force_authenticate(self.admin)
+        self._vehicles()
+        Vehicle.objects.create(company=self.company, plate_number="A-2", vehicle_type="Van")
+        metrics = mock.patch.object(platform_admin, "overview_metrics",
+                                    wraps=platform_admin.overview_metrics)
+        with metrics as recompute:
+            # Fresh: the cached copy, no refresh.
+            self.assertEqual(self._vehicles(), 1)
+            recompute.assert_not_called()
+            # Stale while another request refreshes: the stale copy.
+            self._age_cached_copy()
+            cache.add(platform_admin.OVERVIEW_REFRESHING_KEY, 1)
+            self.assertEqual(self._vehicles(), 1)
+            recompute.assert_not_called()
+            # Stale, nobody refreshing: this request does, in line.
+            cache.delete(platform_admin.OVERVIEW_REFRESHING_KEY)
+            self.assertEqual(self._vehicles(), 2)
+            self.assertEqual(recompute.call_count, 1)
+        self.assertIsNone(cache.get(platform_admin.OVERVIEW_REFRESHING_KEY))
+
+    def test_failed_refresh_serves_the_stale_copy(self):
+        self.client.force_authenticate(self.admin)
+        self._vehicles()
+        self._age_cached_copy()
+        with mock.patch.object(platform_admin, "overview_metrics", side_effect=RuntimeError), \
+                self.assertLogs("accounts.platform_admin", "ERROR"):
+            self.assertEqual(self._vehicles(), 1)
+        self.assertIsNone(cache.get(platform_admin.OVERVIEW_REFRESHING_KEY))
+
+    def test_refresh_command_warms_the_cache(self):
+        out = StringIO()
+        call_command("refresh_admin_overview", "--once", stdout=out)
+        self.assertEqual(cache.get(platform_admin.OVERVIEW_KEY)["data"]["vehicles"], 1)
+        self.assertIn("1 companies", out.getvalue())
+
     def test_owner_is_forbidden(self):
         self.client.force_authenticate(self.owner)
         for path in ("overview/", "companies/", "contact-messages/"):
@@ -73,6 +133,56 @@ class CompanyListTests(PlatformAdminBase):
         self.assertEqual(c["plan"], "PRO")
         self.assertTrue(c["is_active"])
 
+    def _more_companies(self, n):
+        for i in range(n):
+            Company.objects.create(
+                user=User.objects.create_user(f"co{i}", password="pw123456", email=f"co{i}@x.test"),
+                company_name=f"Beta {i:02d}", manager_full_name="B", phone="2")
+
+    def test_pages_search_and_sort_in_constant_queries(self):
+        self._more_companies(5)
+        self.client.force_authenticate(self.admin)
+        url = "/api/accounts/admin/companies/"
+        with self.assertNumQueries(1):
+            page = self.client.get(url, {"sort": "company_name", "page_size": 2}).json()
+        self.assertEqual([c["company_name"] for c in page["results"]], ["Alpha Co", "Beta 00"])
+        names = []
+        while page:
+            names += [c["company_name"] for c in page["results"]]
+            page = page["next"] and self.client.get(page["next"]).json()
+        self.assertEqual(names, ["Alpha Co"] + [f"Beta {i:02d}" for i in range(5)])
+
+        found = self.client.get(url, {"search": "co3@"}).json()["results"]
+        self.assertEqual([c["company_name"] for c in found], ["Beta 03"])
+        self.assertEqual(self.client.get(url, {"sort": "driver_count"}).status_code, 400)
+
+    def test_csv_export_streams_every_company(self):
+        self._more_companies(3)
+        self.client.force_authenticate(self.admin)
+        r = self.client.get("/api/accounts/admin/companies/", {"export": "csv", "sort": "company_name"})
+        self.assertEqual(r["Content-Type"], "text/csv")
+        lines = b"".join(r.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:2], ["id", "company_name"])
+        self.assertEqual([line.split(",")[1] for line in lines[1:]],
+                         ["Alpha Co", "Beta 00", "Beta 01", "Beta 02"])
+
+    def test_csv_export_defuses_formulas(self):
+        Company.objects.filter(pk=self.company.pk).update(
+            company_name='=HYPERLINK("http://x.test","open")', phone="+4930")
+        self.client.force_authenticate(self.admin)
+        r = self.client.get("/api/accounts/admin/companies/", {"export": "csv"})
+        [row] = list(csv.DictReader(StringIO(b"".join(r.streaming_content).decode())))
+        self.assertEqual(row["company_name"], '\'=HYPERLINK("http://x.test","open")')
+        self.assertEqual(row["phone"], "'+4930")
+        self.assertEqual(row["driver_count"], "1")
+
+    def test_plain_array_is_capped(self):
+        self._more_companies(3)
+        self.client.force_authenticate(self.admin)
+        with mock.patch.object(platform_admin, "PLAIN_LIMIT", 2):
+            rows = self.client.get("/api/accounts/admin/companies/").json()
+        self.assertEqual(len(rows), 2)
+
 
 class CompanyActionTests(PlatformAdminBase):
     def test_suspend_and_reactivate_freezes_all_company_logins(self):
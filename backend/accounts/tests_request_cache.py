@@ -0,0 +1,65 @@
+"""Per-request memoization of tenant lookups and cached company thresholds:
+list endpoints run a constant number of queries, writes invalidate."""
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from accounts import fleet_status
+from accounts.fleet_status import company_thresholds
+from accounts.models import Company, CompanySettings, Driver, Membership
+
+DRIVERS = "/api/accounts/drivers/"
+
+
+class RequestCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user("owner", password="pw123456")
+        self.company = Company.objects.create(
+            user=self.owner, company_name="Alpha", manager_full_name="A", phone="1")
+        Membership.objects.create(user=self.owner, company=self.company,
+                                  role=Membership.Role.COMPANY_OWNER)
+        CompanySettings.objects.create(company=self.company, offline_timeout_seconds=600)
+        self.client.force_authenticate(self.owner)
+        # The test settings turn the cross-request cache off; exercise it here.
+        patcher = mock.patch.object(fleet_status, "THRESHOLDS_CACHE_SECONDS", 60)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _add_drivers(self, n):
+        for _ in range(n):
+            Driver.objects.create(full_name="D", mobile="1", company=self.company)
+
+    def _queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return [q["sql"] for q in ctx.captured_queries]
+
+    def test_driver_list_query_count_does_not_grow_with_rows(self):
+        self._add_drivers(2)
+        self.client.get(DRIVERS)  # thresholds now cached across requests
+        few = self._queries(DRIVERS)
+        self._add_drivers(8)
+        many = self._queries(DRIVERS)
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(len([q for q in many if "accounts_membership" in q]), 1)
+        self.assertFalse([q for q in many if "accounts_companysettings" in q])
+
+    def test_settings_patch_invalidates_thresholds(self):
+        self.assertEqual(company_thresholds(self.company)[1], 600)
+        r = self.client.patch("/api/accounts/company/settings/",
+                              {"offline_timeout_seconds": 900}, format="json")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(company_thresholds(self.company.id)[1], 900)
+
+    def test_membership_change_is_seen(self):
+        other = User.objects.create_user("other", password="pw123456")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(DRIVERS).status_code, 403)
+        Membership.objects.create(user=other, company=self.company,
+                                  role=Membership.Role.COMPANY_ADMIN)
+        self.assertEqual(self.client.get(DRIVERS).status_code, 200)
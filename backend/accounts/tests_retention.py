@@ -0,0 +1,117 @@
+"""Telemetry retention: per-company downsampling of old fixes (resumable,
+per track) and the hard deletion horizon."""
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from accounts import geo, retention
+from accounts.models import Company, CompanySettings, Vehicle, LocationPing
+
+
+class GeoTests(TestCase):
+    def test_haversine(self):
+        # One degree of latitude is ~111.2 km.
+        self.assertAlmostEqual(geo.haversine_m(0, 0, 1, 0), 111_195, delta=50)
+
+    def test_douglas_peucker_keeps_corners(self):
+        line = [(0, i * 1e-4) for i in range(10)] + [(i * 1e-4, 9e-4) for i in range(1, 10)]
+        kept = geo.douglas_peucker(line, 5)
+        self.assertEqual(kept, [0, 9, 18])
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user("owner", password="pw123456")
+        self.company = Company.objects.create(
+            user=owner, company_name="Alpha", manager_full_name="A", phone="1")
+        self.vehicle = Vehicle.objects.create(company=self.company, plate_number="A-1")
+        self.cs = CompanySettings.objects.create(
+            company=self.company, raw_telemetry_days=7, downsample_distance_m=25,
+            downsample_interval_seconds=300)
+        self.now = timezone.now()
+
+    def _track(self, days_ago, n, step_deg=0.0, every=30, **kw):
+        t0 = self.now - timedelta(days=days_ago)
+        LocationPing.objects.bulk_create([LocationPing(
+            company=self.company, vehicle=self.vehicle, lat=52.5, lng=13.4 + i * step_deg,
+            recorded_at=t0 + timedelta(seconds=every * i), **kw) for i in range(n)])
+
+    def test_parked_vehicle_is_thinned_moving_one_kept(self):
+        self._track(30, 20)                        # parked: 20 fixes, 9.5 min
+        self._track(20, 10, step_deg=0.002)        # ~135 m apart
+        self._track(1, 20)                         # inside the raw window
+        [report] = retention.run(now=self.now)
+        self.assertEqual((report.scanned, report.kept, report.removed), (30, 13, 17))
+        self.assertEqual(LocationPing.objects.count(), 33)
+        self.cs.refresh_from_db()
+        self.assertEqual(self.cs.telemetry_compacted_through, self.now - timedelta(days=7))
+
+    def test_stop_transition_is_kept(self):
+        self._track(30, 5)
+        self._track(30, 1, is_moving=False)  # same instant, different flag
+        LocationPing.objects.filter(is_moving=False).update(
+            recorded_at=self.now - timedelta(days=30) + timedelta(seconds=61))
+        retention.run(now=self.now)
+        self.assertTrue(LocationPing.objects.filter(is_moving=False).exists())
+
+    def test_resumes_window_by_window(self):
+        self._track(30, 20)
+        self._track(20, 20)
+        [first] = retention.run(now=self.now, max_windows=1)
+        self.assertEqual((first.windows, first.removed), (1, 17))
+        [second] = retention.run(now=self.now, max_windows=1)
+        self.assertEqual((second.windows, second.removed), (1, 17))
+        [third] = retention.run(now=self.now)
+        self.assertEqual((third.windows, third.scanned), (0, 0))
+
+    def test_window_deletes_as_it_reads_and_marks_done_last(self):
+        self._track(30, 20)
+        other = Vehicle.objects.create(company=self.company, plate_number="A-2")
+        LocationPing.objects.bulk_create([LocationPing(
+            company=self.company, vehicle=other, lat=52.5, lng=13.4,
+            recorded_at=self.now - timedelta(days=30, seconds=-i)) for i in range(5)])
+        tracks = []
+
+        def keep_first_then_crash(rows, cs):
+            tracks.append(len(rows))
+            if len(tracks) == 2:
+                raise RuntimeError("worker killed")
+            return {0}
+
+        with patch.object(retention, "DELETE_CHUNK", 5), \
+                patch.object(retention, "_kept_indices", keep_first_then_crash):
+            with self.assertRaises(RuntimeError):
+                retention.run(now=self.now)
+        # The first track's rows went before the second was read; the window
+        # is not marked done, so the next run thins it again.
+        self.assertEqual(LocationPing.objects.filter(vehicle=self.vehicle).count(), 1)
+        self.cs.refresh_from_db()
+        self.assertIsNone(self.cs.telemetry_compacted_through)
+        [report] = retention.run(now=self.now)
+        self.assertEqual((report.windows, report.scanned), (1, 6))
+
+    def test_hard_horizon_and_dry_run(self):
+        self.cs.raw_telemetry_days = 0
+        self.cs.telemetry_retention_days = 90
+        self.cs.save()
+        self._track(120, 4)
+        self._track(10, 4)
+        [dry] = retention.run(now=self.now, dry_run=True)
+        self.assertEqual(dry.expired, 4)
+        self.assertEqual(LocationPing.objects.count(), 8)
+        out = StringIO()
+        call_command("compact_telemetry", stdout=out)
+        self.assertIn("expired 4", out.getvalue())
+        self.assertEqual(LocationPing.objects.count(), 4)
+
+    def test_companies_without_policy_are_untouched(self):
+        self.cs.raw_telemetry_days = 0
+        self.cs.save()
+        self._track(400, 20)
+        self.assertEqual(retention.run(now=self.now), [])
+        self.assertEqual(LocationPing.objects.count(), 20)
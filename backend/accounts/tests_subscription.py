@@ -1,8 +1,14 @@
 """Phase 18 — subscription limit enforcement + tenant-scoped usage."""
+from io import StringIO
+
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 
-from accounts.models import Company, Membership, Plan, Subscription, Driver
+from accounts.models import Company, Membership, Plan, Subscription, Driver, Vehicle
+from accounts.subscriptions import get_or_create_subscription
 
 
 class SubscriptionTests(APITestCase):
@@ -45,3 +51,76 @@ class SubscriptionTests(APITestCase):
         r = self.client.post("/api/accounts/subscription/", {"plan": "PRO"}, format="json")
         self.assertEqual(r.status_code, 200)
         self.assertEqual(r.json()["plan"]["code"], "PRO")
+
+
+class SubscriptionCounterTests(APITestCase):
+    """Usage comes from counters kept on the Subscription row."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user("counter_owner", password="pw123456")
+        self.company = Company.objects.create(
+            user=self.owner, company_name="Counted", manager_full_name="A", phone="1")
+        Membership.objects.create(user=self.owner, company=self.company,
+                                  role=Membership.Role.COMPANY_OWNER)
+        Driver.objects.create(full_name="Before", mobile="1", company=self.company)
+        self.other = Company.objects.create(
+            user=User.objects.create_user("counter_other", password="pw123456"),
+            company_name="Other", manager_full_name="B", phone="2")
+
+    def _counts(self, company):
+        sub = Subscription.objects.get(company=company)
+        return sub.driver_count, sub.vehicle_count
+
+    def test_counters_follow_creates_moves_and_deletes(self):
+        # A subscription created after the fact starts from the real count.
+        get_or_create_subscription(self.company)
+        get_or_create_subscription(self.other)
+        self.assertEqual(self._counts(self.company), (1, 0))
+
+        vehicle = Vehicle.objects.create(company=self.company, plate_number="C-1")
+        driver = Driver.objects.create(full_name="D", mobile="1", company=self.company)
+        self.assertEqual(self._counts(self.company), (2, 1))
+
+        driver.company = self.other
+        driver.save()
+        vehicle.save(update_fields=["status"])
+        self.assertEqual(self._counts(self.company), (1, 1))
+        self.assertEqual(self._counts(self.other), (1, 0))
+
+        vehicle.delete()
+        Driver.objects.filter(company=self.other).delete()
+        self.assertEqual(self._counts(self.company), (1, 0))
+        self.assertEqual(self._counts(self.other), (0, 0))
+
+    def test_usage_reads_no_counts(self):
+        get_or_create_subscription(self.company)
+        self.client.force_authenticate(self.owner)
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get("/api/accounts/subscription/")
+        self.assertEqual(r.json()["usage"], {"drivers": 1, "vehicles": 0})
+        self.assertFalse([q for q in ctx.captured_queries
+                          if "COUNT" in q["sql"].upper() and "accounts_driver" in q["sql"]])
+
+    def test_reconcile_repairs_drift(self):
+        get_or_create_subscription(self.company)
+        Vehicle.objects.bulk_create([Vehicle(company=self.company, plate_number="B-1")])
+        Subscription.objects.filter(company=self.company).update(driver_count=7)
+        out = StringIO()
+        call_command("reconcile_subscriptions", stdout=out)
+        self.assertEqual(self._counts(self.company), (1, 1))
+        self.assertIn("reconciled 1 subscriptions", out.getvalue())
+
+    def test_admin_edit_leaves_the_counters_alone(self):
+        sub = get_or_create_subscription(self.company)
+        admin_user = User.objects.create_superuser("counter_admin", password="pw123456")
+        self.client.force_login(admin_user)
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.post(f"/admin/accounts/subscription/{sub.pk}/change/", {
+                "company": self.company.pk, "plan": sub.plan_id, "status": "ACTIVE",
+                "current_period_end_0": "", "current_period_end_1": ""})
+        self.assertEqual(r.status_code, 302, r.content[:500])
+        [update] = [q["sql"] for q in ctx.captured_queries
+                    if q["sql"].startswith('UPDATE "accounts_subscription"')]
+        self.assertIn('"status"', update)
+        self.assertNotIn("driver_count", update)
+        self.assertEqual(Subscription.objects.get(pk=sub.pk).status, "ACTIVE")
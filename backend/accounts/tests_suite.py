@@ -16,6 +16,8 @@ from accounts.models import (
 
 class TwoCompanies(APITestCase):
     def setUp(self):
+        # Company ids are reused across rolled-back tests; drop their cached thresholds.
+        django_cache.clear()
         self.oa = User.objects.create_user("oa", password="pw123456")
         self.ca = Company.objects.create(user=self.oa, company_name="A", manager_full_name="A", phone="1")
         Membership.objects.create(user=self.oa, company=self.ca, role=Membership.Role.COMPANY_OWNER)
@@ -210,7 +212,7 @@ class CompanyRegistrationErrorRecoveryTests(APITestCase):
 
 class TelemetryDedupRaceTests(TwoCompanies):
     """A concurrent retransmit of the same offline fix can pass the
-    exists()-check twice; the DB's uniqueness constraint must be handled as a
+    event_id lookup twice; the DB's uniqueness constraint must be handled as a
     graceful duplicate, not surfaced as an unhandled 500."""
 
     def setUp(self):
@@ -226,22 +228,25 @@ class TelemetryDedupRaceTests(TwoCompanies):
 
     def test_concurrent_duplicate_event_id_is_graceful_not_500(self):
         eid = str(uuid.uuid4())
-        # Simulate another request having already won the race and inserted
-        # this event_id a moment before this request's exists() check ran.
-        LocationPing.objects.create(company=self.ca, driver=self.driver,
-                                    vehicle=self.vehicle, event_id=eid,
-                                    lat=1, lng=2, speed=0,
-                                    recorded_at="2026-08-11T10:00:00Z")
+        # Another request inserts this event_id after our lookup found none
+        # and before our insert: only the insert is intercepted, so the
+        # lookup, the insert and the read-back all run against the DB.
+        real_bulk_create = LocationPing.objects.bulk_create
+
+        def racing_bulk_create(objs, **kw):
+            LocationPing.objects.create(company=self.ca, driver=self.driver,
+                                        vehicle=self.vehicle, event_id=eid,
+                                        lat=1, lng=2, speed=0,
+                                        recorded_at="2026-08-11T10:01:00Z")
+            return real_bulk_create(objs, **kw)
+
         self.client.force_authenticate(self.mob)
-        # Force the exists()-check to report "not a duplicate" (as it would
-        # under a real race, on a stale read), so the code proceeds to
-        # ser.save() and collides with the real DB constraint.
-        with patch("accounts.views.LocationPing.objects.filter") as mock_filter:
-            mock_filter.return_value.exists.return_value = False
+        with patch.object(LocationPing.objects, "bulk_create", racing_bulk_create):
             r = self.client.post("/api/accounts/locations/", {"locations": [
                 {"event_id": eid, "lat": 3, "lng": 4, "speed": 1,
                  "recorded_at": "2026-08-11T10:01:00Z"}]}, format="json")
         self.assertEqual(r.status_code, 201, r.content)
         self.assertEqual(r.json()["saved"], 0)
         self.assertEqual(r.json()["duplicates"], 1)
-        self.assertEqual(LocationPing.objects.filter(event_id=eid).count(), 1)
+        self.assertEqual(list(LocationPing.objects.filter(event_id=eid)
+                              .values_list("lat", flat=True)), [1])
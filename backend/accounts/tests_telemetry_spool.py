@@ -0,0 +1,154 @@
+"""Write-behind telemetry spool: 202 on accept, stored on drain, idempotent
+when a segment is replayed after a crash."""
+import fcntl
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from accounts import telemetry_spool
+from accounts.models import (
+    Company, Driver, Vehicle, Membership, DriverVehicleAssignment, LocationPing,
+)
+
+LOC = "/api/accounts/locations/"
+ASYNC = {"HTTP_PREFER": "respond-async"}
+
+
+def fix(i=0, **kw):
+    data = {"event_id": str(uuid.uuid4()), "lat": 52.5, "lng": 13.4 + i * 1e-4,
+            "speed": 10, "recorded_at": f"2026-08-11T10:00:{i:02d}Z"}
+    data.update(kw)
+    return data
+
+
+class TelemetrySpoolTests(APITestCase):
+    def setUp(self):
+        self.spool = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spool, ignore_errors=True)
+        settings = override_settings(TELEMETRY_ASYNC_INGEST=True,
+                                     TELEMETRY_SPOOL_DIR=self.spool)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        owner = User.objects.create_user("owner", password="pw123456")
+        self.company = Company.objects.create(
+            user=owner, company_name="Alpha", manager_full_name="A", phone="1")
+        self.mob = User.objects.create_user("mob", password="pw123456")
+        self.driver = Driver.objects.create(user=self.mob, full_name="D", mobile="1",
+                                            company=self.company)
+        Membership.objects.create(user=self.mob, company=self.company,
+                                  role=Membership.Role.DRIVER)
+        self.vehicle = Vehicle.objects.create(company=self.company, plate_number="A-1")
+        DriverVehicleAssignment.objects.create(company=self.company, driver=self.driver,
+                                               vehicle=self.vehicle, is_active=True)
+        self.client.force_authenticate(self.mob)
+
+    def test_accepted_then_stored_on_drain(self):
+        rows = [fix(i) for i in range(3)] + [{"lat": 1}]
+        r = self.client.post(LOC, {"locations": rows}, format="json", **ASYNC)
+        self.assertEqual(r.status_code, 202)
+        self.assertEqual(r.json()["accepted"], 3)
+        self.assertEqual([e["index"] for e in r.json()["errors"]], [3])
+        self.assertEqual(LocationPing.objects.count(), 0)
+        self.assertEqual(telemetry_spool.stats()["pending_records"], 1)
+
+        report = telemetry_spool.drain()
+        self.assertEqual((report.records, report.saved), (1, 3))
+        self.assertEqual(LocationPing.objects.filter(vehicle=self.vehicle).count(), 3)
+        self.vehicle.refresh_from_db()
+        self.assertAlmostEqual(self.vehicle.lng, rows[2]["lng"])
+        self.assertEqual(self.vehicle.speed, 36)
+        self.assertEqual(telemetry_spool.stats()["pending_records"], 0)
+
+    def test_without_prefer_header_stays_synchronous(self):
+        r = self.client.post(LOC, {"locations": [fix()]}, format="json")
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(LocationPing.objects.count(), 1)
+
+    def test_append_racing_a_seal_lands_in_the_new_journal(self):
+        # Drainer side: hold the lock on active.jsonl, as _seal() does.
+        os.makedirs(self.spool, exist_ok=True)
+        active = os.path.join(self.spool, telemetry_spool.ACTIVE)
+        sealing = open(active, "ab")
+        sealing.write(b'{"old": 1}\n')
+        sealing.flush()
+        fcntl.flock(sealing, fcntl.LOCK_EX)
+        # Writer side, in another process: opens active.jsonl, blocks on it.
+        writer = multiprocessing.get_context("fork").Process(
+            target=telemetry_spool._append, args=([b'{"new": 1}\n'],))
+        writer.start()
+        time.sleep(0.3)
+        segment = os.path.join(self.spool, "segment-1.jsonl")
+        os.replace(active, segment)
+        fcntl.flock(sealing, fcntl.LOCK_UN)
+        sealing.close()
+        writer.join(10)
+        self.assertEqual(writer.exitcode, 0)
+        with open(segment, "rb") as fh:
+            self.assertEqual(fh.read(), b'{"old": 1}\n')
+        with open(active, "rb") as fh:
+            self.assertEqual(fh.read(), b'{"new": 1}\n')
+
+    def test_replayed_segment_is_idempotent(self):
+        # No client event_id: the spool assigns a deterministic one.
+        rows = [fix(i, event_id=None) for i in range(2)]
+        self.client.post(LOC, {"locations": rows}, format="json", **ASYNC)
+        active = os.path.join(self.spool, telemetry_spool.ACTIVE)
+        copy = os.path.join(self.spool, "keep")
+        shutil.copy(active, copy)
+        telemetry_spool.drain()
+
+        # Crash after COMMIT but before the checkpoint: the segment comes back.
+        os.replace(copy, os.path.join(self.spool, "segment-1.jsonl"))
+        report = telemetry_spool.drain()
+        self.assertEqual((report.saved, report.duplicates), (0, 2))
+        self.assertEqual(LocationPing.objects.count(), 2)
+
+    def test_torn_record_is_skipped(self):
+        self.client.post(LOC, {"locations": [fix(0)]}, format="json", **ASYNC)
+        with open(os.path.join(self.spool, telemetry_spool.ACTIVE), "ab") as fh:
+            fh.write(b'{"v": 1, "fixes": [')  # writer died mid-record
+        self.client.post(LOC, {"locations": [fix(1)]}, format="json", **ASYNC)
+        report = telemetry_spool.drain()
+        self.assertEqual((report.saved, report.corrupt), (2, 1))
+
+    def test_failing_record_is_quarantined_and_drain_moves_on(self):
+        for i in range(3):
+            self.client.post(LOC, {"locations": [fix(i)]}, format="json", **ASYNC)
+        real_ingest = telemetry_spool.ingest_fixes
+        calls = []
+
+        def second_fails(fixes, **kw):
+            calls.append(fixes)
+            if len(calls) == 2:
+                LocationPing.objects.create(lat=0, lng=0, recorded_at="2026-08-11T09:00:00Z")
+                raise ValueError("schema drift")
+            return real_ingest(fixes, **kw)
+
+        with mock.patch.object(telemetry_spool, "ingest_fixes", second_fails), \
+                self.assertLogs("accounts.telemetry_spool", "ERROR"):
+            report = telemetry_spool.drain()
+        self.assertEqual((report.records, report.saved, report.quarantined), (3, 2, 1))
+        # The failed record's partial writes rolled back with it.
+        self.assertEqual(LocationPing.objects.count(), 2)
+        self.assertEqual(telemetry_spool._segments(), [])
+        with open(os.path.join(self.spool, telemetry_spool.QUARANTINE)) as fh:
+            [entry] = [json.loads(line) for line in fh]
+        self.assertIn("schema drift", entry["error"])
+        self.assertEqual(entry["record"]["fixes"][0]["lng"], calls[1][0]["lng"])
+        stats = telemetry_spool.stats()
+        self.assertEqual((stats["quarantined_records"], stats["pending_records"]), (1, 0))
+
+    def test_all_invalid_is_rejected(self):
+        r = self.client.post(LOC, {"locations": [{"lat": 1}]}, format="json", **ASYNC)
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(telemetry_spool.stats()["pending_records"], 0)
@@ -0,0 +1,60 @@
+"""Tenant context: resolved once per request (the membership comes with the
+JWT user lookup) and never stale after a membership or role change."""
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import Company, Membership, Vehicle
+from accounts.tenancy import company_for, role_for, tenant_for
+
+VEHICLES = "/api/accounts/vehicles/"
+SETTINGS = "/api/accounts/company/settings/"
+
+
+class TenantContextTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="pw123456")
+        self.company = Company.objects.create(
+            user=self.owner, company_name="Alpha", manager_full_name="A", phone="1")
+        self.admin = User.objects.create_user("admin", password="pw123456")
+        self.membership = Membership.objects.create(user=self.admin, company=self.company,
+                                                    role=Membership.Role.COMPANY_ADMIN)
+        Vehicle.objects.create(company=self.company, plate_number="A-1")
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_membership_is_joined_into_the_user_lookup(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(VEHICLES).status_code, 200)
+        membership_sql = [q["sql"] for q in ctx.captured_queries
+                          if "accounts_membership" in q["sql"]]
+        self.assertEqual(len(membership_sql), 1)
+        self.assertIn('FROM "auth_user"', membership_sql[0])
+
+    def test_role_change_applies_to_the_next_request(self):
+        self.assertEqual(self.client.get(SETTINGS).status_code, 200)
+        self.membership.role = Membership.Role.DISPATCHER
+        self.membership.save()
+        self.assertEqual(self.client.get(SETTINGS).status_code, 403)
+        self.assertEqual(self.client.get(VEHICLES).status_code, 200)
+
+    def test_removed_membership_loses_access(self):
+        self.membership.delete()
+        self.assertEqual(self.client.get(VEHICLES).status_code, 403)
+
+
+class TenantForTests(TestCase):
+    def test_context_and_legacy_fallback(self):
+        owner = User.objects.create_user("owner", password="pw123456")
+        company = Company.objects.create(user=owner, company_name="Alpha",
+                                         manager_full_name="A", phone="1")
+        # No Membership row: resolved through Company.user.
+        ctx = tenant_for(owner)
+        self.assertEqual((ctx.company, ctx.role, ctx.membership),
+                         (company, Membership.Role.COMPANY_OWNER, None))
+
+        staff = User.objects.create_user("staff", is_staff=True)
+        self.assertEqual((company_for(staff), role_for(staff)), (None, "PLATFORM_ADMIN"))
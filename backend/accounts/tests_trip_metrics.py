@@ -0,0 +1,82 @@
+"""Incremental trip metrics: folded per ingest batch, recomputed for an
+out-of-order backlog, used as the completion distance without odometers."""
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts import geo
+from accounts.models import (
+    Company, Driver, Vehicle, Membership, DriverVehicleAssignment, Trip, TripMetrics,
+)
+
+LOC = "/api/accounts/locations/"
+STEP = 0.001  # degrees of longitude per fix, ~68 m at this latitude
+
+
+class TripMetricsTests(APITestCase):
+    def setUp(self):
+        owner = User.objects.create_user("owner", password="pw123456")
+        self.company = Company.objects.create(
+            user=owner, company_name="Alpha", manager_full_name="A", phone="1")
+        self.mob = User.objects.create_user("mob", password="pw123456")
+        self.driver = Driver.objects.create(user=self.mob, full_name="D", mobile="1",
+                                            company=self.company)
+        Membership.objects.create(user=self.mob, company=self.company,
+                                  role=Membership.Role.DRIVER)
+        self.vehicle = Vehicle.objects.create(company=self.company, plate_number="A-1")
+        DriverVehicleAssignment.objects.create(company=self.company, driver=self.driver,
+                                               vehicle=self.vehicle, is_active=True)
+        self.trip = Trip.objects.create(company=self.company, origin="A", destination="B",
+                                        driver_ref=self.driver, vehicle_ref=self.vehicle,
+                                        status="ACTIVE")
+        self.t0 = timezone.now() - timedelta(minutes=30)
+        self.client.force_authenticate(self.mob)
+
+    def _fix(self, i, moving=True):
+        return {"event_id": str(uuid.uuid4()), "lat": 52.5,
+                "lng": 13.4 + (i if moving else 0) * STEP,
+                "speed": 2.3 if moving else 0, "is_moving": moving,
+                "recorded_at": (self.t0 + timedelta(seconds=30 * i)).isoformat()}
+
+    def _post(self, fixes):
+        r = self.client.post(LOC, {"locations": fixes}, format="json")
+        self.assertEqual(r.status_code, 201)
+
+    def test_batches_fold_into_one_row(self):
+        self._post([self._fix(i) for i in range(5)])
+        self._post([self._fix(i) for i in range(5, 10)])
+        m = TripMetrics.objects.get(trip=self.trip)
+        expected = geo.haversine_m(52.5, 13.4, 52.5, 13.4 + 9 * STEP)
+        self.assertAlmostEqual(m.distance_m, expected, delta=1)
+        self.assertEqual((m.fix_count, m.moving_seconds, m.idle_seconds), (10, 270, 0))
+        self.assertAlmostEqual(m.max_speed, 2.3)
+        self.assertEqual(m.vehicle_id, self.vehicle.id)
+
+    def test_idle_time_does_not_add_distance(self):
+        # Parked with GPS jitter of a few metres.
+        fixes = [self._fix(i, moving=False) for i in range(6)]
+        for n, f in enumerate(fixes):
+            f["lat"] += (n % 2) * 2e-5
+        self._post(fixes)
+        m = TripMetrics.objects.get(trip=self.trip)
+        self.assertEqual((m.distance_m, m.idle_seconds, m.moving_seconds), (0, 150, 0))
+
+    def test_out_of_order_backlog_is_recomputed(self):
+        self._post([self._fix(i) for i in range(5, 10)])
+        self._post([self._fix(i) for i in range(5)])
+        m = TripMetrics.objects.get(trip=self.trip)
+        self.assertEqual((m.fix_count, m.moving_seconds), (10, 270))
+        self.assertEqual(m.first_lng, 13.4)
+
+    def test_completion_uses_gps_distance_without_odometer(self):
+        self._post([self._fix(i) for i in range(40)])  # ~2.65 km
+        r = self.client.post(f"/api/accounts/driver/trips/{self.trip.id}/complete/", {},
+                             format="json")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()["distance"], 3)
+        self.client.force_authenticate(self.company.user)
+        data = self.client.get(f"/api/accounts/trips/{self.trip.id}/").json()
+        self.assertAlmostEqual(data["metrics"]["distance_km"], 2.65, delta=0.01)
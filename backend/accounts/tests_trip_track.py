@@ -0,0 +1,99 @@
+"""Trip breadcrumb endpoint: simplified, polyline/GeoJSON encoded, cached and
+invalidated by ingest."""
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts import geo
+from accounts.models import (
+    Company, Driver, Vehicle, Membership, DriverVehicleAssignment, Trip, LocationPing,
+)
+
+LOC = "/api/accounts/locations/"
+
+
+class TripTrackTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user("owner", password="pw123456")
+        self.company = Company.objects.create(
+            user=self.owner, company_name="Alpha", manager_full_name="A", phone="1")
+        self.mob = User.objects.create_user("mob", password="pw123456")
+        self.driver = Driver.objects.create(user=self.mob, full_name="D", mobile="1",
+                                            company=self.company)
+        Membership.objects.create(user=self.mob, company=self.company,
+                                  role=Membership.Role.DRIVER)
+        self.vehicle = Vehicle.objects.create(company=self.company, plate_number="A-1")
+        DriverVehicleAssignment.objects.create(company=self.company, driver=self.driver,
+                                               vehicle=self.vehicle, is_active=True)
+        self.trip = Trip.objects.create(company=self.company, origin="A", destination="B",
+                                        driver_ref=self.driver, vehicle_ref=self.vehicle,
+                                        status="ACTIVE")
+        t0 = self.trip.start_time
+        # An L-shaped route: 10 fixes east, then 10 north.
+        route = [(52.5, 13.4 + i * 1e-4) for i in range(10)] + \
+                [(52.5 + i * 1e-4, 13.4009) for i in range(1, 11)]
+        LocationPing.objects.bulk_create([
+            LocationPing(company=self.company, trip=self.trip, lat=lat, lng=lng,
+                         recorded_at=t0 + timedelta(seconds=30 * i))
+            for i, (lat, lng) in enumerate(route)])
+        self.url = f"/api/accounts/trips/{self.trip.id}/track/"
+        self.client.force_authenticate(self.owner)
+
+    def test_polyline_is_simplified(self):
+        r = self.client.get(self.url, {"tolerance": 2})
+        self.assertEqual(r.status_code, 200)
+        data = r.json()
+        self.assertEqual((data["points"], data["simplified_points"]), (20, 3))
+        expected = geo.encode_polyline([(52.5, 13.4), (52.5, 13.4009), (52.501, 13.4009)])
+        self.assertEqual(data["polyline"], expected)
+
+    def test_encoder_matches_reference(self):
+        # Google's documented example.
+        self.assertEqual(geo.encode_polyline([(38.5, -120.2), (40.7, -120.95),
+                                              (43.252, -126.453)]),
+                         "_p~iF~ps|U_ulLnnqC_mqNvxq`@")
+
+    def test_geojson_and_validation(self):
+        r = self.client.get(self.url, {"tolerance": 0, "output": "geojson"})
+        geometry = r.json()["geometry"]
+        self.assertEqual(geometry["type"], "LineString")
+        self.assertEqual(len(geometry["coordinates"]), 20)
+        self.assertEqual(geometry["coordinates"][0], [13.4, 52.5])
+        self.assertEqual(self.client.get(self.url, {"tolerance": "x"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"output": "kml"}).status_code, 400)
+
+    def test_cached_until_new_fixes_arrive(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url)
+        self.assertFalse([q for q in ctx.captured_queries
+                          if "accounts_locationping" in q["sql"]])
+
+        self.client.force_authenticate(self.mob)
+        self.client.post(LOC, {"locations": [{
+            "event_id": str(uuid.uuid4()), "lat": 52.6, "lng": 13.5, "speed": 1,
+            "recorded_at": (timezone.now()).isoformat()}]}, format="json")
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(self.client.get(self.url).json()["points"], 21)
+
+    def test_nearby_tolerances_share_a_cache_entry(self):
+        self.client.get(self.url, {"tolerance": 2})
+        with CaptureQueriesContext(connection) as ctx:
+            for tolerance in (2.2, 1.6, "2.000001"):
+                self.assertEqual(self.client.get(self.url, {"tolerance": tolerance})
+                                 .json()["tolerance_m"], 2)
+        self.assertFalse([q for q in ctx.captured_queries
+                          if "accounts_locationping" in q["sql"]])
+
+    def test_other_company_cannot_read_track(self):
+        other = User.objects.create_user("other", password="pw123456")
+        Company.objects.create(user=other, company_name="Beta", manager_full_name="B", phone="2")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
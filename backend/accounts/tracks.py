@@ -0,0 +1,88 @@
+"""
+Trip breadcrumb tracks for the dashboard map.
+
+A long trip is tens of thousands of LocationPing rows; serializing them
+through DRF would be both slow and huge. build_track() reads only
+(lat, lng, recorded_at) tuples through the (trip, recorded_at) index,
+simplifies the line with Douglas-Peucker at the requested tolerance and
+returns it as an encoded polyline (~3-6 bytes per point) or GeoJSON.
+
+Results are cached per (trip, tolerance, output) under a per-trip version
+that the ingest path bumps whenever new fixes land for the trip, so a
+completed trip is computed once and an active trip at most once per batch.
+The tolerance is clamped and rounded to whole metres first: it comes from the
+query string, and every distinct float would otherwise be its own entry.
+"""
+from django.core.cache import cache
+
+from . import geo
+from .models import LocationPing
+
+DEFAULT_TOLERANCE_M = 5.0
+MAX_TOLERANCE_M = 1000.0
+CACHE_SECONDS = 24 * 3600
+
+POLYLINE = "polyline"
+GEOJSON = "geojson"
+
+
+def _version_key(trip_id):
+    return f"track-version:{trip_id}"
+
+
+def track_version(trip_id):
+    return cache.get(_version_key(trip_id), 0)
+
+
+def invalidate(trip_id):
+    """New fixes for the trip: every cached rendering of it is stale."""
+    try:
+        cache.incr(_version_key(trip_id))
+    except ValueError:
+        cache.set(_version_key(trip_id), 1, timeout=None)
+
+
+def _points(trip):
+    rows = (LocationPing.objects.for_trip(trip)
+            .order_by("recorded_at", "id")
+            .values_list("lat", "lng", "recorded_at"))
+    return list(rows.iterator(chunk_size=5000))
+
+
+def _render(trip, tolerance, output):
+    rows = _points(trip)
+    lats = geo.as_array([r[0] for r in rows])
+    lngs = geo.as_array([r[1] for r in rows])
+    kept = geo.simplify(lats, lngs, tolerance) if tolerance > 0 else range(len(rows))
+    line = [(float(lats[i]), float(lngs[i])) for i in kept]
+    summary = {
+        "trip": trip.id,
+        "points": len(rows),
+        "simplified_points": len(line),
+        "tolerance_m": tolerance,
+        "started_at": rows[0][2] if rows else None,
+        "ended_at": rows[-1][2] if rows else None,
+    }
+    if output == GEOJSON:
+        return {
+            "type": "Feature",
+            "geometry": {"type": "LineString",
+                         "coordinates": [[lng, lat] for lat, lng in line]},
+            "properties": summary,
+        }
+    return {**summary, "polyline": geo.encode_polyline(line)}
+
+
+def quantize(tolerance):
+    """`tolerance` within [0, MAX_TOLERANCE_M], in whole metres."""
+    return float(round(min(max(tolerance, 0.0), MAX_TOLERANCE_M)))
+
+
+def build_track(trip, tolerance=DEFAULT_TOLERANCE_M, output=POLYLINE):
+    tolerance = quantize(tolerance)
+    key = f"track:{trip.id}:{track_version(trip.id)}:{tolerance:g}:{output}"
+    data = cache.get(key)
+    if data is None:
+        data = _render(trip, tolerance, output)
+        cache.set(key, data, timeout=CACHE_SECONDS)
+    return data
@@ -0,0 +1,123 @@
+"""
+Incremental trip metrics (TripMetrics) from GPS fixes.
+
+After each ingest batch is stored, apply() folds the batch's fixes into the
+trip's summary row, continuing from the last fix already counted:
+
+  - each step between consecutive fixes is MOVING when either fix's GPS speed
+    or the step's own speed (distance / time) reaches the company's
+    moving-speed threshold, otherwise IDLE;
+  - moving steps add their haversine length to distance_m (idle GPS jitter
+    does not inflate distance);
+  - a step longer than MAX_GAP_SECONDS is a data gap (phone offline): its
+    distance counts, its duration counts as neither moving nor idle.
+
+Offline backlogs can arrive out of order. A batch that reaches back before
+the last counted fix cannot be folded in, so that trip is recomputed from its
+stored fixes instead — rare, and still one pass over one trip.
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+
+from . import geo
+from .fleet_status import company_thresholds
+from .models import LocationPing, TripMetrics
+
+MAX_GAP_SECONDS = getattr(settings, "TRIP_METRICS_MAX_GAP_SECONDS", 600)
+
+FOLD_CHUNK = 5000
+
+_FIX_FIELDS = ("recorded_at", "lat", "lng", "speed", "is_moving")
+
+
+def _reset(m):
+    m.distance_m = m.moving_seconds = m.idle_seconds = 0
+    m.max_speed = m.avg_speed = m.last_speed = 0
+    m.fix_count = 0
+    m.first_fix_at = m.first_lat = m.first_lng = None
+    m.last_fix_at = m.last_lat = m.last_lng = None
+    m.last_is_moving = True
+
+
+def _chunks(iterable, size):
+    it = iter(iterable)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+def fold(m, fixes, moving_kmh):
+    """Extend `m` with (recorded_at, lat, lng, speed, is_moving) tuples in
+    recorded_at order, all at or after m.last_fix_at."""
+    threshold = moving_kmh / 3.6  # m/s
+    prev = ((m.last_fix_at, m.last_lat, m.last_lng, m.last_speed, m.last_is_moving)
+            if m.fix_count else None)
+    for chunk in _chunks(fixes, FOLD_CHUNK):
+        # Step lengths for the whole chunk in one geo kernel call.
+        track = [prev] + chunk if prev is not None else chunk
+        steps = (geo.step_distances([f[1] for f in track], [f[2] for f in track])
+                 if len(track) > 1 else ())
+        offset = len(track) - len(chunk) - 1
+        for j, fix in enumerate(chunk):
+            at, lat, lng, speed, is_moving = fix
+            speed = speed or 0
+            if prev is None:
+                m.first_fix_at, m.first_lat, m.first_lng = at, lat, lng
+            else:
+                dt = (at - prev[0]).total_seconds()
+                step = float(steps[j + offset])
+                moving = (max(speed, prev[3] or 0) >= threshold
+                          or (dt > 0 and step / dt >= threshold))
+                if dt > MAX_GAP_SECONDS:
+                    m.distance_m += step
+                elif moving:
+                    m.distance_m += step
+                    m.moving_seconds += dt
+                else:
+                    m.idle_seconds += dt
+            m.max_speed = max(m.max_speed, speed)
+            m.fix_count += 1
+            prev = fix
+    if prev is not None:
+        m.last_fix_at, m.last_lat, m.last_lng, m.last_speed, m.last_is_moving = prev
+    m.avg_speed = m.distance_m / m.moving_seconds if m.moving_seconds else 0
+    return m
+
+
+def recompute(m, trip, moving_kmh):
+    _reset(m)
+    rows = (LocationPing.objects.for_trip(trip)
+            .order_by("recorded_at", "id").values_list(*_FIX_FIELDS))
+    return fold(m, rows.iterator(chunk_size=FOLD_CHUNK), moving_kmh)
+
+
+def apply(trip, pings):
+    """Fold freshly stored pings of `trip` into its TripMetrics row."""
+    if trip is None or not pings:
+        return None
+    fixes = sorted((tuple(getattr(p, f) for f in _FIX_FIELDS) for p in pings),
+                   key=lambda f: f[0])
+    moving_kmh, _ = company_thresholds(trip.company_id)
+    with transaction.atomic():
+        m, _ = (TripMetrics.objects.select_for_update()
+                .get_or_create(trip=trip, defaults={"vehicle_id": trip.vehicle_ref_id}))
+        if m.fix_count and fixes[0][0] < m.last_fix_at:
+            recompute(m, trip, moving_kmh)
+        else:
+            fold(m, fixes, moving_kmh)
+        m.save()
+    return m
+
+
+def metrics_for(trip):
+    """The trip's metrics row, built from its fixes if it does not exist yet
+    (trips recorded before metrics were tracked)."""
+    m = TripMetrics.objects.filter(trip=trip).first()
+    if m is None:
+        m = TripMetrics(trip=trip, vehicle_id=trip.vehicle_ref_id)
+        moving_kmh, _ = company_thresholds(trip.company_id)
+        recompute(m, trip, moving_kmh)
+        if m.fix_count:
+            m.save()
+    return m
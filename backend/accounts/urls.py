@@ -4,10 +4,11 @@ from rest_framework_simplejwt.views import TokenRefreshView
 from .driver_ops import (
     DriverTripActionView, DriverInspectionView, DriverIncidentView, DriverExpenseView,
 )
+from .live_stream import StreamTicketView, vehicle_stream
 from .fleet_ops import InspectionViewSet, IncidentViewSet
 from .platform_admin import (
     AdminOverviewView, AdminCompanyListView, AdminCompanyActionView,
-    AdminMessageListView,
+    AdminMessageListView, AdminTelemetrySpoolView,
 )
 from .views import (
     CompanyRegisterView, DriverRegisterView, DriverListView, SiteSettingsView,
@@ -22,6 +23,7 @@ from .views import (
     DriverRegisterMobileView, DriverMeView, DriverActivateView,
     DriverInvitationView, DriverInvitationRevokeView, DriverInvitationRegenerateView,
     VehicleAssignView, VehicleUnassignView, CompanySettingsView, UserPreferencesView, SubscriptionView,
+    KpiView,
 )
 
 router = DefaultRouter()
@@ -56,6 +58,7 @@ urlpatterns = [
     path('company/settings/', CompanySettingsView.as_view(), name='company-settings'),
     path('preferences/', UserPreferencesView.as_view(), name='user-preferences'),
     path('subscription/', SubscriptionView.as_view(), name='subscription'),
+    path('kpis/', KpiView.as_view(), name='kpis'),
     path('contact/', ContactMessageCreateView.as_view(), name='contact-message'),
     # Drivers CRUD is now served by DriverViewSet via the router below.
 
@@ -70,6 +73,7 @@ urlpatterns = [
     path('admin/companies/<int:company_id>/<str:action>/', AdminCompanyActionView.as_view(),
          name='admin-company-action'),
     path('admin/contact-messages/', AdminMessageListView.as_view(), name='admin-contact-messages'),
+    path('admin/telemetry-spool/', AdminTelemetrySpoolView.as_view(), name='admin-telemetry-spool'),
     path('site-settings/', SiteSettingsView.as_view(), name='site-settings'),
 
     # Support
@@ -89,6 +93,10 @@ urlpatterns = [
     # Mobile driver app — GPS ingest
     path('locations/', LocationIngestView.as_view(), name='location-ingest'),
 
+    # Live Map — SSE stream (ASGI only; vehicles/live/ remains the poll)
+    path('vehicles/live/stream/', vehicle_stream, name='vehicle-live-stream'),
+    path('vehicles/live/stream/ticket/', StreamTicketView.as_view(), name='vehicle-live-stream-ticket'),
+
     # Phase 3 — secure driver invitation + mobile activation
     path('driver/register/', DriverRegisterMobileView.as_view(), name='driver-register-mobile'),
     path('driver/me/', DriverMeView.as_view(), name='driver-me'),
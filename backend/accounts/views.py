@@ -19,11 +19,12 @@ import logging
 from rest_framework.decorators import action
 from rest_framework import viewsets
 from rest_framework.permissions import IsAdminUser
+from rest_framework.settings import api_settings
 
 from .models import (
     Company, Driver, ContactMessage, SiteSettings,
     ActivityLog, UserSession, SecuritySettings, LoginAttempt, Profile, Alert,
-    Vehicle, Trip, Expense, LocationPing, Membership, DriverInvitation,
+    Vehicle, Trip, Expense, Membership, DriverInvitation,
     DriverVehicleAssignment, Cargo, FleetAlert, CompanySettings,
 )
 from .serializers import (
@@ -31,16 +32,23 @@ from .serializers import (
     CompanySerializer, CompanyUpdateSerializer, CompanyUserSerializer, DriverSerializer, ContactMessageSerializer,
     SiteSettingsSerializer, LoginSerializer, PasswordChangeSerializer,
     UserProfileUpdateSerializer, ActivityLogSerializer, AlertSerializer,
-    VehicleSerializer, TripSerializer, ExpenseSerializer, LocationPingSerializer,
+    VehicleSerializer, TripSerializer, ExpenseSerializer,
     DriverInvitationSerializer, CargoSerializer, FleetAlertSerializer,
     CompanySettingsSerializer,
 )
 from .invitations import issue_invitation, hash_token
 from .assignments import assign as assign_driver_vehicle, unassign as unassign_vehicle, AssignmentError
-from .fleet_status import (
-    vehicle_live_status, driver_status, company_thresholds, has_valid_position,
-)
+from .fleet_status import driver_status
 from .alerts_engine import refresh_fleet_alerts
+from .telemetry import after_ingest, ingest_fixes, ingest_stream
+from .telemetry_spool import spool_fixes, wants_async
+from .live_map import (
+    CLUSTER_BELOW_ZOOM, cell_degrees, clusters, delta_since, in_viewport, parse_bbox,
+    parse_zoom, unchanged, vehicle_rows,
+)
+from . import alert_evaluator, kpi_rollups, live_versions, nearby, tracks
+from .parsers import NDJSONParser, FixBinaryParser, FixStream, unsized_body
+from .platform_admin import admin_list
 from .subscriptions import (
     check_can_add, usage as subscription_usage, get_or_create_subscription,
     lock_subscription_for_plan_check,
@@ -807,42 +815,48 @@ class UserListView(APIView):
         # Return None if no photo found
         return None
 
+    def row(self, u):
+        company = getattr(u, 'company_profile', None)
+
+        # Get full_name from company profile first, then from user's first_name + last_name
+        if company and company.manager_full_name:
+            full_name = company.manager_full_name
+        else:
+            full_name = f"{u.first_name} {u.last_name}".strip() or u.username
+
+        return {
+            'id': u.id,
+            'username': u.username,
+            'email': u.email,
+            'full_name': full_name,
+            'phone': getattr(company, 'phone', '') if company else '',
+            'company_name': getattr(company, 'company_name', '') if company else '',
+            'is_staff': u.is_staff,
+            'is_superuser': u.is_superuser,
+            'is_manager': company is not None,
+            'date_joined': u.date_joined,
+            'profile_photo': self.get_profile_photo_url(u, company),
+        }
+
     def get(self, request):
         user = request.user
-        
+
         # فقط ادمین یا مدیر (کسی که company_profile دارد)
         if not user.is_staff:
             return Response({'detail': 'Permission denied.'}, status=403)
-        
-        users = User.objects.all().order_by('-date_joined')
-        
-        data = []
-        for u in users:
-            company = getattr(u, 'company_profile', None)
-            
-            # Get full_name from company profile first, then from user's first_name + last_name
-            full_name = None
-            if company and company.manager_full_name:
-                full_name = company.manager_full_name
-            else:
-                full_name = f"{u.first_name} {u.last_name}".strip() or u.username
-            
-            user_data = {
-                'id': u.id,
-                'username': u.username,
-                'email': u.email,
-                'full_name': full_name,
-                'phone': getattr(company, 'phone', '') if company else '',
-                'company_name': getattr(company, 'company_name', '') if company else '',
-                'is_staff': u.is_staff,
-                'is_superuser': u.is_superuser,
-                'is_manager': company is not None,
-                'date_joined': u.date_joined,
-                'profile_photo': self.get_profile_photo_url(u, company),
-            }
-            data.append(user_data)
-        
-        return Response(data)
+
+        # Company and profile come in the same query as the user: no
+        # per-row lookups. ?search= / ?sort= / ?cursor= / ?export=csv as in
+        # platform_admin.admin_list.
+        users = User.objects.select_related('company_profile', 'profile')
+        return admin_list(
+            request, self, users, self.row,
+            search_fields=('username', 'email', 'first_name', 'last_name',
+                           'company_profile__company_name'),
+            sorts=('-date_joined', 'username', 'email'),
+            columns=('id', 'username', 'email', 'full_name', 'phone', 'company_name',
+                     'is_staff', 'is_superuser', 'is_manager', 'date_joined'),
+            filename='users.csv')
 
 class UserRoleUpdateView(APIView):
     permission_classes = [IsAuthenticated]
@@ -1295,48 +1309,93 @@ class VehicleViewSet(CompanyScopedViewSet):
     def live(self, request):
         """VehicleLatestState feed for the Live Map — position, speed, driver,
         active trip + cargo, last update, and the backend-computed live status.
-        Single efficient query set (no N+1); driven by polling."""
+        Single efficient query set (no N+1); driven by polling, or streamed
+        from vehicles/live/stream/ (accounts/live_stream.py).
+
+        Versioned (accounts/live_versions.py): the ETag is the fleet version,
+        If-None-Match gets a 304 while nothing changed, and ?since=<version>
+        returns {version, full, vehicles, removed} with only what changed.
+        The version names the viewport too: a ?since= from another ?bbox=
+        gets the full set.
+
+        ?bbox=min_lng,min_lat,max_lng,max_lat limits the feed to a viewport;
+        with ?zoom= below LIVE_MAP_CLUSTER_BELOW_ZOOM the answer is
+        {zoom, cell_degrees, clusters: [{lat, lng, count, vehicle_id}]}."""
         company = company_for(request.user)
-        # Live status uses THIS company's configured thresholds (Settings page).
-        moving_speed, offline_timeout = company_thresholds(company)
-        vehicles = list(self.get_queryset().prefetch_related('assignments__driver'))
-        active_trips = (Trip.objects.filter(company=company, status='ACTIVE')
-                        .prefetch_related('cargos'))
-        trip_by_vehicle = {t.vehicle_ref_id: t for t in active_trips if t.vehicle_ref_id}
-
-        data = []
-        for v in vehicles:
-            assign = next((a for a in v.assignments.all() if a.is_active), None)
-            drv = assign.driver if assign else None
-            trip = trip_by_vehicle.get(v.id)
-            cargo = ([{'description': c.description, 'quantity': c.quantity,
-                       'cargo_type': c.cargo_type} for c in trip.cargos.all()]
-                     if trip else [])
-            # A vehicle with no real GPS fix has NO position — we send null
-            # rather than a placeholder, so the map cannot draw a phantom
-            # marker (this is what put a vehicle in the ocean at 0,0).
-            valid = has_valid_position(v)
-            data.append({
-                'id': v.id, 'plate_number': v.plate_number, 'model': v.model,
-                'vehicle_type': v.vehicle_type, 'status': v.status,
-                'lat': v.lat if valid else None,
-                'lng': v.lng if valid else None,
-                'speed': v.speed,
-                'has_valid_position': valid,
-                'last_seen_at': v.last_seen_at,
-                'live_status': vehicle_live_status(v, moving_speed, offline_timeout),
-                'driver': ({'id': drv.id, 'full_name': drv.full_name} if drv else None),
-                'trip': ({'id': trip.id, 'origin': trip.origin,
-                          'destination': trip.destination, 'status': trip.status}
-                         if trip else None),
-                'cargo': cargo,
-            })
-        return Response(data)
+        vehicles = self.get_queryset()
+        bbox = None
+        try:
+            if request.query_params.get('bbox'):
+                bbox = parse_bbox(request.query_params['bbox'])
+                vehicles = in_viewport(vehicles, bbox)
+        except ValueError as e:
+            return Response({'bbox': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            zoom = request.query_params.get('zoom')
+            zoom = parse_zoom(zoom) if zoom is not None else None
+        except ValueError as e:
+            return Response({'zoom': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        if zoom is not None and zoom < CLUSTER_BELOW_ZOOM:
+            return Response({'zoom': zoom, 'cell_degrees': cell_degrees(zoom),
+                             'clusters': clusters(vehicles, zoom)})
+        if company is None:  # platform staff: every company, unversioned
+            return Response(vehicle_rows(company, vehicles))
+        token = live_versions.current(company.id, live_versions.view_key(bbox))
+        since = request.query_params.get('since')
+        etag = request.headers.get('If-None-Match')
+        if since is None and etag and unchanged(company, vehicles, etag, token):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = etag
+            return response
+        if since is None:
+            response = Response(vehicle_rows(company, vehicles))
+        else:
+            response = Response(delta_since(company, vehicles, since, token))
+        response['ETag'] = f'"{token}"'
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        """Vehicles nearest to a point, for dispatch.
+
+            GET /api/accounts/vehicles/nearby/?lat=52.5&lng=13.4&radius_km=5
+                &limit=10&available=true&vehicle_type=Truck
+
+        Geohash prefix scan, then exact distance (accounts/nearby.py).
+        available=true keeps in-service vehicles that are not on a trip."""
+        params = request.query_params
+        errors, values = {}, {}
+        for name, default, low, high in (('lat', None, -90, 90), ('lng', None, -180, 180),
+                                          ('radius_km', 5, 0, nearby.MAX_RADIUS_M / 1000),
+                                          ('limit', 10, 1, nearby.MAX_LIMIT)):
+            raw = params.get(name, default)
+            if raw is None:
+                errors[name] = ['This parameter is required.']
+                continue
+            try:
+                values[name] = float(raw)
+            except ValueError:
+                errors[name] = ['Must be a number.']
+                continue
+            if not low <= values[name] <= high:
+                errors[name] = [f'Must be between {low:g} and {high:g}.']
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        vehicles = self.get_queryset()
+        if params.get('available', '').lower() in ('1', 'true', 'yes'):
+            vehicles = nearby.available(vehicles)
+        if params.get('vehicle_type'):
+            vehicles = vehicles.filter(vehicle_type=params['vehicle_type'])
+        return Response(nearby.nearest(company_for(request.user), vehicles,
+                                       values['lat'], values['lng'],
+                                       values['radius_km'] * 1000, int(values['limit'])))
 
 
 class TripViewSet(CompanyScopedViewSet):
     # select/prefetch to avoid N+1 (driver/vehicle refs + nested cargos).
-    queryset = Trip.objects.all().select_related('driver_ref', 'vehicle_ref').prefetch_related('cargos')
+    queryset = (Trip.objects.all().select_related('driver_ref', 'vehicle_ref', 'metrics')
+                .prefetch_related('cargos'))
     serializer_class = TripSerializer
 
     def get_queryset(self):
@@ -1348,6 +1407,9 @@ class TripViewSet(CompanyScopedViewSet):
             qs = qs.filter(start_time__gte=d_from)
         if d_to:
             qs = qs.filter(start_time__lte=d_to)
+        if self.action == 'track':
+            # The track reads its own columns; the nested serializer data is unused.
+            qs = qs.select_related(None).prefetch_related(None)
         return qs
 
     def _validate_and_sync(self, serializer, company, instance=None):
@@ -1376,6 +1438,31 @@ class TripViewSet(CompanyScopedViewSet):
         sync = self._validate_and_sync(serializer, company, instance=serializer.instance)
         serializer.save(**sync)
 
+    @action(detail=True, methods=['get'])
+    def track(self, request, pk=None):
+        """The trip's breadcrumb trail, simplified server-side.
+
+            GET /api/accounts/trips/<id>/track/?tolerance=5&output=geojson
+
+        tolerance: Douglas-Peucker tolerance in metres (0 = every fix).
+        output: "polyline" (default, Encoded Polyline Algorithm Format) or
+        "geojson" (a LineString Feature). See accounts/tracks.py.
+        """
+        trip = self.get_object()
+        try:
+            tolerance = float(request.query_params.get('tolerance', tracks.DEFAULT_TOLERANCE_M))
+        except ValueError:
+            return Response({'tolerance': ['Must be a number.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not 0 <= tolerance <= tracks.MAX_TOLERANCE_M:
+            return Response({'tolerance': [f'Must be between 0 and {tracks.MAX_TOLERANCE_M:g} metres.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        output = request.query_params.get('output', tracks.POLYLINE)
+        if output not in (tracks.POLYLINE, tracks.GEOJSON):
+            return Response({'output': ['Must be "polyline" or "geojson".']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(tracks.build_track(trip, tolerance, output))
+
 
 class CargoViewSet(CompanyScopedViewSet):
     """Company-scoped cargo. Filterable by ?trip=<id>. Create validates the
@@ -1416,9 +1503,10 @@ class FleetAlertViewSet(CompanyScopedQuerysetMixin,
         return qs
 
     def list(self, request, *args, **kwargs):
-        # Refresh from live data before returning (idempotent).
+        # A pure read while `manage.py evaluate_fleet_alerts` is running;
+        # without it, refresh from live data before returning (idempotent).
         company = company_for(request.user)
-        if company is not None:
+        if company is not None and not alert_evaluator.is_running():
             refresh_fleet_alerts(company)
         return super().list(request, *args, **kwargs)
 
@@ -1503,6 +1591,19 @@ class LocationIngestView(APIView):
         { "locations": [ {lat, lng, speed, heading, accuracy,
                           altitude, battery, is_moving, recorded_at}, ... ] }
 
+    Large offline backlogs can instead be streamed as newline-delimited JSON
+    (Content-Type: application/x-ndjson, one fix per line, optionally with
+    Content-Encoding: gzip). They are decoded and stored in fixed-size chunks,
+    and report the same saved/duplicates/errors counts; a manager posting a
+    stream passes plate_number as a query parameter. Content-Type
+    application/vnd.pathnio.fixes selects the compact binary encoding
+    (accounts/fix_codec.py) through the same streaming path.
+
+    Where TELEMETRY_ASYNC_INGEST is enabled, a request sent with
+    `Prefer: respond-async` is validated, journaled and answered 202 with an
+    `accepted` count; the fixes are stored by drain_telemetry_spool
+    (accounts/telemetry_spool.py).
+
     The authenticated user resolves to a Driver (via driver_profile) and,
     where possible, a Vehicle (matched on plate_number within the driver's
     company). Every fix is stored as history; the most recent fix is mirrored
@@ -1510,9 +1611,15 @@ class LocationIngestView(APIView):
     may also post on behalf of a vehicle by passing "plate_number".
     """
     permission_classes = [IsAuthenticated]
+    parser_classes = [*api_settings.DEFAULT_PARSER_CLASSES, NDJSONParser, FixBinaryParser]
 
     def post(self, request):
         user = request.user
+        if not unsized_body(request):
+            return Response({'detail': 'Send Content-Length, or stream to a server '
+                                       'that de-chunks request bodies.'},
+                            status=status.HTTP_411_LENGTH_REQUIRED)
+        streamed = isinstance(request.data, FixStream)
 
         # --- Resolve who / what this batch belongs to -----------------
         driver = getattr(user, 'driver_profile', None)
@@ -1533,21 +1640,25 @@ class LocationIngestView(APIView):
                     company = vehicle.company
         elif is_owner(user):
             # Manager/staff may post on behalf of one of THEIR OWN vehicles.
-            plate = request.data.get('plate_number')
+            plate = (request.query_params.get('plate_number') if streamed
+                     else request.data.get('plate_number'))
             if plate and company is not None:
                 vehicle = Vehicle.objects.filter(company=company,
                                                  plate_number=plate).first()
 
         # --- Normalise payload to a list ------------------------------
-        raw = request.data.get('locations')
-        if raw is None:
-            raw = [request.data]  # single-fix convenience form
-        if not isinstance(raw, list):
-            return Response({'detail': '"locations" must be a list.'},
-                            status=status.HTTP_400_BAD_REQUEST)
-        if not raw:
-            return Response({'saved': 0, 'detail': 'No locations supplied.'},
-                            status=status.HTTP_200_OK)
+        if streamed:
+            raw = request.data
+        else:
+            raw = request.data.get('locations')
+            if raw is None:
+                raw = [request.data]  # single-fix convenience form
+            if not isinstance(raw, list):
+                return Response({'detail': '"locations" must be a list.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if not raw:
+                return Response({'saved': 0, 'detail': 'No locations supplied.'},
+                                status=status.HTTP_200_OK)
 
         # The trip this batch belongs to = the driver's active trip (server-
         # derived, never from the client).
@@ -1556,67 +1667,54 @@ class LocationIngestView(APIView):
             trip = (Trip.objects.filter(driver_ref=driver, status='ACTIVE')
                     .order_by('-start_time').first())
 
-        # --- Persist each fix (idempotent on event_id) ----------------
-        saved = []
-        errors = []
-        duplicates = 0
-        for i, item in enumerate(raw):
-            ser = LocationPingSerializer(data=item)
-            if not ser.is_valid():
-                errors.append({'index': i, 'errors': ser.errors})
-                continue
-            eid = ser.validated_data.get('event_id')
-            if eid and LocationPing.objects.filter(event_id=eid).exists():
-                duplicates += 1  # retransmitted offline fix — skip silently
-                continue
-            try:
-                # A nested atomic() gives this its own savepoint: if the
-                # insert hits uniq_location_event_id, only this savepoint
-                # rolls back — a plain try/except here would otherwise leave
-                # the surrounding transaction (e.g. ATOMIC_REQUESTS, or a
-                # caller's own atomic block) marked "needs rollback", turning
-                # every later query in the request into a
-                # TransactionManagementError.
-                with transaction.atomic():
-                    ping = ser.save(company=company, driver=driver, vehicle=vehicle, trip=trip)
-            except IntegrityError:
-                # Concurrent retransmission of the same offline fix can pass
-                # the exists() check above twice (classic check-then-act
-                # race) and collide on uniq_location_event_id. Treat that as
-                # the same graceful duplicate, not an unhandled 500.
-                duplicates += 1
-                continue
-            saved.append(ping)
+        # --- Write-behind: journal now, store later --------------------
+        if wants_async(request):
+            receipt = spool_fixes(raw, company=company, driver=driver,
+                                  vehicle=vehicle, trip=trip)
+            if not receipt.accepted:
+                if streamed and not receipt.errors:
+                    return Response({'saved': 0, 'detail': 'No locations supplied.'},
+                                    status=status.HTTP_200_OK)
+                return Response(
+                    {'saved': 0, 'errors': receipt.errors, 'detail': 'No valid fixes.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            return Response(
+                {
+                    'accepted': receipt.accepted,
+                    'errors': receipt.errors,
+                    'batch': str(receipt.batch),
+                    'vehicle': vehicle.plate_number if vehicle else None,
+                    'vehicle_assigned': vehicle is not None,
+                    'trip': trip.id if trip else None,
+                },
+                status=status.HTTP_202_ACCEPTED,
+            )
 
-        if not saved and not duplicates:
+        # --- Persist the batch (idempotent on event_id) ----------------
+        # One validation pass, one event_id lookup and one bulk INSERT for the
+        # whole batch (or per chunk of a stream) — see accounts/telemetry.py.
+        ingest = ingest_stream if streamed else ingest_fixes
+        result = ingest(raw, company=company, driver=driver,
+                        vehicle=vehicle, trip=trip)
+
+        if streamed and not (result.saved or result.duplicates or result.errors):
+            return Response({'saved': 0, 'detail': 'No locations supplied.'},
+                            status=status.HTTP_200_OK)
+        if not result.saved and not result.duplicates:
             return Response(
-                {'saved': 0, 'errors': errors, 'detail': 'No valid fixes.'},
+                {'saved': 0, 'errors': result.errors, 'detail': 'No valid fixes.'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
         # --- Mirror the newest fix onto the Vehicle (latest state) ----
-        if saved:
-            latest = max(saved, key=lambda p: p.recorded_at)
-            now = timezone.now()
-            if vehicle is not None:
-                vehicle.lat = latest.lat
-                vehicle.lng = latest.lng
-                # Vehicle.speed is a whole-number field the UI reads as km/h;
-                # GPS speed is m/s, so convert.
-                vehicle.speed = max(0, round((latest.speed or 0) * 3.6))
-                vehicle.last_seen_at = now
-                vehicle.save(update_fields=['lat', 'lng', 'speed', 'last_seen_at'])
-            # Driver presence is tracked independently of any vehicle, so a
-            # driver reporting real GPS is online even with no assignment.
-            if driver is not None:
-                driver.last_seen_at = now
-                driver.save(update_fields=['last_seen_at'])
+        after_ingest(result, vehicle=vehicle, driver=driver, trip=trip)
 
         return Response(
             {
-                'saved': len(saved),
-                'duplicates': duplicates,
-                'errors': errors,
+                'saved': result.saved,
+                'duplicates': result.duplicates,
+                'errors': result.errors,
                 'vehicle': vehicle.plate_number if vehicle else None,
                 # Explicit so the app can tell the driver why their position is
                 # not on the fleet map yet.
@@ -2006,3 +2104,43 @@ class SubscriptionView(APIView):
         sub.status = Subscription.Status.ACTIVE
         sub.save(update_fields=['plan', 'status'])
         return Response(subscription_usage(company))
+
+
+class KpiView(APIView):
+    """Fleet KPIs over a date range, from the daily rollups
+    (accounts/kpi_rollups.py) rather than the raw trips and expenses.
+
+    ?from=YYYY-MM-DD&to=YYYY-MM-DD (default: the last 30 days)
+    ?group=day|vehicle|driver (default: day)"""
+    permission_classes = [IsCompanyMember]
+    MAX_DAYS = 366
+
+    def get(self, request):
+        from datetime import date, timedelta
+
+        company = company_for(request.user)
+        if company is None:
+            return Response({'detail': 'No company.'}, status=status.HTTP_404_NOT_FOUND)
+        group = request.query_params.get('group', 'day')
+        if group not in ('day', 'vehicle', 'driver'):
+            return Response({'group': ['Choose one of: day, vehicle, driver.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        today = timezone.localtime(timezone.now(), kpi_rollups.company_tz(company.id)).date()
+        try:
+            last = date.fromisoformat(request.query_params.get('to') or today.isoformat())
+            first = date.fromisoformat(request.query_params.get('from')
+                                       or (last - timedelta(days=29)).isoformat())
+        except ValueError:
+            return Response({'detail': 'Dates must be YYYY-MM-DD.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if first > last or (last - first).days >= self.MAX_DAYS:
+            return Response({'detail': f'Pick a range of 1 to {self.MAX_DAYS} days.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        rows = kpi_rollups.report(company.id, first, last, group)
+        for row in rows:
+            for key in ('revenue', 'expenses', 'fuel_liters'):
+                row[key] = str(row[key])
+            row['expenses_by_category'] = {
+                k: str(v) for k, v in row['expenses_by_category'].items()}
+        return Response({'from': first, 'to': last, 'group': group, 'results': rows})
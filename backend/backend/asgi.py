@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+The Live Map stream (accounts/live_stream.py) is only served here, e.g.
+`uvicorn backend.asgi:application --workers 1`: its fan-out is in-process, so
+every ingest and every open stream must share the worker.
 """
 
 import os
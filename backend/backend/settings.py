@@ -76,6 +76,7 @@ MIDDLEWARE = [
     'accounts.middleware.SecurityMiddleware',
     'accounts.middleware.SessionTimeoutMiddleware',
     'accounts.middleware.RateLimitMiddleware',
+    'accounts.request_cache.RequestCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -122,6 +123,9 @@ else:
             'NAME': BASE_DIR / 'db.sqlite3',
         }
     }
+    # Local SQLite skips DailyKpi's NULLS NOT DISTINCT constraint; production
+    # (PostgreSQL) enforces it.
+    SILENCED_SYSTEM_CHECKS = ["models.W047"]
 
 
 # Password validation
@@ -191,7 +195,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # simplejwt + the caller's membership in the same query.
+        'accounts.tenancy.TenantJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
@@ -199,7 +204,8 @@ REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': (
         'rest_framework.renderers.JSONRenderer',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # Keyset pages (?cursor=); ?count=estimate adds an approximate total.
+    'DEFAULT_PAGINATION_CLASS': 'accounts.pagination.KeysetPagination',
     'PAGE_SIZE': 20,
     # Rate limiting. Scoped throttles guard the sensitive auth/activation
     # endpoints (each sets throttle_scope); a global anon cap adds defense.
@@ -399,6 +405,52 @@ LOGGING = {
 }
 
 
+# --- Coalesced vehicle/driver latest state (accounts/latest_state.py) ------
+# Seconds between bulk flushes of live positions; 0 = write every fix through.
+# Only turn on with a cache shared by all web processes (Redis/Memcached).
+FLEET_LATEST_STATE_FLUSH_SECONDS = float(os.environ.get('FLEET_LATEST_STATE_FLUSH_SECONDS', '0'))
+
+# --- Company thresholds cache (accounts/fleet_status.py) -------------------
+# Saving CompanySettings invalidates immediately in the shared cache; with
+# the per-process default cache other workers catch up within this window.
+FLEET_THRESHOLDS_CACHE_SECONDS = int(os.environ.get('FLEET_THRESHOLDS_CACHE_SECONDS', '60'))
+
+# --- Telemetry write-behind spool (accounts/telemetry_spool.py) ------------
+# Off by default: the journal needs a persistent local disk and a running
+# `manage.py drain_telemetry_spool` worker, neither of which serverless has.
+TELEMETRY_ASYNC_INGEST = os.environ.get('TELEMETRY_ASYNC_INGEST', 'False').lower() in ['1', 'true', 'yes']
+TELEMETRY_SPOOL_DIR = os.environ.get('TELEMETRY_SPOOL_DIR', str(BASE_DIR / 'var' / 'telemetry-spool'))
+
+
+# --- LocationPing partitioning (accounts/partitions.py, PostgreSQL) --------
+# 'month' or 'week'; used by `manage.py location_partitions`.
+TELEMETRY_PARTITION_GRANULARITY = os.environ.get('TELEMETRY_PARTITION_GRANULARITY', 'month')
+
+# --- Live Map SSE stream (accounts/live_stream.py, ASGI only) --------------
+LIVE_STREAM_HEARTBEAT_SECONDS = int(os.environ.get('LIVE_STREAM_HEARTBEAT_SECONDS', '15'))
+LIVE_STREAM_RESYNC_SECONDS = int(os.environ.get('LIVE_STREAM_RESYNC_SECONDS', '60'))
+# Lifetime of the ?ticket= an EventSource opens the stream with.
+LIVE_STREAM_TICKET_SECONDS = int(os.environ.get('LIVE_STREAM_TICKET_SECONDS', '30'))
+
+# --- Live Map viewports (accounts/live_map.py) ------------------------------
+# vehicles/live/?zoom= below this returns grid clusters instead of markers.
+LIVE_MAP_CLUSTER_BELOW_ZOOM = int(os.environ.get('LIVE_MAP_CLUSTER_BELOW_ZOOM', '12'))
+
+
+# --- Fleet alert evaluator (accounts/alert_evaluator.py) ------------------
+# `manage.py evaluate_fleet_alerts`: seconds between passes, and the longest
+# an unchanged company goes without evaluation (bounds offline detection).
+FLEET_ALERTS_EVALUATE_SECONDS = int(os.environ.get('FLEET_ALERTS_EVALUATE_SECONDS', '15'))
+FLEET_ALERTS_SWEEP_SECONDS = int(os.environ.get('FLEET_ALERTS_SWEEP_SECONDS', '60'))
+
+# --- Platform admin overview (accounts/platform_admin.py) -----------------
+# Seconds the overview is fresh, then how much longer a stale copy is served
+# to other requests while one recomputes it (or `refresh_admin_overview` does).
+ADMIN_OVERVIEW_CACHE_SECONDS = int(os.environ.get('ADMIN_OVERVIEW_CACHE_SECONDS', '30'))
+ADMIN_OVERVIEW_STALE_SECONDS = int(os.environ.get('ADMIN_OVERVIEW_STALE_SECONDS', '300'))
+# Cap on admin lists requested without ?page_size=/?cursor= (legacy clients).
+ADMIN_LIST_PLAIN_LIMIT = int(os.environ.get('ADMIN_LIST_PLAIN_LIMIT', '1000'))
+
 # --- Test runner overrides -------------------------------------------------
 # DEBUG defaults False (prod-safe), which turns on SECURE_SSL_REDIRECT and would
 # 301 the test client's HTTP requests. Relax transport security under tests only.
@@ -1,5 +1,5 @@
 "use client";
-import { useState, useMemo, useEffect, useCallback } from "react";
+import { useState, useEffect, useCallback } from "react";
 import { useRouter } from "next/navigation";
 import {
   ShieldCheck, Shield, Building2, Users as UsersIcon, User as UserIcon,
@@ -13,9 +13,9 @@ import { useT } from "@/i18n";
 import { useUnits } from "@/lib/format";
 import { toast } from "@/components/Toast";
 import {
-  fetchAdminOverview, fetchAdminCompanies, setCompanyActive,
+  fetchAdminOverview, fetchAdminCompanies, fetchAdminPage, setCompanyActive,
   fetchAdminMessages, replyToMessage,
-  type AdminOverview, type AdminCompany, type AdminMessage,
+  type AdminOverview, type AdminCompany, type AdminMessage, type AdminPage,
 } from "@/lib/api-data";
 
 type PlatformUser = {
@@ -26,6 +26,51 @@ type PlatformUser = {
 
 type Tab = "overview" | "companies" | "users" | "messages";
 
+/**
+ * A platform-wide list, one page at a time: the search runs on the server
+ * (debounced) and "Load more" follows the keyset cursor, so a tab never pulls
+ * every tenant's rows at once.
+ */
+function useAdminList<T>(fetchPage: (search: string, cursor: string | null) => Promise<AdminPage<T>>) {
+  const [rows, setRows] = useState<T[] | null>(null);
+  const [cursor, setCursor] = useState<string | null>(null);
+  const [search, setSearch] = useState("");
+  const [query, setQuery] = useState("");
+
+  useEffect(() => {
+    const t = setTimeout(() => setQuery(search.trim()), 300);
+    return () => clearTimeout(t);
+  }, [search]);
+
+  const load = useCallback(() => {
+    fetchPage(query, null)
+      .then((p) => { setRows(p.results); setCursor(p.cursor); })
+      .catch(() => { setRows([]); setCursor(null); });
+  }, [fetchPage, query]);
+  useEffect(() => { load(); }, [load]);
+
+  const loadMore = useCallback(() => {
+    if (!cursor) return;
+    fetchPage(query, cursor)
+      .then((p) => { setRows((prev) => [...(prev ?? []), ...p.results]); setCursor(p.cursor); })
+      .catch(() => {});
+  }, [fetchPage, query, cursor]);
+
+  return { rows, search, setSearch, load, loadMore, hasMore: cursor !== null };
+}
+
+const fetchUsers = (search: string, cursor: string | null) =>
+  fetchAdminPage<PlatformUser>("accounts/users/all/", search, cursor);
+
+function LoadMore({ onClick }: { onClick: () => void }) {
+  const tr = useT();
+  return (
+    <div className="flex justify-center">
+      <button onClick={onClick} className="btn btn-ghost text-sm">{tr("ui.adm_load_more")}</button>
+    </div>
+  );
+}
+
 export default function AdminPage() {
   const tr = useT();
   const { number, currency } = useUnits();
@@ -164,22 +209,9 @@ function SubStat({ label, value, tone }: { label: string; value: string; tone: s
 /* ----------------------------------------------------------------- Companies */
 function CompaniesTab({ number }: { number: (n: number) => string }) {
   const tr = useT();
-  const [rows, setRows] = useState<AdminCompany[] | null>(null);
-  const [search, setSearch] = useState("");
+  const { rows, search, setSearch, load, loadMore, hasMore } = useAdminList(fetchAdminCompanies);
   const [busy, setBusy] = useState<number | null>(null);
 
-  const load = useCallback(() => {
-    fetchAdminCompanies().then(setRows).catch(() => setRows([]));
-  }, []);
-  useEffect(() => { load(); }, [load]);
-
-  const filtered = useMemo(
-    () => (rows ?? []).filter((c) =>
-      c.company_name.toLowerCase().includes(search.toLowerCase()) ||
-      c.email.toLowerCase().includes(search.toLowerCase())),
-    [rows, search]
-  );
-
   const toggle = async (c: AdminCompany) => {
     setBusy(c.id);
     try {
@@ -202,11 +234,11 @@ function CompaniesTab({ number }: { number: (n: number) => string }) {
         <input value={search} onChange={(e) => setSearch(e.target.value)}
           placeholder={tr("ui.adm_search_company")} className="field ps-10" />
       </div>
-      {filtered.length === 0 ? (
+      {rows.length === 0 ? (
         <div className="card"><EmptyState icon={Building2} title={tr("ui.adm_no_companies")} description={tr("ui.none")} /></div>
       ) : (
         <div className="space-y-3 stagger">
-          {filtered.map((c) => (
+          {rows.map((c) => (
             <div key={c.id} className="card p-5">
               <div className="flex items-start justify-between gap-4 flex-wrap">
                 <div className="min-w-0 flex-1">
@@ -238,6 +270,7 @@ function CompaniesTab({ number }: { number: (n: number) => string }) {
           ))}
         </div>
       )}
+      {hasMore && <LoadMore onClick={loadMore} />}
     </div>
   );
 }
@@ -245,21 +278,7 @@ function CompaniesTab({ number }: { number: (n: number) => string }) {
 /* --------------------------------------------------------------------- Users */
 function UsersTab({ meId }: { meId: number | string }) {
   const tr = useT();
-  const [users, setUsers] = useState<PlatformUser[] | null>(null);
-  const [search, setSearch] = useState("");
-
-  const load = useCallback(() => {
-    api.get("accounts/users/all/").then(({ data }) => setUsers(data)).catch(() => setUsers([]));
-  }, []);
-  useEffect(() => { load(); }, [load]);
-
-  const filtered = useMemo(
-    () => (users ?? []).filter((u) =>
-      (u.full_name || u.username).toLowerCase().includes(search.toLowerCase()) ||
-      u.email.toLowerCase().includes(search.toLowerCase()) ||
-      (u.company_name || "").toLowerCase().includes(search.toLowerCase())),
-    [users, search]
-  );
+  const { rows: users, search, setSearch, load, loadMore, hasMore } = useAdminList(fetchUsers);
 
   const toggleRole = async (id: number, isAdmin: boolean) => {
     try {
@@ -290,11 +309,11 @@ function UsersTab({ meId }: { meId: number | string }) {
         <input value={search} onChange={(e) => setSearch(e.target.value)}
           placeholder={tr("ui.search_users")} className="field ps-10" />
       </div>
-      {filtered.length === 0 ? (
+      {users.length === 0 ? (
         <div className="card"><EmptyState icon={UsersIcon} title={tr("ui.no_users_found")} description={tr("ui.none")} /></div>
       ) : (
         <div className="space-y-2 stagger">
-          {filtered.map((u) => (
+          {users.map((u) => (
             <div key={u.id} className="card p-4 flex items-center justify-between gap-3 flex-wrap">
               <div className="min-w-0 flex-1">
                 <div className="flex items-center gap-2 flex-wrap">
@@ -324,6 +343,7 @@ function UsersTab({ meId }: { meId: number | string }) {
           ))}
         </div>
       )}
+      {hasMore && <LoadMore onClick={loadMore} />}
     </div>
   );
 }
@@ -5,7 +5,7 @@
 // never sends a company_id. Replaces the old localStorage demo store.
 
 import { useCallback, useEffect, useRef, useState } from "react";
-import api from "@/app/api";
+import api, { API_BASE_URL } from "@/app/api";
 import type { Driver, Vehicle, Trip, Expense, Alert } from "./types";
 
 // ---- Mapping backend rows -> UI types -------------------------------------
@@ -357,8 +357,10 @@ export type LiveVehicle = {
 
 /**
  * Live vehicle state for the map — enriched (driver/trip/cargo/status) from the
- * backend's VehicleLatestState feed. MVP transport = polling; this hook is the
- * single seam to swap for SSE/WebSocket/Pusher later with no other changes.
+ * backend's VehicleLatestState feed. Streamed over SSE (a snapshot, then one
+ * `position` event per moved vehicle) where the backend runs under ASGI;
+ * otherwise — or when the stream is refused — polled every `intervalMs` with
+ * `?since=`, so an idle fleet costs a few hundred bytes per poll.
  */
 export function useLiveVehicles(intervalMs = 4000) {
   const [data, setData] = useState<LiveVehicle[]>([]);
@@ -367,21 +369,86 @@ export function useLiveVehicles(intervalMs = 4000) {
 
   useEffect(() => {
     let alive = true;
+    let source: EventSource | null = null;
+    // Fleet version of the rows we hold: each poll fetches only what changed.
+    let version = "";
     const tick = async () => {
       try {
-        const r = await api.get("accounts/vehicles/live/");
-        if (alive) setData(Array.isArray(r.data) ? r.data : []);
+        const r = await api.get("accounts/vehicles/live/", { params: { since: version } });
+        if (!alive) return;
+        // Platform staff get every company's rows, unversioned: a plain array.
+        const body = Array.isArray(r.data) ? { full: true, vehicles: r.data } : r.data || {};
+        const { full, vehicles = [], removed = [] } = body;
+        version = body.version || "";
+        setData((prev) => {
+          if (full) return vehicles;
+          const byId = new Map(prev.map((v) => [v.id, v] as const));
+          for (const v of vehicles as LiveVehicle[]) byId.set(v.id, v);
+          for (const id of removed as number[]) byId.delete(id);
+          return Array.from(byId.values());
+        });
       } catch {
         /* transient — keep last known positions */
       } finally {
         if (alive) setReady(true);
       }
     };
-    tick();
-    timer.current = setInterval(tick, intervalMs);
+    const poll = () => {
+      tick();
+      timer.current = setInterval(tick, intervalMs);
+    };
+
+    // EventSource cannot send headers: open the stream with a short-lived
+    // ticket rather than the access token. No ticket (WSGI deployment, not a
+    // company member) means poll.
+    const stream = async () => {
+      let ticket = "";
+      try {
+        ticket = (await api.post("accounts/vehicles/live/stream/ticket/")).data?.ticket || "";
+      } catch {
+        /* fall through to polling */
+      }
+      if (!alive) return;
+      if (!ticket) return poll();
+      let opened = false;
+      source = new EventSource(
+        `${API_BASE_URL}/api/accounts/vehicles/live/stream/?ticket=${encodeURIComponent(ticket)}`,
+      );
+      source.addEventListener("snapshot", (e) => {
+        const rows = JSON.parse((e as MessageEvent).data);
+        opened = true;
+        if (alive) {
+          setData(Array.isArray(rows) ? rows : []);
+          setReady(true);
+        }
+      });
+      source.addEventListener("position", (e) => {
+        const p = JSON.parse((e as MessageEvent).data);
+        if (alive) setData((prev) => prev.map((v) => (v.id === p.id ? { ...v, ...p } : v)));
+      });
+      source.onerror = () => {
+        // A dropped connection reconnects by itself; a refused one is CLOSED —
+        // usually the ticket expired, so fetch another once the stream had
+        // worked, else fall back to polling.
+        if (source?.readyState === EventSource.CLOSED && alive && !timer.current) {
+          source = null;
+          if (opened) stream();
+          else poll();
+        }
+      };
+    };
+
+    if (typeof EventSource !== "undefined" && typeof window !== "undefined"
+        && localStorage.getItem("access")) {
+      stream();
+    } else {
+      poll();
+    }
     return () => {
       alive = false;
+      source?.close();
       if (timer.current) clearInterval(timer.current);
+      timer.current = null;
     };
   }, [intervalMs]);
 
@@ -496,9 +563,21 @@ export async function fetchAdminOverview(): Promise<AdminOverview> {
   const { data } = await api.get("accounts/admin/overview/");
   return data;
 }
-export async function fetchAdminCompanies(): Promise<AdminCompany[]> {
-  const { data } = await api.get("accounts/admin/companies/");
-  return data;
+/** One keyset page of a platform-wide admin list, searched server-side. */
+export type AdminPage<T> = { results: T[]; cursor: string | null };
+
+export async function fetchAdminPage<T>(
+  path: string, search = "", cursor: string | null = null, pageSize = 50,
+): Promise<AdminPage<T>> {
+  const { data } = await api.get(path, {
+    params: { page_size: pageSize, search: search || undefined, cursor: cursor || undefined },
+  });
+  // `next` is a full URL; keep only its cursor so the base URL stays ours.
+  const next = data?.next ? new URL(data.next, API_BASE_URL).searchParams.get("cursor") : null;
+  return { results: data?.results ?? [], cursor: next };
+}
+export function fetchAdminCompanies(search = "", cursor: string | null = null) {
+  return fetchAdminPage<AdminCompany>("accounts/admin/companies/", search, cursor);
 }
 export async function setCompanyActive(id: number, active: boolean): Promise<void> {
   await api.post(`accounts/admin/companies/${id}/${active ? "activate" : "suspend"}/`);